@@ -1,8 +1,82 @@
 """
 Tools for working with CSS (Cascading Style Sheets)
+
+The modules are only imported when something from the package is
+first used, so that running "python -m cssTools", or importing just
+one module (eg cssTools.rules), stays quick.
 """
-from .wunderlist import *
-from .cssStyles import *
-from .cssSelectors import *
-from .rules import *
-from .css import *
+import typing
+import importlib
+if typing.TYPE_CHECKING:
+    from .wunderlist import *
+    from .matchContext import *
+    from .cssValues import *
+    from .shorthands import *
+    from .compressionOrder import *
+    from .sourceMaps import *
+    from .mediaQueries import *
+    from .cssStyles import *
+    from .cssVariables import *
+    from .matchCache import *
+    from .minify import *
+    from .interning import *
+    from .cssSelectors import *
+    from .cssDiff import *
+    from .rules import *
+    from .ruleIndex import *
+    from .selectorCost import *
+    from .inliner import *
+    from .cssMerge import *
+    from .artifacts import *
+    from .frozenCss import *
+    from .pageSplitter import *
+    from .bundler import *
+    from .css import *
+    from .asyncCss import *
+
+
+# the modules whose public names make up the package, in the order
+# they are imported (so later ones win if two use the same name)
+_MODULES=('wunderlist','matchContext','cssValues','shorthands',
+    'compressionOrder','sourceMaps','mediaQueries','cssStyles',
+    'cssVariables','matchCache','minify','interning','cssSelectors',
+    'cssDiff','rules','ruleIndex','selectorCost','inliner','cssMerge',
+    'artifacts','frozenCss','pageSplitter','bundler','css','asyncCss')
+_loaded=False
+
+
+def _load()->None:
+    """
+    Import every module and bring its public names into the package,
+    the same as "from .module import *" for each of them
+    """
+    global _loaded
+    if _loaded:
+        return
+    namespace=globals()
+    for moduleName in _MODULES:
+        module=importlib.import_module('.'+moduleName,__name__)
+        names=getattr(module,'__all__',None)
+        if names is None:
+            names=[name for name in vars(module) if not name.startswith('_')]
+        for name in names:
+            namespace[name]=getattr(module,name)
+    namespace['__all__']=[name for name in namespace
+        if not name.startswith('_')]
+    _loaded=True
+
+
+def __getattr__(name:str)->typing.Any:
+    if name.startswith('__') and name!='__all__':
+        raise AttributeError(name)
+    _load()
+    try:
+        return globals()[name]
+    except KeyError:
+        raise AttributeError('module %r has no attribute %r'
+            %(__name__,name)) from None
+
+
+def __dir__()->typing.List[str]:
+    _load()
+    return sorted(globals())
@@ -0,0 +1,296 @@
+"""
+Command line interface
+
+    python -m cssTools <command> [options] [files...]
+
+Reads css from the given files (or globs), or from stdin when
+there are none (or "-"), and writes the result to stdout.  With
+several files, --jobs processes them in parallel.
+
+To keep startup quick for short runs in a pipeline, modules that
+only some commands need are imported when they are first used.
+"""
+import typing
+import sys
+import os
+import argparse
+
+
+STDIN_NAME='-'
+GLOB_CHARS=('*','?','[')
+
+# (input name,output text,translations)
+FileResult=typing.Tuple[str,str,typing.Optional[typing.Dict[str,str]]]
+
+
+def expandInputs(patterns:typing.Iterable[str])->typing.List[str]:
+    """
+    Expand globs (including "**") into a list of filenames,
+    keeping the order they were given in
+
+    :raises FileNotFoundError: if a file or glob matches nothing
+    """
+    import glob
+    ret:typing.List[str]=[]
+    for pattern in patterns:
+        if pattern==STDIN_NAME:
+            ret.append(pattern)
+            continue
+        if any(c in pattern for c in GLOB_CHARS):
+            matches=sorted(glob.glob(pattern,recursive=True))
+            if not matches:
+                raise FileNotFoundError('no files match "%s"'%pattern)
+            ret.extend(matches)
+        elif os.path.exists(pattern):
+            ret.append(pattern)
+        else:
+            raise FileNotFoundError('no such file "%s"'%pattern)
+    return list(dict.fromkeys(ret))
+
+
+def _readInput(name:str)->str:
+    if name==STDIN_NAME:
+        return sys.stdin.read()
+    with open(name,'r',encoding='utf-8-sig') as f:
+        return f.read()
+
+
+def _getStats(rules:typing.Any,cssText:str)->typing.Dict[str,typing.Any]:
+    """
+    Size and shape of a stylesheet
+    """
+    from .compressionOrder import gzipSize
+    minified=rules.getMinifiedCssString()
+    properties:typing.Set[str]=set()
+    numDeclarations=0
+    for rule in rules:
+        properties.update(rule.styles.keys())
+        numDeclarations+=len(rule.styles)
+    return {
+        'rules':len(rules),
+        'selectors':sum(len(rule.selectors) for rule in rules),
+        'declarations':numDeclarations,
+        'properties':len(properties),
+        'mediaConditions':len(
+            [levels for levels in rules.mediaPartitions if levels]),
+        'bytes':len(cssText.encode('utf-8')),
+        'minifiedBytes':len(minified.encode('utf-8')),
+        'gzipBytes':gzipSize(minified)}
+
+
+def processCss(command:str,
+    name:str,
+    cssText:str,
+    options:typing.Dict[str,typing.Any]
+    )->FileResult:
+    """
+    Run one command on one stylesheet
+
+    :param options: the command line options, as a dict
+        (so that it can be sent to worker processes)
+    """
+    from .rules import CssRules
+    rules=CssRules(cssText)
+    if name!=STDIN_NAME:
+        rules.sourceName=name
+    translations:typing.Optional[typing.Dict[str,str]]=None
+    minified=options.get('minified',False)
+    if command=='minify':
+        return (name,rules.minify(),None)
+    if command=='condense':
+        translations=rules.condense(rename=options.get('rename',False))
+    elif command=='obfuscate':
+        obfuscated=rules.obfuscate(options.get('ignore') or None)
+        translations={str(original):str(new)
+            for original,new in obfuscated.items()}
+    elif command=='purge':
+        from .pageSplitter import computeRuleUsage
+        pages={html:_readInput(html) for html in options['html']}
+        # the pages are already being spread over the jobs
+        used:typing.Set[int]=set()
+        for pageUsed in computeRuleUsage(rules,pages,jobs=1).values():
+            used.update(pageUsed)
+        rules.assign([rule for i,rule in enumerate(rules) if i in used])
+    elif command=='stats':
+        import json
+        return (name,json.dumps(_getStats(rules,cssText),indent=4)+'\n',None)
+    elif command!='format':
+        raise ValueError('unknown command "%s"'%command)
+    if minified:
+        return (name,rules.getMinifiedCssString(),translations)
+    return (name,rules.getCssString().strip()+'\n',translations)
+
+
+def _processFile(command:str,
+    name:str,
+    options:typing.Dict[str,typing.Any]
+    )->FileResult:
+    """
+    Read a file and run a command on it (in a worker process)
+    """
+    return processCss(command,name,_readInput(name),options)
+
+
+def _writeOutput(name:str,text:str,options:typing.Dict[str,typing.Any])->None:
+    """
+    Write the result for one input to stdout, or to a file
+    """
+    outdir=options.get('outdir')
+    output=options.get('output')
+    if outdir is not None and name!=STDIN_NAME:
+        output=os.path.join(outdir,os.path.basename(name))
+        if options['command']=='stats':
+            output+='.json'
+    if output is None or output==STDIN_NAME:
+        sys.stdout.write(text)
+        if not text.endswith('\n'):
+            sys.stdout.write('\n')
+        return
+    with open(output,'w',encoding='utf-8') as f:
+        f.write(text)
+
+
+def run(options:typing.Dict[str,typing.Any])->int:
+    """
+    Run the command line, given already parsed options
+
+    :return: exit code
+    """
+    import json
+    command=options['command']
+    names=expandInputs(options.get('files') or [STDIN_NAME])
+    if options.get('output') is not None and len(names)>1:
+        raise ValueError(
+            '--output can only be used with a single input, use --outdir')
+    if command=='purge' and not options.get('html'):
+        raise ValueError('purge needs at least one --html page')
+    if command=='purge':
+        options['html']=expandInputs(options['html'])
+    if options.get('outdir') is not None:
+        os.makedirs(options['outdir'],exist_ok=True)
+    writer=None
+    if options.get('hashed'):
+        if options.get('outdir') is None or STDIN_NAME in names:
+            raise ValueError(
+                '--hashed needs --outdir, and files rather than stdin')
+        from .artifacts import ArtifactWriter
+        writer=ArtifactWriter(options['outdir'])
+    jobs=options.get('jobs') or os.cpu_count() or 1
+    results:typing.Iterable[FileResult]
+    if jobs>1 and len(names)>1 and STDIN_NAME not in names:
+        import concurrent.futures
+        executor=concurrent.futures.ProcessPoolExecutor(min(jobs,len(names)))
+        results=executor.map(_processFile,
+            [command]*len(names),names,[options]*len(names))
+    else:
+        executor=None
+        results=(_processFile(command,name,options) for name in names)
+    allTranslations:typing.Dict[str,typing.Dict[str,str]]={}
+    # several stats on stdout go in one json object, {name:stats}
+    allStats:typing.Optional[typing.Dict[str,typing.Any]]=None
+    if command=='stats' and len(names)>1 and options.get('outdir') is None:
+        allStats={}
+    try:
+        for name,text,translations in results:
+            if writer is not None:
+                writer.writeChunks(os.path.basename(name),(text,))
+            elif allStats is not None:
+                allStats[name]=json.loads(text)
+            else:
+                _writeOutput(name,text,options)
+            if translations is not None:
+                allTranslations[name]=translations
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if writer is not None:
+        writer.saveManifest()
+    if allStats is not None:
+        _writeOutput(STDIN_NAME,json.dumps(allStats,indent=4)+'\n',options)
+    translationsFile=options.get('translations')
+    if translationsFile is not None:
+        if len(names)==1:
+            table:typing.Any=allTranslations.get(names[0],{})
+        else:
+            table=allTranslations
+        with open(translationsFile,'w',encoding='utf-8') as f:
+            json.dump(table,f,indent=4)
+            f.write('\n')
+    return 0
+
+
+def getArgumentParser()->argparse.ArgumentParser:
+    """
+    The command line parser
+    """
+    parser=argparse.ArgumentParser(prog='python -m cssTools',
+        description='Tools for working with css files')
+    subparsers=parser.add_subparsers(dest='command',metavar='command')
+    subparsers.required=True
+    common=argparse.ArgumentParser(add_help=False)
+    common.add_argument('files',nargs='*',
+        help='css files or globs (default/"-" is stdin)')
+    common.add_argument('-o','--output',
+        help='write to this file instead of stdout')
+    common.add_argument('--outdir',
+        help='write each result to a file of the same name in this directory')
+    common.add_argument('-j','--jobs',type=int,default=None,
+        help='how many files to process in parallel'
+            ' (default is the number of cpus)')
+    transform=argparse.ArgumentParser(add_help=False)
+    transform.add_argument('-m','--minified',action='store_true',
+        help='write minified output')
+    translate=argparse.ArgumentParser(add_help=False)
+    translate.add_argument('-t','--translations',
+        help='write the table of renamed selectors to this json file')
+    minify=subparsers.add_parser('minify',parents=[common],
+        help='minify css')
+    minify.add_argument('--hashed',action='store_true',
+        help='write content-hashed files with gzipped copies,'
+            ' and a manifest.json, to --outdir')
+    condense=subparsers.add_parser('condense',
+        parents=[common,transform,translate],
+        help='combine rules that have the same styles')
+    condense.add_argument('--rename',action='store_true',
+        help='also merge classes that are only used together,'
+            ' renaming one to the other')
+    obfuscate=subparsers.add_parser('obfuscate',
+        parents=[common,transform,translate],
+        help='rename classes and ids to short, meaningless names')
+    obfuscate.add_argument('--ignore',action='append',default=[],
+        help='a selector to leave as-is (can be repeated)')
+    purge=subparsers.add_parser('purge',parents=[common,transform],
+        help='remove rules not used by any of a set of html pages')
+    purge.add_argument('--html',action='append',default=[],
+        help='an html page or glob (can be repeated)')
+    subparsers.add_parser('stats',parents=[common],
+        help='print statistics about css as json'
+            ' (keyed by filename, for several files)')
+    subparsers.add_parser('format',parents=[common,transform],
+        help='reformat css')
+    return parser
+
+
+def main(argv:typing.Optional[typing.List[str]]=None)->int:
+    """
+    Run the command line
+
+    :return: exit code
+    """
+    parser=getArgumentParser()
+    options=vars(parser.parse_args(argv))
+    try:
+        return run(options)
+    except BrokenPipeError:
+        # eg, piped into "head"
+        sys.stderr.close()
+        return 1
+    except (ValueError,OSError) as e:
+        parser.exit(1,'%s: error: %s\n'%(parser.prog,e))
+    except KeyboardInterrupt:
+        return 130
+    return 0
+
+
+if __name__=='__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+Write content-hashed, precompressed build outputs
+
+    writer=ArtifactWriter('dist')
+    artifact=writer.write('app.css',rules)
+    # dist/app.3f2a9c1e07b4.css, dist/app.3f2a9c1e07b4.css.gz,
+    # and dist/manifest.json with {"app.css":"app.3f2a9c1e07b4.css"}
+    writer.saveManifest()
+
+The minified css is produced a rule at a time and each piece goes
+straight into the hash, the output file and the gzip stream, so
+it is serialized, hashed and compressed in a single pass without
+ever being held in memory as a whole.
+
+Both files are written to temporary names and only moved into
+place once complete.  If the manifest already points at a file
+with the same hash, the new files are thrown away instead, so
+unchanged outputs keep their timestamps (and caches stay warm).
+"""
+import typing
+import os
+import json
+import gzip
+import hashlib
+from .minify import iterMinifiedCssString
+from .rules import CssRules,CssRulesCompatible
+
+
+# {logical name:hashed filename}
+Manifest=typing.Dict[str,str]
+
+
+def _tempPath(path:str)->str:
+    """
+    Where to write a file before moving it into place
+    (in the same directory, so the move is atomic)
+    """
+    directory,filename=os.path.split(path)
+    return os.path.join(directory,'.%s.%d.tmp'%(filename,os.getpid()))
+
+
+class Artifact(typing.NamedTuple):
+    """
+    One written build output
+
+    :param name: the logical name, eg "app.css"
+    :param filename: the hashed filename, relative to the output
+        directory, eg "app.3f2a9c1e07b4.css"
+    :param gzipFilename: the precompressed variant,
+        eg "app.3f2a9c1e07b4.css.gz"
+    :param hash: the full hex digest of the output
+    :param size: bytes, uncompressed
+    :param gzipSize: bytes, gzipped
+    :param written: False if an identical output was already there
+    """
+    name:str
+    filename:str
+    gzipFilename:str
+    hash:str
+    size:int
+    gzipSize:int
+    written:bool
+
+
+class ArtifactWriter:
+    """
+    Writes outputs to hashed filenames (with gzipped copies),
+    and keeps a manifest of which is which
+    """
+
+    def __init__(self,
+        outdir:str,
+        manifestFilename:str='manifest.json',
+        hashLength:int=12,
+        hashAlgorithm:str='sha256',
+        gzipLevel:int=9,
+        removeStale:bool=False):
+        """
+        :param outdir: where to write everything (created if need be)
+        :param manifestFilename: the manifest, relative to outdir
+            (an existing one is loaded, so unchanged outputs
+            are recognised across runs)
+        :param hashLength: how many hex digits of the hash to put
+            in filenames
+        :param hashAlgorithm: any hashlib algorithm
+        :param gzipLevel: 1 (fastest) to 9 (smallest)
+        :param removeStale: when an output changes, delete the files
+            it replaces (by default they are kept, for pages that
+            still refer to them)
+        """
+        if hashLength<1:
+            raise ValueError(
+                'hashLength must be at least 1, got %d'%hashLength)
+        hashlib.new(hashAlgorithm) # fail now if it doesn't exist
+        self.outdir=outdir
+        self.manifestFilename=manifestFilename
+        self.hashLength=hashLength
+        self.hashAlgorithm=hashAlgorithm
+        self.gzipLevel=gzipLevel
+        self.removeStale=removeStale
+        self.manifest:Manifest={}
+        self._manifestChanged=False
+        os.makedirs(outdir,exist_ok=True)
+        manifestPath=os.path.join(outdir,manifestFilename)
+        if os.path.exists(manifestPath):
+            with open(manifestPath,'r',encoding='utf-8') as f:
+                self.manifest=json.load(f)
+
+    def hashedFilename(self,name:str,digest:str)->str:
+        """
+        Get the filename for a version of an output,
+        eg "css/app.css" -> "css/app.3f2a9c1e07b4.css"
+        """
+        stem,ext=os.path.splitext(name)
+        return '%s.%s%s'%(stem,digest[0:self.hashLength],ext)
+
+    def writeChunks(self,name:str,chunks:typing.Iterable[str])->Artifact:
+        """
+        Write an output given as a series of strings
+
+        :param name: the logical name (a path relative to outdir)
+        """
+        hasher=hashlib.new(self.hashAlgorithm)
+        rawTemp=_tempPath(os.path.join(self.outdir,name))
+        gzipTemp=_tempPath(os.path.join(self.outdir,name+'.gz'))
+        os.makedirs(os.path.dirname(rawTemp),exist_ok=True)
+        size=0
+        try:
+            with open(rawTemp,'wb') as rawFile,open(gzipTemp,'wb') as gzipFile:
+                # no name or time in the header, so the same
+                # css always compresses to the same bytes
+                with gzip.GzipFile(filename='',mode='wb',fileobj=gzipFile,
+                    compresslevel=self.gzipLevel,mtime=0) as compressor:
+                    for chunk in chunks:
+                        data=chunk.encode('utf-8')
+                        hasher.update(data)
+                        rawFile.write(data)
+                        compressor.write(data)
+                        size+=len(data)
+            digest=hasher.hexdigest()
+            filename=self.hashedFilename(name,digest)
+            gzipFilename=filename+'.gz'
+            path=os.path.join(self.outdir,filename)
+            gzipPath=os.path.join(self.outdir,gzipFilename)
+            gzipSize=os.path.getsize(gzipTemp)
+            previous=self.manifest.get(name)
+            unchanged=previous==filename and os.path.exists(path) \
+                and os.path.exists(gzipPath)
+            written=not unchanged
+            if written:
+                os.replace(rawTemp,path)
+                os.replace(gzipTemp,gzipPath)
+            if previous!=filename:
+                if previous is not None and self.removeStale:
+                    self._remove(previous)
+                self.manifest[name]=filename
+                self._manifestChanged=True
+        finally:
+            for temp in (rawTemp,gzipTemp):
+                if os.path.exists(temp):
+                    os.remove(temp)
+        return Artifact(name,filename,gzipFilename,digest,size,gzipSize,
+            written)
+
+    def write(self,
+        name:str,
+        rules:CssRulesCompatible,
+        compressionOrder:bool=False)->Artifact:
+        """
+        Write css, minified, as an output
+
+        (To write text that is already serialized, use writeChunks.)
+
+        :param name: the logical name (a path relative to outdir)
+        :param compressionOrder: see CssRules.getMinifiedCssString()
+        """
+        if not isinstance(rules,CssRules):
+            if hasattr(rules,'rules'):
+                rules=rules.rules # type: ignore
+            else:
+                rules=CssRules(rules)
+        chunks=iterMinifiedCssString(rules,compressionOrder)
+        return self.writeChunks(name,chunks)
+
+    def _remove(self,filename:str)->None:
+        """
+        Delete an old output and its gzipped copy
+        """
+        for path in (filename,filename+'.gz'):
+            path=os.path.join(self.outdir,path)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def saveManifest(self)->bool:
+        """
+        Write the manifest, if anything in it changed
+
+        :return: whether it was written
+        """
+        if not self._manifestChanged:
+            return False
+        manifestPath=os.path.join(self.outdir,self.manifestFilename)
+        temp=_tempPath(manifestPath)
+        with open(temp,'w',encoding='utf-8') as f:
+            json.dump(self.manifest,f,indent=4,sort_keys=True)
+            f.write('\n')
+        os.replace(temp,manifestPath)
+        self._manifestChanged=False
+        return True
+
+    def __enter__(self)->'ArtifactWriter':
+        return self
+
+    def __exit__(self,
+        excType:typing.Any,
+        excValue:typing.Any,
+        traceback:typing.Any
+        )->None:
+        if excType is None:
+            self.saveManifest()
@@ -0,0 +1,73 @@
+"""
+Asyncio versions of loading and parsing css
+
+File reads are done off of the event loop, and so is parsing,
+which is cpu bound.  Parsing runs in an executor of your choice
+(by default, the loop's default thread pool).
+
+asyncio itself is only imported when these are first called, so
+that importing the package stays quick for non-async users.
+
+NOTE: a ProcessPoolExecutor cannot be used, since parsed
+rules hold compiled selector matchers which cannot be pickled.
+"""
+import typing
+from .css import Css
+if typing.TYPE_CHECKING:
+    import concurrent.futures
+
+
+def _readFile(filename:str)->str:
+    with open(filename,'r',encoding='utf-8-sig') as f:
+        return f.read()
+
+
+async def aload(filename:str,
+    executor:typing.Optional['concurrent.futures.Executor']=None
+    )->Css:
+    """
+    Load and parse a css file without blocking the event loop
+
+    :param executor: where to do the reading and parsing
+        (default is the loop's default executor)
+    """
+    import asyncio
+    loop=asyncio.get_running_loop()
+    cssText=await loop.run_in_executor(executor,_readFile,filename)
+    # the filename has to be known before parsing, so that
+    # rule origins and source maps refer to it
+    return await loop.run_in_executor(executor,Css,filename,cssText)
+
+
+async def agatherParse(filenames:typing.Iterable[str],
+    limit:int=8,
+    executor:typing.Optional['concurrent.futures.Executor']=None
+    )->typing.List[Css]:
+    """
+    Load and parse many css files concurrently
+
+    If any of them fails, or this is cancelled, all of the
+    others still in progress are cancelled as well.
+
+    :param limit: the most files to be loading/parsing at once
+    :param executor: where to do the reading and parsing
+        (default is the loop's default executor)
+    :return: the parsed files, in the same order as filenames
+    """
+    import asyncio
+    if limit<1:
+        raise ValueError('limit must be at least 1, got %d'%limit)
+    semaphore=asyncio.Semaphore(limit)
+    async def loadOne(filename:str)->Css:
+        async with semaphore:
+            return await aload(filename,executor)
+    tasks=[asyncio.ensure_future(loadOne(filename)) for filename in filenames]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        # let the cancellations finish before going on
+        await asyncio.gather(*tasks,return_exceptions=True)
+        raise
+agather_parse=agatherParse
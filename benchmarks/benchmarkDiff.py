@@ -0,0 +1,33 @@
+"""
+Benchmark diffing two versions of a large generated stylesheet
+(100,000 rules by default, with child combinators in every
+selector) and report the time taken.
+
+Usage:
+    python -m cssTools.benchmarks.benchmarkDiff [numRules]
+"""
+import sys
+import time
+from cssTools.rules import CssRules
+from cssTools.benchmarks.benchmarkMinify import generateLargeCss
+
+
+def run(numRules:int=100000)->float:
+    """
+    Run the benchmark and print the report
+
+    :return: the seconds taken by the diff
+    """
+    cssText=generateLargeCss(numRules)
+    oldRules=CssRules(cssText)
+    # changes some colors, and with them some rules
+    newRules=CssRules(cssText.replace('color: #00','color: #01'))
+    startTime=time.perf_counter()
+    diff=oldRules.diff(newRules)
+    elapsed=time.perf_counter()-startTime
+    print('%d rules: %s in %.2fs'%(len(oldRules),diff.summary,elapsed))
+    return elapsed
+
+
+if __name__=='__main__':
+    run(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,66 @@
+"""
+Benchmark the minifier against the css files in the corpus
+directory (plus a large generated stylesheet) and report the
+bytes saved, raw and gzipped, and the time taken by each pass.
+
+Usage:
+    python -m cssTools.benchmarks.benchmarkMinify [cssFiles...]
+"""
+import typing
+import os
+import sys
+from cssTools.minify import benchmarkMinify,formatBenchmarkReport,\
+    MinifyBenchmark
+
+
+HERE=os.path.abspath(os.path.dirname(__file__))
+CORPUS_DIR=os.path.join(HERE,'corpus')
+
+
+def generateLargeCss(numRules:int=5000)->str:
+    """
+    Generate a large, repetitive stylesheet, like what
+    comes out of css frameworks and preprocessors
+    """
+    ret:typing.List[str]=[]
+    for i in range(numRules):
+        ret.append('.component-%d > .item-%d {\n'%(i%97,i))
+        ret.append('    color: #%02X%02X%02X;\n'%(i%256,(i*7)%256,(i*13)%256))
+        ret.append('    margin: 0px %dpx 0px %dpx;\n'%(i%5,i%5))
+        ret.append('    padding: 0.%d0em;\n'%(i%10))
+        ret.append('}\n')
+        if i%10==0:
+            ret.append('.component-%d > .item-%d { color: rgb(0, 0, 0); }\n'
+                %(i%97,i))
+        if i%25==0:
+            ret.append('.unused-%d { }\n'%i)
+    return ''.join(ret)
+
+
+def corpus(filenames:typing.Optional[typing.Iterable[str]]=None
+    )->typing.Iterator[typing.Tuple[str,str]]:
+    """
+    Get all the (name,css text) to benchmark
+    """
+    if not filenames:
+        filenames=[os.path.join(CORPUS_DIR,f)
+            for f in sorted(os.listdir(CORPUS_DIR)) if f.endswith('.css')]
+        yield ('generated(5000 rules)',generateLargeCss())
+    for filename in filenames:
+        with open(filename,'r',encoding='utf-8') as f:
+            yield (os.path.basename(filename),f.read())
+
+
+def run(filenames:typing.Optional[typing.Iterable[str]]=None
+    )->typing.List[MinifyBenchmark]:
+    """
+    Run the benchmark and print the report
+    """
+    results=[benchmarkMinify(name,cssText)
+        for name,cssText in corpus(filenames)]
+    print(formatBenchmarkReport(results))
+    return results
+
+
+if __name__=='__main__':
+    run(sys.argv[1:])
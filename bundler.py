@@ -0,0 +1,306 @@
+"""
+Resolve @import statements and bundle stylesheets together
+
+The bundler keeps a dependency graph of local stylesheets along
+with the parsed rules and a hash of each file.  When rebuilding,
+files whose size and modification time are unchanged are not even
+read, files that were touched but whose contents hash the same are
+not reparsed, and only the files that actually changed are parsed
+again.  That keeps rebuilds in a watch-mode dev server fast.
+"""
+import typing
+import os
+import re
+import hashlib
+from .cssParser import parseRules
+from .mediaQueries import MediaQueryList
+from .rules import CssRule,CssOpaqueRule,CssRules
+from .interning import CssInterner
+
+
+IMPORT_RE=re.compile(r"""
+    ^@import\s*
+    (?:url\(\s*(?:"(?P<urlDquoted>[^"]*)"|'(?P<urlSquoted>[^']*)'|(?P<url>[^)\s]*))\s*\)
+    |"(?P<dquoted>[^"]*)"|'(?P<squoted>[^']*)')
+    \s*(?P<media>.*?)\s*;?\s*$
+    """,re.DOTALL|re.IGNORECASE|re.VERBOSE)
+EXTERNAL_URL_RE=re.compile(r"""^(?:[a-z][-a-z0-9+.]*:|//)""",re.IGNORECASE)
+LAYER_OR_SUPPORTS_RE=re.compile(r"""(?:layer|supports)\b""",re.IGNORECASE)
+
+
+class CssImport(typing.NamedTuple):
+    """
+    A single @import statement
+
+    :param url: what is imported, as written
+    :param media: the media condition, if any (eg "screen")
+    :param statement: the full text of the statement
+    """
+    url:str
+    media:typing.Optional[str]
+    statement:str
+
+
+def parseImport(statement:str)->typing.Optional[CssImport]:
+    """
+    Parse an @import statement
+
+    :return: the import, or None if it is not an @import
+    """
+    m=IMPORT_RE.match(statement.strip())
+    if m is None:
+        return None
+    url=next(u for u in m.group('urlDquoted','urlSquoted','url',
+        'dquoted','squoted') if u is not None)
+    media=m.group('media') or None
+    return CssImport(url,media,statement)
+
+
+def _isExternal(cssImport:CssImport)->bool:
+    """
+    Whether an import has to be left to the browser
+    (a remote url, or a layer() or supports() condition)
+    """
+    if EXTERNAL_URL_RE.match(cssImport.url) is not None:
+        return True
+    if cssImport.media is None:
+        return False
+    return LAYER_OR_SUPPORTS_RE.match(cssImport.media) is not None
+
+
+def _simpleMedia(media:str)->bool:
+    """
+    Whether a media condition can be and-ed with another
+    just by joining them with " and "
+    """
+    return ',' not in media and re.match(r'(?:not|only)\b',media,
+        re.IGNORECASE) is None
+
+
+def _importWithin(cssImport:CssImport,
+    media:typing.Tuple[str,...]
+    )->CssImport:
+    """
+    Restrict an @import to the media of the file it came from
+
+    Where that can't be written as a single media condition
+    (eg "screen, print" or a layer()) it is left as it is.
+    """
+    levels=media
+    if cssImport.media is not None:
+        levels=media+(cssImport.media,)
+    if not media or not all(_simpleMedia(level) for level in levels):
+        return cssImport
+    if cssImport.media is not None \
+        and LAYER_OR_SUPPORTS_RE.match(cssImport.media) is not None:
+        return cssImport
+    statement=cssImport.statement.strip().rstrip(';').rstrip()
+    if cssImport.media is not None:
+        statement=statement[0:len(statement)-len(cssImport.media)].rstrip()
+    combined=' and '.join(levels)
+    return CssImport(cssImport.url,combined,'%s %s;'%(statement,combined))
+
+
+class StylesheetNode:
+    """
+    One file in the import graph
+    """
+
+    def __init__(self,filename:str,interner:typing.Optional[CssInterner]=None):
+        """
+        :param filename: the absolute path of the stylesheet
+        :param interner: if given, parse through it to share
+            identical parts with other stylesheets
+        """
+        self.filename=filename
+        self.interner=interner
+        self.hash:str=''
+        # (st_mtime_ns,st_size) when last read
+        self.stat:typing.Optional[typing.Tuple[int,int]]=None
+        self.rules:typing.List[CssRule]=[]
+        # (absolute filename,import) for local imports
+        self.imports:typing.List[typing.Tuple[str,CssImport]]=[]
+        # imports that cannot be bundled (remote urls, layers, etc)
+        self.externalImports:typing.List[CssImport]=[]
+        # how many local imports come before each external one
+        self.externalPositions:typing.List[int]=[]
+        self.parseCount=0
+
+    def refresh(self)->bool:
+        """
+        Bring this node up to date with the file on disk
+
+        :return: whether the contents changed
+        """
+        st=os.stat(self.filename)
+        stat=(st.st_mtime_ns,st.st_size)
+        if stat==self.stat:
+            return False
+        with open(self.filename,'rb') as f:
+            data=f.read()
+        self.stat=stat
+        fileHash=hashlib.sha256(data).hexdigest()
+        if fileHash==self.hash:
+            return False
+        self.hash=fileHash
+        self._parse(data.decode('utf-8-sig'))
+        return True
+
+    def _parse(self,cssText:str)->None:
+        """
+        Parse the file contents into rules and imports
+        """
+        self.parseCount+=1
+        self.rules=[]
+        self.imports=[]
+        self.externalImports=[]
+        self.externalPositions=[]
+        directory=os.path.dirname(self.filename)
+        for parsed in parseRules(cssText):
+            if parsed.styles is not None:
+                if self.interner is not None:
+                    self.rules.append(self.interner.rule(
+                        parsed.selectors,parsed.styles,parsed.media))
+                    continue
+                media=MediaQueryList(parsed.media) if parsed.media else None
+                self.rules.append(
+                    CssRule(parsed.selectors,parsed.styles,media))
+                continue
+            cssImport=parseImport(parsed.selectors)
+            if cssImport is None:
+                # @keyframes, @supports, etc are kept as they are,
+                # but the bundle has a single encoding of its own
+                if not parsed.selectors.lower().startswith('@charset'):
+                    media=None
+                    if parsed.media:
+                        media=MediaQueryList(parsed.media)
+                    self.rules.append(CssOpaqueRule(parsed.selectors,media))
+                continue
+            if _isExternal(cssImport):
+                self.externalImports.append(cssImport)
+                self.externalPositions.append(len(self.imports))
+                continue
+            importPath=cssImport.url.split('?',1)[0].split('#',1)[0]
+            importFilename=os.path.normpath(os.path.join(directory,importPath))
+            self.imports.append((importFilename,cssImport))
+
+
+class CssBundler:
+    """
+    Bundles a stylesheet and everything it @imports (recursively)
+    into a single set of rules, in cascade order.
+
+    Each file is only included once, where it is first imported.
+    Import cycles are broken where they are found.
+
+    Imports that can't be bundled (remote urls, and those with a
+    layer() or supports() condition) are kept as @import statements
+    at the top of the bundle, in the order they were found.
+
+    NOTE: the rules in a bundle are shared with the bundler's
+    cache, so copy them before modifying them in place (eg minify)
+    if you want to rebuild later.
+    """
+
+    def __init__(self,filename:str,interner:typing.Optional[CssInterner]=None):
+        """
+        :param filename: the entry-point stylesheet
+        :param interner: if given, parse through it to share
+            identical parts with other stylesheets
+        """
+        self.filename=os.path.abspath(filename)
+        self.interner=interner
+        self._nodes:typing.Dict[str,StylesheetNode]={}
+        self.externalImports:typing.List[CssImport]=[]
+        # {filename:[filenames it imports]}
+        self.graph:typing.Dict[str,typing.List[str]]={}
+
+    @property
+    def fileHashes(self)->typing.Dict[str,str]:
+        """
+        {filename:sha256 of its contents} for every
+        file in the bundle
+        """
+        return {filename:self._nodes[filename].hash for filename in self.graph}
+
+    def _node(self,filename:str)->StylesheetNode:
+        node=self._nodes.get(filename)
+        if node is None:
+            node=StylesheetNode(filename,self.interner)
+            self._nodes[filename]=node
+        return node
+
+    def build(self)->CssRules:
+        """
+        Build (or rebuild) the bundle, reparsing only the
+        files that have changed since the last build.
+
+        The bundle starts with the imports that could not be
+        bundled (also listed in externalImports), since @import
+        has to come before any other rule.  Those found in a file
+        that was itself imported with a media condition are given
+        that condition too.
+
+        :raises FileNotFoundError: if an imported file is missing
+        """
+        self.graph={}
+        self.externalImports=[]
+        rules:typing.List[CssRule]=[]
+        self._include(self.filename,(),rules)
+        # forget files that are no longer imported
+        for filename in list(self._nodes):
+            if filename not in self.graph:
+                del self._nodes[filename]
+        statements=dict.fromkeys(cssImport.statement.strip().rstrip(';')+';'
+            for cssImport in self.externalImports)
+        imports:typing.List[CssRule]=[
+            CssOpaqueRule(statement) for statement in statements]
+        return CssRules(imports+rules)
+    rebuild=build
+
+    def _include(self,
+        filename:str,
+        media:typing.Tuple[str,...],
+        rules:typing.List[CssRule]
+        )->None:
+        """
+        Add a file, and everything it imports, to the bundle
+        """
+        node=self._node(filename)
+        node.refresh()
+        self.graph[filename]=list(dict.fromkeys(
+            importFilename for importFilename,_ in node.imports))
+        # external imports go in the order they are found,
+        # including those in the files imported along the way
+        externals=list(zip(node.externalPositions,node.externalImports))
+        for position,(importFilename,cssImport) in enumerate(node.imports):
+            while externals and externals[0][0]<=position:
+                self.externalImports.append(
+                    _importWithin(externals.pop(0)[1],media))
+            if importFilename in self.graph:
+                # already included (or a cycle)
+                continue
+            importMedia=media
+            if cssImport.media is not None:
+                importMedia=media+(cssImport.media,)
+            self._include(importFilename,importMedia,rules)
+        for _,cssImport in externals:
+            self.externalImports.append(_importWithin(cssImport,media))
+        if not media:
+            rules.extend(node.rules)
+            return
+        for rule in node.rules:
+            levels=media if rule.media is None else media+rule.media.levels
+            ruleMedia=MediaQueryList(levels)
+            if rule.isOpaque:
+                rules.append(CssOpaqueRule(rule.text,ruleMedia)) # type: ignore
+            else:
+                rules.append(CssRule(rule.selectors,rule.styles,ruleMedia))
+
+    @property
+    def parseCount(self)->int:
+        """
+        How many times files have been parsed, in total
+        (useful for checking that rebuilds are incremental)
+        """
+        return sum(node.parseCount for node in self._nodes.values())
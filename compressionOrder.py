@@ -0,0 +1,267 @@
+"""
+Reorder css to compress better
+
+gzip finds repeated substrings within a sliding window, so the
+closer together similar text is, the smaller the output.  This
+puts the declarations of every rule into a canonical order (so
+identical blocks are byte-for-byte identical) and moves rules with
+similar declarations next to each other, but only where the
+cascade allows it.
+
+Two declarations (or rules) are only ever swapped if they cannot
+affect each other, meaning they set no properties in common,
+including through shorthands.
+"""
+import typing
+import gzip
+import heapq
+from .shorthands import SHORTHANDS,SHORTHANDS_LIST
+if typing.TYPE_CHECKING:
+    from .rules import CssRule
+
+
+VENDOR_PREFIXES=('-webkit-','-moz-','-ms-','-o-')
+# properties that overlap with ones not sharing their first word
+PROPERTY_FAMILY_OVERRIDES:typing.Dict[str,str]={
+    'top':'inset','right':'inset','bottom':'inset','left':'inset',
+    'row-gap':'gap','column-gap':'gap','grid-gap':'gap',
+    'grid-row-gap':'gap','grid-column-gap':'gap',
+    'columns':'column','justify-content':'place','justify-items':'place',
+    'justify-self':'place','align-content':'place','align-items':'place',
+    'align-self':'place','width':'size','height':'size',
+    'inline-size':'size','block-size':'size','white-space':'text'}
+
+
+def _nameFamily(name:str)->str:
+    """
+    The family of a property the SHORTHANDS table knows nothing
+    about, from its first word (eg transition-delay -> transition)
+    """
+    family=PROPERTY_FAMILY_OVERRIDES.get(name)
+    if family is None:
+        family=name.split('-',1)[0]
+        family=PROPERTY_FAMILY_OVERRIDES.get(family,family)
+    return family
+
+
+def _tableFamilies()->typing.Dict[str,str]:
+    """
+    Group every property in the SHORTHANDS table with everything
+    that sets it, or that it resets (so font, line-height and
+    font-variant-caps all end up together)
+
+    :return: {property:family}
+    """
+    ret:typing.Dict[str,str]={}
+    for shorthand in SHORTHANDS_LIST:
+        members=(shorthand.name,)+shorthand.longhands+shorthand.resets
+        family=_nameFamily(shorthand.name)
+        joined={ret[member] for member in members if member in ret}
+        for name,previous in ret.items():
+            if previous in joined:
+                ret[name]=family
+        for member in members:
+            ret[member]=family
+    return ret
+
+# {property:family} for everything in the SHORTHANDS table
+TABLE_FAMILIES:typing.Dict[str,str]=_tableFamilies()
+
+
+def propertyFamily(name:str)->str:
+    """
+    Get a name shared by every property that could possibly
+    overlap with this one, eg
+        margin-top -> margin
+        line-height -> font
+        -webkit-transition-delay -> transition
+        top -> inset
+
+    Properties in the SHORTHANDS table are grouped by what their
+    shorthands set and reset.  Anything else falls back on its
+    first word, and shares that family with the table's own
+    properties of the same name, eg grid-row with grid-row-start.
+    """
+    if name.startswith('--'):
+        return name
+    for prefix in VENDOR_PREFIXES:
+        if name.startswith(prefix):
+            name=name[len(prefix):]
+            break
+    family=TABLE_FAMILIES.get(name)
+    if family is None:
+        family=_nameFamily(name)
+    return family
+
+
+def _longhandsOf(name:str)->typing.Set[str]:
+    shorthand=SHORTHANDS.get(name)
+    if shorthand is None:
+        return {name}
+    return set(shorthand.longhands+shorthand.resets)
+
+
+def propertiesOverlap(name1:str,name2:str)->bool:
+    """
+    Whether setting one property can change the value of the other
+    (eg margin and margin-top, or border-width and border-top)
+    """
+    if name1==name2:
+        return True
+    if name1.startswith(name2+'-') or name2.startswith(name1+'-'):
+        return True
+    return not _longhandsOf(name1).isdisjoint(_longhandsOf(name2))
+
+
+def canonicalDeclarationOrder(
+    declarations:typing.Iterable[typing.Tuple[str,str]]
+    )->typing.List[typing.Tuple[str,str]]:
+    """
+    Sort declarations into a canonical order, wherever
+    doing so does not change their meaning.
+
+    Declarations are grouped by propertyFamily() and the groups
+    sorted by name.  Within a group, declarations are sorted by
+    name unless any two of them overlap, in which case their
+    original order is kept.
+    """
+    declarations=list(declarations)
+    if any(name=='all' for name,_ in declarations):
+        # "all" overlaps with everything
+        return declarations
+    families:typing.Dict[str,typing.List[typing.Tuple[str,str]]]={}
+    for declaration in declarations:
+        family=propertyFamily(declaration[0])
+        families.setdefault(family,[]).append(declaration)
+    ret:typing.List[typing.Tuple[str,str]]=[]
+    for family in sorted(families):
+        group=families[family]
+        if len(group)>1:
+            names=[name for name,_ in group]
+            if not any(propertiesOverlap(names[i],names[j])
+                for i in range(len(names)) for j in range(i+1,len(names))):
+                group=sorted(group,key=lambda declaration: declaration[0])
+        ret.extend(group)
+    return ret
+
+
+def compressionOrderIndexes(rules:typing.Sequence['CssRule']
+    )->typing.List[int]:
+    """
+    Reorder rules so that those with similar declarations are
+    next to each other, as far as the cascade allows.
+
+    A rule never moves past another rule that sets an overlapping
+    property, or out of its @media block.  Since every rule that
+    sets properties of a given family stays in the same order
+    relative to the others, the result is the same for any
+    element, whatever selectors it matches.
+
+    :return: the indexes of the rules, in the new order
+    """
+    ret:typing.List[int]=[]
+    run:typing.List[int]=[]
+    runLevels:typing.Optional[typing.Tuple[str,...]]=None
+    for i,rule in enumerate(rules):
+        levels=() if rule.media is None else rule.media.levels
+        if rule.isAtRule or levels!=runLevels:
+            ret.extend(_reorderRun(rules,run))
+            run=[]
+            runLevels=levels
+            if rule.isAtRule:
+                ret.append(i)
+                runLevels=None
+                continue
+        run.append(i)
+    ret.extend(_reorderRun(rules,run))
+    return ret
+
+
+def compressionOrderRules(rules:typing.Iterable['CssRule']
+    )->typing.List['CssRule']:
+    """
+    Reorder rules so that those with similar declarations are
+    next to each other, as far as the cascade allows.
+    (See compressionOrderIndexes())
+
+    :return: the rules in the new order (the rules themselves
+        are not changed)
+    """
+    rules=list(rules)
+    return [rules[i] for i in compressionOrderIndexes(rules)]
+
+
+def _reorderRun(rules:typing.Sequence['CssRule'],
+    run:typing.List[int]
+    )->typing.List[int]:
+    """
+    Reorder a run of rules that are all in the same @media
+
+    :param run: indexes of the rules in the run
+    """
+    if len(run)<3:
+        return run
+    # rule i must come after numBlocking[i] other rules
+    numBlocking=[0]*len(run)
+    unblocks:typing.List[typing.List[int]]=[[] for _ in run]
+    lastUser:typing.Dict[str,int]={}
+    keys:typing.List[str]=[]
+    for i,ruleIndex in enumerate(run):
+        declarations=canonicalDeclarationOrder(rules[ruleIndex].styles.items())
+        keys.append(';'.join('%s:%s'%kv for kv in declarations))
+        blockers:typing.Set[int]=set()
+        for name,_ in declarations:
+            family='*' if name=='all' else propertyFamily(name)
+            if family=='*':
+                blockers.update(lastUser.values())
+            elif '*' in lastUser:
+                blockers.add(lastUser['*'])
+            if family in lastUser:
+                blockers.add(lastUser[family])
+            lastUser[family]=i
+        blockers.discard(i)
+        for blocker in blockers:
+            unblocks[blocker].append(i)
+        numBlocking[i]=len(blockers)
+    ready=[(keys[i],i) for i in range(len(run)) if numBlocking[i]==0]
+    heapq.heapify(ready)
+    ret:typing.List[int]=[]
+    while ready:
+        _,i=heapq.heappop(ready)
+        ret.append(run[i])
+        for j in unblocks[i]:
+            numBlocking[j]-=1
+            if numBlocking[j]==0:
+                heapq.heappush(ready,(keys[j],j))
+    return ret
+
+
+def gzipSize(text:typing.Union[str,bytes])->int:
+    """
+    The size of some text once gzipped (at the default level)
+    """
+    if isinstance(text,str):
+        text=text.encode('utf-8')
+    return len(gzip.compress(text,mtime=0))
+
+
+class CompressionGain(typing.NamedTuple):
+    """
+    The effect of compression ordering on the size of some css
+
+    :param rawBefore: bytes in the original order
+    :param rawAfter: bytes in compression order
+    :param gzipBefore: gzipped bytes in the original order
+    :param gzipAfter: gzipped bytes in compression order
+    """
+    rawBefore:int
+    rawAfter:int
+    gzipBefore:int
+    gzipAfter:int
+
+    @property
+    def gzipSaved(self)->int:
+        """
+        gzipped bytes saved by reordering
+        """
+        return self.gzipBefore-self.gzipAfter
@@ -2,12 +2,27 @@
 a handy, pythonic class wrapper around css
 """
 import typing
+import os
 from paths import UrlCompatible
 from htmlTools import Text,Html
 from .rules import CssRules,CssRulesCompatible,CssRule
 from .htmlTypes import HtmlElementLike
 from .cssStyles import CssStyles,CssStylesCompatible,asCssStyles
 from .cssSelectors import CssSelectorCompatible
+from .mediaQueries import MediaContext
+from .minify import MinifyPassCompatible,Timings
+from .compressionOrder import CompressionGain
+from .bundler import CssBundler
+from .sourceMaps import SourceMap
+from .frozenCss import FrozenCss
+from .matchCache import MatchCacheStats
+from .interning import CssInterner
+from .cssDiff import CssDiff
+from .selectorCost import SelectorAnalysis,analyzeSelectors
+from .inliner import CssInliner,DocumentCompatible
+from .cssMerge import MergeResult
+from .artifacts import Artifact,ArtifactWriter
+from .pageSplitter import splitCss,computeRuleUsage,PageBundles,PagesCompatible
 
 
 CssCompatible=CssRulesCompatible
@@ -34,15 +49,75 @@ class Css(Text):
 
     def __init__(self,
         filename:typing.Optional[UrlCompatible]=None,
-        data:typing.Optional[CssCompatible]=None):
-        """ """
+        data:typing.Optional[CssCompatible]=None,
+        interner:typing.Optional[CssInterner]=None):
+        """
+        :param interner: share selectors, values and declaration
+            blocks with other stylesheets parsed through it
+        """
+        self.rules:CssRules=CssRules(interner=interner)
+        if filename is not None:
+            self.rules.sourceName=str(filename)
         Text.__init__(self,filename)
         if data is not None:
             self.assign(data)
         self.suggestions_separator='_'
         self.suggestions_firstchar='abcdefghijklmnopurstuvwxyz'
         self.suggestions_otherchars='123456789abcdefghijklmnopurstuvwxyz'
-        self.rules:CssRules=CssRules()
+
+    @classmethod
+    def fromBundle(cls,
+        filename:str,
+        interner:typing.Optional[CssInterner]=None
+        )->'Css':
+        """
+        Load a stylesheet along with everything it @imports,
+        bundled into one
+
+        Imports that can't be bundled, like remote urls, are kept
+        as @import statements at the top (see CssBundler.build).
+
+        (To rebuild repeatedly, as a dev server would, keep
+        a CssBundler around instead.)
+
+        :param interner: share selectors, values and declaration
+            blocks with other stylesheets parsed through it
+        """
+        return cls(data=CssBundler(filename,interner).build())
+
+    @classmethod
+    def fromMappedFile(cls,
+        filename:str,
+        interner:typing.Optional[CssInterner]=None,
+        encoding:str='utf-8-sig'
+        )->'Css':
+        """
+        Load a (very large) css file by parsing a memory map of it,
+        so that the whole text is never in memory at once
+
+        (The rules have no source spans, see CssRules.loadMapped.)
+
+        :param interner: share selectors, values and declaration
+            blocks with other stylesheets parsed through it
+        """
+        ret=cls(interner=interner)
+        ret.rules.sourceName=filename
+        ret.rules.loadMapped(filename,encoding)
+        return ret
+
+    @classmethod
+    async def aload(cls,
+        filename:str,
+        executor:typing.Optional[typing.Any]=None
+        )->'Css':
+        """
+        Load and parse a css file without blocking the event loop
+
+        :param executor: a concurrent.futures executor to read and
+            parse in (default is the loop's default executor)
+        """
+        from .asyncCss import aload
+        return await aload(filename,executor)
 
     @typing.overload
     def __getitem__(self,idx:int
@@ -73,6 +148,26 @@ class Css(Text):
                 return rule
         return None
 
+    def diff(self,other:CssCompatible)->CssDiff:
+        """
+        Find which rules were added, removed, moved or modified
+        going from this css to another version of it
+
+        :param other: the new version
+        """
+        return self.rules.diff(other)
+
+    def analyze(self,document:typing.Any=None)->SelectorAnalysis:
+        """
+        Estimate how expensive each selector is to match,
+        to find the ones worth rewriting
+
+        :param document: measure how often selectors are tried
+            on the elements of this document (otherwise typical
+            rates are assumed)
+        """
+        return analyzeSelectors(self.rules,document)
+
     def hasSelector(self,cssSelector:CssSelectorCompatible)->bool:
         """
         determine if the thing has a given css selector
@@ -83,24 +178,232 @@ class Css(Text):
         return self.rules.hasSelector(cssSelector)
 
     def getRulesForElement(self,
-        element:HtmlElementLike
+        element:HtmlElementLike,
+        media:typing.Optional[MediaContext]=None
         )->typing.Iterable[CssRule]:
         """
         get all rules that apply to a given element
+
+        :param media: only include rules in effect for this media
+            (if None, media conditions are ignored)
         """
-        return self.rules.getRulesForElement(element)
+        return self.rules.getRulesForElement(element,media=media)
     getRules=getRulesForElement
 
+    def getRulesForMedia(self,
+        media:typing.Optional[MediaContext]
+        )->typing.List[CssRule]:
+        """
+        Get the rules that are in effect for a given media context
+        (cached per context)
+        """
+        return self.rules.getRulesForMedia(media)
+
     def getStyles(self,
-        element:HtmlElementLike
+        element:HtmlElementLike,
+        media:typing.Optional[MediaContext]=None
         )->typing.Optional[CssStyles]:
         """
         create a combined style that collects all styles
         that apply to a given element
         """
-        return self.rules.getStyles(element)
+        return self.rules.getStyles(element,media=media)
     getStyle=getStyles
 
+    def enableMatchCache(self,maxSize:int=1024)->None:
+        """
+        Cache the rules matched by elements, so that repeated
+        getStyles() calls for the same (or identical) elements are fast
+
+        :param maxSize: the most element signatures to remember
+        """
+        self.rules.enableMatchCache(maxSize)
+
+    def disableMatchCache(self)->None:
+        """
+        Stop caching matched rules
+        """
+        self.rules.disableMatchCache()
+
+    def invalidateMatchCache(self,
+        element:typing.Optional[HtmlElementLike]=None
+        )->None:
+        """
+        Throw away cached matches, eg after modifying rules in place
+
+        :param element: only forget this element, otherwise everything
+        """
+        self.rules.invalidateMatchCache(element)
+
+    @property
+    def matchCacheStats(self)->typing.Optional[MatchCacheStats]:
+        """
+        Hit/miss statistics of the match cache
+        (None if it is not enabled)
+        """
+        return self.rules.matchCacheStats
+
+    def getStylesForDocument(self,
+        document:typing.Any,
+        media:typing.Optional[MediaContext]=None,
+        resolveVariables:bool=False
+        )->typing.Dict[HtmlElementLike,CssStyles]:
+        """
+        Get the styles for every element in a document
+        in a single traversal
+
+        :param resolveVariables: replace var() references with the
+            values of the custom properties each element inherits
+        :return: {element:styles}
+        """
+        return self.rules.getStylesForDocument(document,media,resolveVariables)
+
+    def inline(self,
+        document:DocumentCompatible,
+        media:typing.Optional[MediaContext]=None
+        )->DocumentCompatible:
+        """
+        Write the styles of every element of a document into
+        its style="" attribute, as for html email
+
+        The selectors are compiled once and reused for every
+        document, until the rules change.  See CssInliner.
+
+        :param document: html text, or a parsed document (which
+            is modified in place)
+        :param media: also inline @media rules in effect for this
+            (otherwise they are left for a <style> element,
+            see getInliner().leftoverCss)
+        :return: html text if given html text, otherwise the document
+        """
+        return self.rules.getInliner(media).inline(document)
+
+    def inlineMany(self,
+        documents:typing.Iterable[DocumentCompatible],
+        media:typing.Optional[MediaContext]=None,
+        jobs:typing.Optional[int]=1
+        )->typing.List[DocumentCompatible]:
+        """
+        Inline styles into a batch of documents that share this css
+
+        :param jobs: how many documents to process in parallel
+            (None is the number of cpus)
+        :return: the results, in the same order (see inline())
+        """
+        return self.rules.getInliner(media).inlineMany(documents,jobs)
+
+    def getInliner(self,media:typing.Optional[MediaContext]=None)->CssInliner:
+        """
+        Get the compiled inliner for this css
+        """
+        return self.rules.getInliner(media)
+
+    def flattenVariables(self,removeDefinitions:bool=True)->int:
+        """
+        Replace var() references with the values of :root custom
+        properties wherever that is safe to do without a document.
+
+        :return: the number of values that were changed
+        """
+        return self.rules.flattenVariables(removeDefinitions)
+
+    def minify(self,
+        passes:typing.Optional[typing.Iterable[MinifyPassCompatible]]=None,
+        timings:typing.Optional[Timings]=None,
+        sourceMap:typing.Optional[SourceMap]=None
+        )->str:
+        """
+        Minify this css in-place
+
+        :param passes: the passes to run (default is all of MINIFY_PASSES)
+        :param timings: if given, accumulates {passName:seconds}
+        :param sourceMap: if given, mappings from the minified css
+            back to the original source are added to it
+        :return: the minified css text
+        """
+        return self.rules.minify(passes,timings,sourceMap)
+
+    def getMinifiedCssString(self,
+        compressionOrder:bool=False,
+        sourceMap:typing.Optional[SourceMap]=None
+        )->str:
+        """
+        Returns the css text with no unnecessary whitespace
+
+        :param compressionOrder: reorder declarations and rules,
+            wherever the cascade allows, so that the output compresses
+            better
+        :param sourceMap: if given, mappings from the start of each
+            rule back to where it came from are added to it
+        """
+        return self.rules.getMinifiedCssString(compressionOrder,sourceMap)
+
+    def writeArtifact(self,
+        writer:ArtifactWriter,
+        name:typing.Optional[str]=None,
+        compressionOrder:bool=False
+        )->Artifact:
+        """
+        Write this css, minified, to a content-hashed file
+        with a gzipped copy, in a single pass
+
+        :param name: the logical name in the manifest
+            (default is the name of the file it came from)
+        """
+        if name is None:
+            if self.rules.sourceName=='<css>':
+                raise ValueError(
+                    'css that did not come from a file needs a name')
+            name=os.path.basename(self.rules.sourceName)
+        return writer.write(name,self.rules,compressionOrder)
+
+    def getCompressionGain(self,minified:bool=True)->CompressionGain:
+        """
+        Measure how much smaller the gzipped css gets
+        when written in compression order
+        """
+        return self.rules.getCompressionGain(minified)
+
+    def getRuleUsage(self,
+        pages:PagesCompatible,
+        jobs:typing.Optional[int]=None
+        )->typing.Dict[str,typing.Set[int]]:
+        """
+        Work out which rules each of a set of pages uses
+
+        :param pages: {pageName:page} where a page is a parsed
+            document/element or html text
+        :param jobs: how many pages to process in parallel
+        :return: {pageName:set of rule indexes}
+        """
+        return computeRuleUsage(self.rules,pages,jobs)
+
+    def splitForPages(self,
+        pages:PagesCompatible,
+        sharedThreshold:float=0.5,
+        jobs:typing.Optional[int]=None
+        )->PageBundles:
+        """
+        Split this css into a shared bundle, used by most pages,
+        plus small bundles for each page.
+
+        :param pages: {pageName:page} where a page is a parsed
+            document/element or html text
+        :param sharedThreshold: rules used by at least this fraction
+            of the pages go in the shared bundle
+        :param jobs: how many pages to process in parallel
+        """
+        return splitCss(self.rules,pages,sharedThreshold,jobs)
+
+    def freeze(self)->FrozenCss:
+        """
+        Take an immutable, fully precompiled snapshot of this css,
+        which any number of threads can query at once without locks
+
+        (Later changes to this Css do not affect the snapshot.)
+        """
+        return FrozenCss(self.rules)
+
     def assign(self, # type: ignore
         rule:CssRulesCompatible
         )->None:
@@ -123,7 +426,21 @@ class Css(Text):
     add=addCssRules
     append=addCssRules
     extend=addCssRules
-    merge=addCssRules
+
+    def merge(self,
+        *others:CssCompatible,
+        names:typing.Optional[typing.Iterable[str]]=None
+        )->MergeResult:
+        """
+        Merge other stylesheets into this one (later ones win),
+        collapsing exact duplicate rules and reporting conflicting
+        declarations for the same selector
+
+        :param names: what to call this and each of the others
+            in the conflict report (default is their sourceNames)
+        :return: the merged rules and the conflicts
+        """
+        return self.rules.merge(*others,names=names)
 
     def __iter__(self)->typing.Iterator[CssRule]:
         return iter(self.rules)
@@ -229,12 +546,35 @@ class Css(Text):
                 else:
                     el.tagName=translation
 
-    def getCssString(self,indent='\t',prepend='\n'):
+    def getCssString(self,indent='\t',prepend='\n',compressionOrder=False,
+        sourceMap:typing.Optional[SourceMap]=None):
         """
         Returns the css text
+
+        :param compressionOrder: reorder declarations and rules,
+            wherever the cascade allows, so that the output compresses
+            better
+        :param sourceMap: if given, mappings from the start of each
+            rule back to where it came from are added to it
+        """
+        return self.rules.getCssString(indent,prepend,
+            compressionOrder,sourceMap)
+
+    def setCssString(self,cssString:str)->None:
+        """
+        Assign the css text, reparsing only what changed
+        """
+        self.rules.setCssString(cssString)
+
+    def applyEdit(self,start:int,end:int,newText:str)->typing.Tuple[int,int]:
+        """
+        Replace the source css text from start to end with newText,
+        reparsing only the rules that overlap the edit
+
+        :return: (first index,end index) of the rules that now
+            occupy the edited area
         """
-        return self.rules.getCssString(indent,prepend)
-    setCssString=assign
+        return self.rules.applyEdit(start,end,newText)
 
     @property
     def cssString(self)->str:
@@ -0,0 +1,412 @@
+"""
+Structural diff between two versions of a stylesheet
+
+Rules are paired up by hashing, not by comparing every rule with
+every other one, so this is linear in the number of rules:
+
+  1. rules with the same media and selectors are paired, in order
+  2. remaining rules with the same media and declarations are
+     paired (their selectors changed)
+  3. whatever is left was added or removed
+
+Paired rules whose declarations differ are reported as modified,
+with declaration-level detail.  That includes declarations that
+were only reordered, if they overlap (eg margin and margin-top).
+Paired rules that are unchanged but out of order relative to the
+others (that is, not part of the longest run that kept its order)
+are reported as moved.
+"""
+import typing
+import re
+import bisect
+from .minify import minifySelector,minifyMedia
+from .compressionOrder import propertiesOverlap
+if typing.TYPE_CHECKING:
+    from .rules import CssRule
+
+
+# {name:value}
+DeclarationMap=typing.Dict[str,str]
+# selectors that minifySelector() could change
+NEEDS_MINIFY_RE=re.compile(r"""\s\s|[>+~\t\r\n\f]""")
+
+
+class RuleChange(typing.NamedTuple):
+    """
+    How a single rule differs between two stylesheets
+
+    :param kind: "added", "removed", "moved" or "modified"
+    :param oldIndex: where the rule was (None if added)
+    :param newIndex: where the rule is now (None if removed)
+    :param oldRule: the rule before (None if added)
+    :param newRule: the rule after (None if removed)
+    :param addedDeclarations: {name:value} only in the new rule
+    :param removedDeclarations: {name:value} only in the old rule
+    :param changedDeclarations: {name:(old value,new value)}
+    :param addedSelectors: selectors only in the new rule
+    :param removedSelectors: selectors only in the old rule
+    :param moved: for modified rules, whether it also moved
+    :param reorderedDeclarations: properties that are now in a
+        different order relative to others they overlap with
+        (eg margin and margin-top), which changes what applies
+    """
+    kind:str
+    oldIndex:typing.Optional[int]
+    newIndex:typing.Optional[int]
+    oldRule:typing.Optional['CssRule']
+    newRule:typing.Optional['CssRule']
+    addedDeclarations:DeclarationMap={}
+    removedDeclarations:DeclarationMap={}
+    changedDeclarations:typing.Dict[str,typing.Tuple[str,str]]={}
+    addedSelectors:typing.Tuple[str,...]=()
+    removedSelectors:typing.Tuple[str,...]=()
+    moved:bool=False
+    reorderedDeclarations:typing.Tuple[str,...]=()
+
+    def __str__(self)->str:
+        rule=self.newRule if self.newRule is not None else self.oldRule
+        assert rule is not None
+        ret=['%s %s'%(self.kind,_ruleName(rule))]
+        for selector in self.removedSelectors:
+            ret.append('\t- selector %s'%selector)
+        for selector in self.addedSelectors:
+            ret.append('\t+ selector %s'%selector)
+        for name,value in self.removedDeclarations.items():
+            ret.append('\t- %s: %s'%(name,value))
+        for name,value in self.addedDeclarations.items():
+            ret.append('\t+ %s: %s'%(name,value))
+        for name,(oldValue,newValue) in self.changedDeclarations.items():
+            ret.append('\t~ %s: %s -> %s'%(name,oldValue,newValue))
+        if self.reorderedDeclarations:
+            reordered=', '.join(self.reorderedDeclarations)
+            ret.append('\t^ reordered %s'%reordered)
+        return '\n'.join(ret)
+
+
+def _ruleName(rule:'CssRule')->str:
+    if rule.isOpaque:
+        name=rule.text # type: ignore
+    else:
+        name=', '.join(str(selector) for selector in rule.selectors)
+    if rule.media is not None:
+        name='@media %s { %s }'%(' and '.join(rule.media.levels),name)
+    return name
+
+
+class CssDiff:
+    """
+    The differences between two stylesheets
+    """
+
+    def __init__(self,
+        changes:typing.List[RuleChange],
+        numUnchanged:int):
+        """
+        :param changes: every change, in new-stylesheet order
+            (with removed rules after the rules they came after)
+        :param numUnchanged: how many rules are the same and in place
+        """
+        self.changes=changes
+        self.numUnchanged=numUnchanged
+
+    def _ofKind(self,kind:str)->typing.List[RuleChange]:
+        return [change for change in self.changes if change.kind==kind]
+
+    @property
+    def added(self)->typing.List[RuleChange]:
+        """
+        Rules only in the new stylesheet
+        """
+        return self._ofKind('added')
+
+    @property
+    def removed(self)->typing.List[RuleChange]:
+        """
+        Rules only in the old stylesheet
+        """
+        return self._ofKind('removed')
+
+    @property
+    def moved(self)->typing.List[RuleChange]:
+        """
+        Rules that are unchanged, but in a different order
+        """
+        return self._ofKind('moved')
+
+    @property
+    def modified(self)->typing.List[RuleChange]:
+        """
+        Rules whose declarations or selectors changed
+        """
+        return self._ofKind('modified')
+
+    def __len__(self)->int:
+        return len(self.changes)
+
+    def __bool__(self)->bool:
+        return bool(self.changes)
+
+    def __iter__(self)->typing.Iterator[RuleChange]:
+        return iter(self.changes)
+
+    @property
+    def summary(self)->str:
+        """
+        eg "2 added, 1 removed, 0 moved, 3 modified, 120 unchanged"
+        """
+        counts={kind:0 for kind in ('added','removed','moved','modified')}
+        for change in self.changes:
+            counts[change.kind]+=1
+        return '%d added, %d removed, %d moved, %d modified, %d unchanged'%(
+            counts['added'],counts['removed'],counts['moved'],
+            counts['modified'],self.numUnchanged)
+
+    def __str__(self)->str:
+        lines=[self.summary]+[str(change) for change in self.changes]
+        return '\n'.join(lines)
+    __repr__=__str__
+
+
+def _longestIncreasing(values:typing.Sequence[int])->typing.Set[int]:
+    """
+    Find the positions of a longest strictly increasing subsequence
+    """
+    tails:typing.List[int]=[]
+    tailPositions:typing.List[int]=[]
+    previous=[-1]*len(values)
+    for position,value in enumerate(values):
+        i=bisect.bisect_left(tails,value)
+        if i==len(tails):
+            tails.append(value)
+            tailPositions.append(position)
+        else:
+            tails[i]=value
+            tailPositions[i]=position
+        previous[position]=tailPositions[i-1] if i>0 else -1
+    ret:typing.Set[int]=set()
+    position=tailPositions[-1] if tailPositions else -1
+    while position>=0:
+        ret.add(position)
+        position=previous[position]
+    return ret
+
+
+def diffRules(oldRules:typing.Sequence['CssRule'],
+    newRules:typing.Sequence['CssRule']
+    )->CssDiff:
+    """
+    Find the differences between two lists of rules
+    """
+    mediaCache:typing.Dict[typing.Tuple[str,...],typing.Tuple[str,...]]={():()}
+    # {selector:minified selector}, since big sheets repeat selectors
+    # (in both versions), and minifySelector() is slow
+    selectorCache:typing.Dict[str,str]={}
+    def minified(selector:str)->str:
+        ret=selectorCache.get(selector)
+        if ret is None:
+            if NEEDS_MINIFY_RE.search(selector) is not None:
+                ret=minifySelector(selector)
+            else:
+                ret=selector
+            selectorCache[selector]=ret
+        return ret
+    def selectorKeys(rules:typing.Sequence['CssRule']
+        )->typing.List[typing.Tuple[typing.Any,...]]:
+        """
+        (media,selectors) for each rule, where selectors is a
+        single string, or a frozenset if there are several
+        """
+        ret:typing.List[typing.Tuple[typing.Any,...]]=[]
+        for rule in rules:
+            selectorList=rule.selectors._selectors
+            selectors:typing.Any
+            if rule.isOpaque:
+                # the whole text, so any change is a different rule
+                selectors=rule.text # type: ignore
+            elif len(selectorList)==1:
+                selectors=minified(selectorList[0]._selectorString)
+            else:
+                selectors=frozenset(minified(s._selectorString)
+                    for s in selectorList)
+            if rule.media is None:
+                ret.append(((),selectors))
+                continue
+            levels=rule.media.levels
+            media=mediaCache.get(levels)
+            if media is None:
+                media=tuple(minifyMedia(level) for level in levels)
+                mediaCache[levels]=media
+            ret.append((media,selectors))
+        return ret
+    def declarationKey(rule:'CssRule',
+        media:typing.Tuple[str,...]
+        )->typing.Tuple[typing.Any,...]:
+        if rule.isOpaque:
+            # has no declarations, so only pairs up with itself
+            return (media,rule.text) # type: ignore
+        return (media,frozenset((name,value.strip())
+            for name,value in rule.styles.items()))
+    oldSelectorKeys=selectorKeys(oldRules)
+    newSelectorKeys=selectorKeys(newRules)
+    # {new index:old index}
+    pairs:typing.Dict[int,int]={}
+    unmatchedOld:typing.Dict[typing.Any,typing.List[int]]={}
+    for i in range(len(oldRules)-1,-1,-1):
+        unmatchedOld.setdefault(oldSelectorKeys[i],[]).append(i)
+    for newIndex,key in enumerate(newSelectorKeys):
+        candidates=unmatchedOld.get(key)
+        if candidates:
+            pairs[newIndex]=candidates.pop()
+    # pair up the rest by their declarations instead
+    pairedOld=set(pairs.values())
+    byDeclarations:typing.Dict[typing.Any,typing.List[int]]={}
+    for i in range(len(oldRules)-1,-1,-1):
+        if i not in pairedOld:
+            key=declarationKey(oldRules[i],oldSelectorKeys[i][0])
+            byDeclarations.setdefault(key,[]).append(i)
+    if byDeclarations:
+        for newIndex,rule in enumerate(newRules):
+            if newIndex not in pairs:
+                key=declarationKey(rule,newSelectorKeys[newIndex][0])
+                candidates=byDeclarations.get(key)
+                if candidates:
+                    pairs[newIndex]=candidates.pop()
+                    pairedOld.add(pairs[newIndex])
+    # pairs that kept their relative order
+    pairedNew=sorted(pairs)
+    pairedOldInNewOrder=[pairs[i] for i in pairedNew]
+    if all(a<b for a,b in zip(pairedOldInNewOrder,pairedOldInNewOrder[1:])):
+        inOrder=set(pairedNew)
+    else:
+        inOrder={pairedNew[position]
+            for position in _longestIncreasing(pairedOldInNewOrder)}
+    # removed rules are reported after the new rule that
+    # follows the same old rule they followed
+    removedAfter:typing.Dict[int,typing.List[int]]={}
+    lastPairedNew=-1
+    oldToNew={old:new for new,old in pairs.items()}
+    for oldIndex in range(len(oldRules)):
+        if oldIndex in oldToNew:
+            lastPairedNew=oldToNew[oldIndex]
+        else:
+            removedAfter.setdefault(lastPairedNew,[]).append(oldIndex)
+    changes:typing.List[RuleChange]=[]
+    numUnchanged=0
+    def addRemoved(afterNew:int)->None:
+        if not removedAfter:
+            return
+        for oldIndex in removedAfter.get(afterNew,()):
+            changes.append(RuleChange('removed',oldIndex,None,
+                oldRules[oldIndex],None))
+    addRemoved(-1)
+    for newIndex,newRule in enumerate(newRules):
+        oldIndex=pairs.get(newIndex)
+        if oldIndex is None:
+            changes.append(RuleChange('added',None,newIndex,None,newRule))
+        else:
+            oldRule=oldRules[oldIndex]
+            moved=newIndex not in inOrder
+            if not moved and _sameDeclarations(oldRule,newRule) \
+                and oldSelectorKeys[oldIndex]==newSelectorKeys[newIndex]:
+                numUnchanged+=1
+                addRemoved(newIndex)
+                continue
+            change=_compareRules(oldIndex,newIndex,oldRule,newRule,
+                oldSelectorKeys[oldIndex][1],newSelectorKeys[newIndex][1],
+                moved)
+            if change is not None:
+                changes.append(change)
+            else:
+                numUnchanged+=1
+        addRemoved(newIndex)
+    return CssDiff(changes,numUnchanged)
+
+
+def _sameDeclarations(oldRule:'CssRule',newRule:'CssRule')->bool:
+    """
+    Whether two rules have the same declarations, in the same order
+    """
+    oldItems=oldRule._styles._items
+    newItems=newRule._styles._items
+    if oldItems is newItems:
+        return True
+    return oldItems==newItems and list(oldItems)==list(newItems)
+
+
+def _reorderedProperties(oldNames:typing.Iterable[str],
+    newNames:typing.Iterable[str]
+    )->typing.Tuple[str,...]:
+    """
+    Find the properties, set in both rules, whose order changed
+    relative to another property they overlap with
+
+    (Swapping properties that don't overlap changes nothing.)
+    """
+    oldNames=list(oldNames)
+    newNames=list(newNames)
+    common=set(oldNames).intersection(newNames)
+    oldOrder=[name for name in oldNames if name in common]
+    newOrder=[name for name in newNames if name in common]
+    if oldOrder==newOrder:
+        return ()
+    oldPositions={name:i for i,name in enumerate(oldOrder)}
+    reordered:typing.Set[str]=set()
+    for i,name in enumerate(newOrder):
+        for later in newOrder[i+1:]:
+            if oldPositions[later]>oldPositions[name]:
+                continue
+            if 'all' in (name,later) or propertiesOverlap(name,later):
+                reordered.update((name,later))
+    return tuple(name for name in newOrder if name in reordered)
+
+
+def _compareRules(oldIndex:int,
+    newIndex:int,
+    oldRule:'CssRule',
+    newRule:'CssRule',
+    oldSelectors:typing.Union[str,typing.FrozenSet[str]],
+    newSelectors:typing.Union[str,typing.FrozenSet[str]],
+    moved:bool
+    )->typing.Optional[RuleChange]:
+    """
+    Compare two paired rules
+
+    :return: the change, or None if they are the same
+    """
+    if isinstance(oldSelectors,str):
+        oldSelectors=frozenset((oldSelectors,))
+    if isinstance(newSelectors,str):
+        newSelectors=frozenset((newSelectors,))
+    added:DeclarationMap={}
+    removed:DeclarationMap={}
+    changed:typing.Dict[str,typing.Tuple[str,str]]={}
+    reordered:typing.Tuple[str,...]=()
+    oldStyles=oldRule.styles
+    newStyles=newRule.styles
+    # (shared declarations are the same object, see CssStyles.copy)
+    if oldStyles._items is not newStyles._items:
+        for name,value in newStyles.items():
+            oldValue=oldStyles.get(name)
+            if oldValue is None:
+                added[name]=value
+            elif oldValue.strip()!=value.strip():
+                changed[name]=(oldValue,value)
+        for name,value in oldStyles.items():
+            if name not in newStyles:
+                removed[name]=value
+        reordered=_reorderedProperties(oldStyles.keys(),newStyles.keys())
+    addedSelectors:typing.Tuple[str,...]=()
+    removedSelectors:typing.Tuple[str,...]=()
+    if oldSelectors!=newSelectors:
+        addedSelectors=tuple(str(s) for s in newRule.selectors
+            if minifySelector(str(s)) not in oldSelectors)
+        removedSelectors=tuple(str(s) for s in oldRule.selectors
+            if minifySelector(str(s)) not in newSelectors)
+    if added or removed or changed or reordered or addedSelectors \
+        or removedSelectors:
+        return RuleChange('modified',oldIndex,newIndex,oldRule,newRule,
+            added,removed,changed,addedSelectors,removedSelectors,moved,
+            reordered)
+    if moved:
+        return RuleChange('moved',oldIndex,newIndex,oldRule,newRule)
+    return None
@@ -0,0 +1,262 @@
+"""
+Merge several stylesheets (eg vendor, theme and app) into one
+
+Every rule is looked at once and filed in dicts, so this is linear
+in the total number of rules:
+
+  * exact duplicates (same media, selectors and declarations) are
+    collapsed into the last copy, which is what the cascade would
+    use anyway, so the result styles everything the same
+  * rules are indexed by each of their selectors, and any property
+    that is given different values for the same selector (and media)
+    is reported as a conflict, with shorthands expanded so that eg
+    "margin" vs "margin-top" is caught too
+
+Conflicts are only reported, not resolved, since the same value
+(the last one, or the last !important one) already wins, exactly
+as it did before merging.
+"""
+import typing
+from .cssValues import CssValue
+from .shorthands import expandShorthand
+from .minify import minifySelector,minifyMedia
+from .cssDiff import NEEDS_MINIFY_RE
+from .rules import CssRule,CssRules,CssRulesCompatible,RuleOrigin
+
+
+class ConflictingValue(typing.NamedTuple):
+    """
+    One of the values in a conflict
+
+    :param sheet: name of the stylesheet it is from
+    :param sheetIndex: which of the merged stylesheets it is from
+    :param ruleIndex: index of its rule within that stylesheet
+    :param name: the property as written (may be a shorthand)
+    :param value: the value, for the conflicting property
+    """
+    sheet:str
+    sheetIndex:int
+    ruleIndex:int
+    name:str
+    value:str
+
+    @property
+    def important(self)->bool:
+        """
+        Whether the value is !important
+        """
+        return '!' in self.value and CssValue(self.value).important
+
+
+class MergeConflict(typing.NamedTuple):
+    """
+    A property given different values for the same selector
+
+    :param selector: the (minified) selector
+    :param media: the (minified) @media conditions, if any
+    :param property: the property (longhands for shorthands)
+    :param values: every value given, in cascade order
+        (so the last one is the one that applies, unless
+        an earlier one is !important)
+    """
+    selector:str
+    media:typing.Tuple[str,...]
+    property:str
+    values:typing.Tuple[ConflictingValue,...]
+
+    @property
+    def winner(self)->ConflictingValue:
+        """
+        The value that applies, that is the last
+        !important one, or else the last one
+        """
+        for value in reversed(self.values):
+            if value.important:
+                return value
+        return self.values[-1]
+
+    @property
+    def crossSheet(self)->bool:
+        """
+        Whether the values come from more than one stylesheet
+        (ie, one stylesheet silently overrides another)
+        """
+        return len({value.sheetIndex for value in self.values})>1
+
+    def __str__(self)->str:
+        name=self.selector
+        if self.media:
+            name='@media %s { %s }'%(' and '.join(self.media),name)
+        ret=['%s %s'%(name,self.property)]
+        winner=self.winner
+        for value in self.values:
+            ret.append('\t%s %s[%d] %s: %s'%('*' if value is winner else ' ',
+                value.sheet,value.ruleIndex,value.name,value.value))
+        return '\n'.join(ret)
+
+
+class MergeResult:
+    """
+    The result of merging stylesheets
+    """
+
+    def __init__(self,
+        rules:CssRules,
+        conflicts:typing.List[MergeConflict],
+        numDuplicates:int):
+        """
+        :param rules: the merged rules
+        :param conflicts: properties given different values
+            for the same selector
+        :param numDuplicates: how many exact duplicate rules were dropped
+        """
+        self.rules=rules
+        self.conflicts=conflicts
+        self.numDuplicates=numDuplicates
+
+    @property
+    def crossSheetConflicts(self)->typing.List[MergeConflict]:
+        """
+        Conflicts where one stylesheet overrides another
+        """
+        return [conflict for conflict in self.conflicts if conflict.crossSheet]
+
+    @property
+    def summary(self)->str:
+        """
+        eg "120 rules, 3 duplicates removed, 4 conflicts (2 between sheets)"
+        """
+        return ('%d rules, %d duplicates removed,'
+            ' %d conflicts (%d between sheets)')%(
+            len(self.rules),self.numDuplicates,len(self.conflicts),
+            len(self.crossSheetConflicts))
+
+    def __str__(self)->str:
+        lines=[self.summary]+[str(conflict) for conflict in self.conflicts]
+        return '\n'.join(lines)
+    __repr__=__str__
+
+
+def mergeStylesheets(sheets:typing.Iterable[CssRulesCompatible],
+    names:typing.Optional[typing.Iterable[str]]=None,
+    into:typing.Optional[CssRules]=None
+    )->MergeResult:
+    """
+    Merge stylesheets, in cascade order (later ones win)
+
+    :param sheets: the stylesheets to merge
+    :param names: what to call each one in the conflict report
+        (default is each one's sourceName)
+    :param into: put the merged rules in here, replacing what it
+        had (it may also be one of the sheets), rather than in a
+        new CssRules
+    """
+    sheetList:typing.List[CssRules]=[]
+    for sheet in sheets:
+        if not isinstance(sheet,CssRules):
+            if hasattr(sheet,'rules'):
+                sheet=sheet.rules # type: ignore
+            else:
+                sheet=CssRules(sheet)
+        sheetList.append(sheet)
+    if names is None:
+        sheetNames=[sheet.sourceName for sheet in sheetList]
+    else:
+        sheetNames=list(names)
+        if len(sheetNames)!=len(sheetList):
+            raise ValueError('got %d names for %d stylesheets'%(
+                len(sheetNames),len(sheetList)))
+    selectorCache:typing.Dict[str,str]={}
+    def selectorKey(selector:str)->str:
+        ret=selectorCache.get(selector)
+        if ret is None:
+            if NEEDS_MINIFY_RE.search(selector) is not None:
+                ret=minifySelector(selector)
+            else:
+                ret=selector
+            selectorCache[selector]=ret
+        return ret
+    mediaCache:typing.Dict[typing.Tuple[str,...],typing.Tuple[str,...]]={():()}
+    def mediaKey(rule:CssRule)->typing.Tuple[str,...]:
+        levels=() if rule.media is None else rule.media.levels
+        ret=mediaCache.get(levels)
+        if ret is None:
+            ret=tuple(minifyMedia(level) for level in levels)
+            mediaCache[levels]=ret
+        return ret
+    # (sheet index,rule index,rule,media,selectors) in cascade order
+    allRules:typing.List[typing.Tuple[int,int,CssRule,
+        typing.Tuple[str,...],typing.Tuple[str,...]]]=[]
+    origins:typing.List[typing.Optional[RuleOrigin]]=[]
+    for sheetIndex,sheet in enumerate(sheetList):
+        for ruleIndex,rule in enumerate(sheet):
+            if rule.isOpaque:
+                selectors=(rule.text,) # type: ignore
+            else:
+                selectors=tuple(selectorKey(s._selectorString)
+                    for s in rule.selectors._selectors)
+            allRules.append((sheetIndex,ruleIndex,rule,mediaKey(rule),
+                selectors))
+            origins.append(sheet.getRuleOrigin(ruleIndex))
+    # keep only the last copy of each exact duplicate
+    keep=[True]*len(allRules)
+    seen:typing.Set[typing.Tuple[typing.Any,...]]=set()
+    numDuplicates=0
+    for i in range(len(allRules)-1,-1,-1):
+        _,_,rule,media,selectors=allRules[i]
+        key=(media,frozenset(selectors) if len(selectors)>1 else selectors,
+            tuple(rule.styles._items.items()))
+        if key in seen:
+            keep[i]=False
+            numDuplicates+=1
+        else:
+            seen.add(key)
+    # {(name,value):[(property,value)]} with shorthands expanded
+    expansions:typing.Dict[typing.Tuple[str,str],
+        typing.List[typing.Tuple[str,str]]]={}
+    def expand(name:str,value:str)->typing.List[typing.Tuple[str,str]]:
+        ret=expansions.get((name,value))
+        if ret is None:
+            cssValue=value if isinstance(value,CssValue) else CssValue(value)
+            expanded=expandShorthand(name,cssValue)
+            if expanded is None:
+                ret=[(name,value.strip())]
+            else:
+                ret=[(longhand,longhandValue.strip())
+                    for longhand,longhandValue in expanded]
+            expansions[(name,value)]=ret
+        return ret
+    # {(media,selector,property):[(index into allRules,name,value)]}
+    byProperty:typing.Dict[typing.Tuple[typing.Tuple[str,...],str,str],
+        typing.List[typing.Tuple[int,str,str]]]={}
+    for i,(_,_,rule,media,selectors) in enumerate(allRules):
+        if not keep[i]:
+            continue
+        if selectors and selectors[0][0:1]=='@' and rule.isAtRule:
+            continue
+        for name,value in rule.styles._items.items():
+            for longhand,longhandValue in expand(name,value):
+                for selector in selectors:
+                    byProperty.setdefault((media,selector,longhand),[]).append(
+                        (i,name,longhandValue))
+    conflicts:typing.List[MergeConflict]=[]
+    for (media,selector,longhand),values in byProperty.items():
+        if len(values)>1:
+            firstValue=values[0][2]
+            if any(value!=firstValue for _,_,value in values):
+                conflicting=tuple(ConflictingValue(sheetNames[allRules[i][0]],
+                    allRules[i][0],allRules[i][1],name,value)
+                    for i,name,value in values)
+                conflicts.append(MergeConflict(selector,media,longhand,
+                    conflicting))
+    if into is None:
+        merged=CssRules()
+    else:
+        merged=into
+        merged.clear()
+    for i,(_,_,rule,_,_) in enumerate(allRules):
+        if keep[i]:
+            merged._rules.append(rule)
+            merged._appendOrigin(origins[i])
+    merged._changed()
+    return MergeResult(merged,conflicts,numDuplicates)
@@ -0,0 +1,275 @@
+"""
+Low-level scanner that splits css text into rules
+
+Unlike a simple regex, this understands comments, strings,
+and nested blocks such as @media.
+"""
+import typing
+import codecs
+
+
+# bytes decoded at a time by parseRulesFromBuffer()
+DEFAULT_CHUNK_SIZE=1<<20
+
+
+class ParsedRule(typing.NamedTuple):
+    """
+    The text of a single rule, as found by parseRules()
+
+    :param selectors: the selector text (or, for an opaque rule,
+        the full text of the rule)
+    :param styles: the text between the {}'s, or None for an opaque
+        rule, that is a statement like @import, or an at-rule like
+        @keyframes or @supports whose block is not declarations
+    :param media: the @media condition of each enclosing block,
+        outermost first
+    :param start: offset of the start of the rule in the text
+    :param end: offset just past the end of the rule
+    """
+    selectors:str
+    styles:typing.Optional[str]
+    media:typing.Tuple[str,...]
+    start:int
+    end:int
+
+
+def skipWhitespaceAndComments(text:str,pos:int,end:int)->int:
+    """
+    Get the position of the next thing that is not
+    whitespace or a comment
+    """
+    while pos<end:
+        c=text[pos]
+        if c.isspace():
+            pos+=1
+        elif c=='/' and text.startswith('/*',pos):
+            commentEnd=text.find('*/',pos+2,end)
+            if commentEnd<0:
+                return end
+            pos=commentEnd+2
+        else:
+            break
+    return pos
+
+
+def findDelimiter(text:str,pos:int,end:int,delimiters:str)->int:
+    """
+    Find the next of the delimiter characters that is not
+    inside of a string, comment, () or []
+
+    :return: the position, or end if not found
+    """
+    depth=0
+    while pos<end:
+        c=text[pos]
+        if c in '"\'':
+            closeQuote=pos+1
+            while closeQuote<end and text[closeQuote]!=c:
+                if text[closeQuote]=='\\':
+                    closeQuote+=1
+                closeQuote+=1
+            pos=closeQuote
+        elif c=='/' and text.startswith('/*',pos):
+            commentEnd=text.find('*/',pos+2,end)
+            if commentEnd<0:
+                return end
+            pos=commentEnd+1
+        elif c in '([':
+            depth+=1
+        elif c in ')]':
+            depth-=1
+        elif depth<=0 and c in delimiters:
+            return pos
+        pos+=1
+    return end
+
+
+def findClosingParen(text:str,openIdx:int,end:typing.Optional[int]=None)->int:
+    """
+    Given the position of a "(" find its matching ")"
+    (skipping any inside of strings)
+
+    :return: the position of the ")"
+    """
+    if end is None:
+        end=len(text)
+    depth=0
+    quote=''
+    for i in range(openIdx,end):
+        c=text[i]
+        if quote:
+            if c==quote:
+                quote=''
+        elif c in '"\'':
+            quote=c
+        elif c=='(':
+            depth+=1
+        elif c==')':
+            depth-=1
+            if depth==0:
+                return i
+    raise ValueError('Unmatched "(" in css "%s"'%text[openIdx:end])
+
+
+def findBlockEnd(text:str,openIdx:int,end:int)->int:
+    """
+    Given the position of a "{" find its matching "}"
+
+    :return: the position of the "}" or end if unterminated
+    """
+    depth=0
+    pos=openIdx
+    while pos<end:
+        pos=findDelimiter(text,pos,end,'{}')
+        if pos>=end:
+            break
+        if text[pos]=='{':
+            depth+=1
+        else:
+            depth-=1
+            if depth==0:
+                return pos
+        pos+=1
+    return end
+
+
+def parseRules(text:str,
+    start:int=0,
+    end:typing.Optional[int]=None,
+    media:typing.Tuple[str,...]=()
+    )->typing.Iterator[ParsedRule]:
+    """
+    Split css text into rules
+
+    @media blocks are descended into, with their condition
+    recorded on each rule inside.  Statements such as @import,
+    and other nested-block at-rules (@supports, @keyframes, etc)
+    are returned whole, with styles=None.
+
+    :param start: where to start parsing in the text
+    :param end: where to stop parsing in the text
+    :param media: conditions of enclosing @media blocks
+    """
+    if end is None:
+        end=len(text)
+    pos=start
+    while True:
+        pos=skipWhitespaceAndComments(text,pos,end)
+        if pos>=end:
+            break
+        preludeEnd=findDelimiter(text,pos,end,'{;}')
+        prelude=text[pos:preludeEnd].strip()
+        if preludeEnd>=end or text[preludeEnd]=='}':
+            # junk, or an unmatched }
+            pos=preludeEnd+1
+            continue
+        if text[preludeEnd]==';':
+            if prelude.startswith('@'):
+                yield ParsedRule(text[pos:preludeEnd+1],None,media,
+                    pos,preludeEnd+1)
+            pos=preludeEnd+1
+            continue
+        blockEnd=findBlockEnd(text,preludeEnd,end)
+        if prelude.startswith('@'):
+            atKeyword=prelude.split(None,1)[0].lower()
+            if atKeyword=='@media':
+                yield from parseRules(text,preludeEnd+1,blockEnd,
+                    media+(prelude[6:].strip(),))
+            elif findDelimiter(text,preludeEnd+1,blockEnd,'{')>=blockEnd:
+                # a declaration block like @font-face or @page
+                yield ParsedRule(prelude,text[preludeEnd+1:blockEnd],media,
+                    pos,blockEnd+1)
+            else:
+                yield ParsedRule(text[pos:blockEnd+1],None,media,
+                    pos,blockEnd+1)
+        elif prelude:
+            yield ParsedRule(prelude,text[preludeEnd+1:blockEnd],media,
+                pos,blockEnd+1)
+        pos=blockEnd+1
+
+
+def _parseCompleteRules(text:str,
+    offset:int
+    )->typing.Generator[ParsedRule,None,int]:
+    """
+    Parse the top-level rules in a piece of css text, stopping
+    at the first one that is not complete
+
+    :param offset: where the text is in the complete css
+        (added to the start and end of each rule)
+    :return: (from the generator) how much of the text was used
+    """
+    pos=0
+    end=len(text)
+    consumed=0
+    while True:
+        pos=skipWhitespaceAndComments(text,pos,end)
+        if pos>=end:
+            return consumed
+        preludeEnd=findDelimiter(text,pos,end,'{;}')
+        if preludeEnd>=end:
+            return consumed
+        if text[preludeEnd]!='{':
+            ruleEnd=preludeEnd+1
+            if text[preludeEnd]==';' and text[pos]=='@':
+                yield ParsedRule(text[pos:ruleEnd],None,(),
+                    pos+offset,ruleEnd+offset)
+        else:
+            blockEnd=findBlockEnd(text,preludeEnd,end)
+            if blockEnd>=end:
+                return consumed
+            ruleEnd=blockEnd+1
+            if text[pos]=='@':
+                for parsed in parseRules(text,pos,ruleEnd):
+                    yield parsed._replace(start=parsed.start+offset,
+                        end=parsed.end+offset)
+            else:
+                prelude=text[pos:preludeEnd].strip()
+                if prelude:
+                    yield ParsedRule(prelude,text[preludeEnd+1:blockEnd],(),
+                        pos+offset,ruleEnd+offset)
+        pos=consumed=ruleEnd
+
+
+def parseRulesFromBuffer(buffer:typing.Any,
+    encoding:str='utf-8-sig',
+    chunkSize:int=DEFAULT_CHUNK_SIZE
+    )->typing.Iterator[ParsedRule]:
+    """
+    Split css into rules straight from bytes, such as an mmap
+    of a file, without ever decoding all of it at once
+
+    The bytes are decoded a chunk at a time, and only the text
+    of rules that are not yet complete is carried over to the
+    next chunk, so memory use is bounded by the chunk size and
+    the largest single rule (or @media block), rather than by
+    the size of the file.
+
+    :param buffer: anything supporting the buffer protocol
+        (mmap, memoryview, bytes, ...)
+    :param chunkSize: how many bytes to decode at a time
+    :return: the same as parseRules() would for the decoded text,
+        including offsets into it
+    """
+    view=memoryview(buffer)
+    decoder=codecs.getincrementaldecoder(encoding)()
+    pending=''
+    # offset of pending in the complete text
+    offset=0
+    pos=0
+    try:
+        while pos<len(view):
+            # read more at once when a single rule is bigger than
+            # a chunk, so that it isn't rescanned over and over
+            readSize=max(chunkSize,len(pending))
+            text=pending+decoder.decode(view[pos:pos+readSize])
+            pos+=readSize
+            consumed=yield from _parseCompleteRules(text,offset)
+            pending=text[consumed:]
+            offset+=consumed
+        text=pending+decoder.decode(b'',final=True)
+        for parsed in parseRules(text):
+            yield parsed._replace(start=parsed.start+offset,
+                end=parsed.end+offset)
+    finally:
+        view.release()
@@ -3,7 +3,10 @@ Decode, match, and find Css Selectors
 """
 import typing
 import re
-from .htmlTypes import HtmlElementLike
+from .htmlTypes import HtmlElementLike,getTagName,getAttribute,\
+    getParent,getAncestors,getPreviousSiblings,isEmpty
+from .matchContext import MatchContext,bloomHash,getSiblingIndex,SiblingIndex
+from .cssParser import findClosingParen
 
 
 CssSelectorCompatible=typing.Union[str,"CssSelector"]
@@ -12,20 +15,361 @@ CssSelectorsCompatible=typing.Union[str,CssSelectorCompatible,"CssSelectors",
     typing.Iterable[typing.Union[str,CssSelectorCompatible,"CssSelectors"]]]
 SelectorsCompatible=CssSelectorsCompatible
 
+AttributeCheck=typing.Callable[[str],bool]
+PseudoClassCheck=typing.Callable[
+    [HtmlElementLike,typing.Optional[MatchContext]],bool]
+NthCheck=typing.Callable[[int],bool]
+
+
+def _never(actual:str)->bool:
+    """
+    An attribute check that can never succeed
+    """
+    _=actual
+    return False
+
+
+def compileAttributeCheck(operator:str,value:str,
+    ignoreCase:bool=False)->AttributeCheck:
+    """
+    Compile an attribute selector operator into a direct
+    string-method check on the attribute value.
+
+    This happens once, when the selector is parsed, so
+    that matching never re-interprets the operator.
+
+    :param operator: one of = ~= |= ^= $= *=
+    :param value: the value to compare against
+    :param ignoreCase: the selector had the "i" flag
+    """
+    if ignoreCase:
+        caseSensitiveCheck=compileAttributeCheck(operator,value.lower())
+        return lambda actual: caseSensitiveCheck(actual.lower())
+    if operator=='=':
+        return value.__eq__
+    if operator=='~=':
+        if not value or len(value.split())!=1:
+            return _never
+        return lambda actual: value in actual.split()
+    if operator=='|=':
+        prefix=value+'-'
+        return lambda actual: actual==value or actual.startswith(prefix)
+    if not value:
+        # per spec, an empty ^= $= or *= never matches anything
+        return _never
+    if operator=='^=':
+        return lambda actual: actual.startswith(value)
+    if operator=='$=':
+        return lambda actual: actual.endswith(value)
+    if operator=='*=':
+        return lambda actual: value in actual
+    raise ValueError('Unknown attribute selector operator "%s"'%operator)
+
+
+NTH_RE=re.compile(r"""
+    ^(?:(?P<a>[-+]?\d*)n\s*(?:(?P<bSign>[-+])\s*(?P<bAbs>\d+))?
+    |(?P<b>[-+]?\d+))$
+    """,re.IGNORECASE|re.VERBOSE)
+def parseNth(expression:str)->typing.Tuple[int,int]:
+    """
+    Parse an :nth-child() style "an+b" expression
+
+    eg "2n+1" -> (2,1)
+       "odd" -> (2,1)
+       "-n+3" -> (-1,3)
+       "4" -> (0,4)
+
+    :return: (a,b)
+    """
+    expression=expression.strip().lower()
+    if expression=='odd':
+        return (2,1)
+    if expression=='even':
+        return (2,0)
+    m=NTH_RE.match(expression)
+    if m is None:
+        raise ValueError('Unable to parse nth expression "%s"'%expression)
+    if m.group('b') is not None:
+        return (0,int(m.group('b')))
+    a=m.group('a')
+    if a in ('','+'):
+        a=1
+    elif a=='-':
+        a=-1
+    else:
+        a=int(a)
+    b=0
+    if m.group('bAbs') is not None:
+        b=int(m.group('bAbs'))
+        if m.group('bSign')=='-':
+            b=-b
+    return (a,b)
+
+
+def compileNthCheck(expression:str)->NthCheck:
+    """
+    Compile an :nth-child() style "an+b" expression into an
+    arithmetic check on a 1-based position.
+
+    That is, whether there is some n>=0 where position==a*n+b
+    """
+    a,b=parseNth(expression)
+    if a==0:
+        return lambda position: position==b
+    if a>0:
+        return lambda position: position>=b and (position-b)%a==0
+    a=-a
+    return lambda position: position<=b and (b-position)%a==0
+
+
+def compileLangCheck(languages:str)->PseudoClassCheck:
+    """
+    Compile a :lang() pseudo-class, which matches elements whose
+    language (from the nearest lang="" attribute) is, or is a
+    dialect of, any of the given languages
+
+    :param languages: eg "en" or "de, fr-CA"
+    """
+    prefixes=[language.strip().strip('"\'').lower()
+        for language in languages.split(',')]
+    prefixes=[prefix for prefix in prefixes if prefix]
+    def langCheck(element:HtmlElementLike,
+        context:typing.Optional[MatchContext])->bool:
+        _=context
+        lang=getAttribute(element,'lang')
+        if lang is None:
+            for ancestor in getAncestors(element):
+                lang=getAttribute(ancestor,'lang')
+                if lang is not None:
+                    break
+            else:
+                return False
+        lang=lang.lower()
+        for prefix in prefixes:
+            if lang==prefix or lang.startswith(prefix+'-'):
+                return True
+        return False
+    return langCheck
+
+
+def _siblingIndex(element:HtmlElementLike,
+    context:typing.Optional[MatchContext])->SiblingIndex:
+    """
+    Get the sibling index of an element, using the context's
+    shared index if there is one
+    """
+    if context is None:
+        return getSiblingIndex(element)
+    return context.siblingIndex(element)
+
+
+def compilePseudoClass(name:str,argument:typing.Optional[str]
+    )->typing.Optional[PseudoClassCheck]:
+    """
+    Compile a structural pseudo-class into a check function.
+
+    Sibling positions come from the MatchContext (where they are
+    computed once per traversal) and any :nth-*() expression is
+    compiled into arithmetic up front.
+
+    :param name: the pseudo-class name, lowercase, without the ":"
+    :param argument: the text inside the ()'s, if any
+    :return: the check, or None for pseudo-classes that can
+        never match a static document (eg, :hover) or that are
+        not supported (eg, :has())
+    """
+    # pylint: disable=too-many-return-statements
+    if argument is not None:
+        if name in ('not','is','where','matches','-webkit-any'):
+            try:
+                selectors=[CssSelector(s) for s in splitSelectorList(argument)]
+            except ValueError:
+                return None
+            if name=='not':
+                def notCheck(element:HtmlElementLike,
+                    context:typing.Optional[MatchContext])->bool:
+                    for selector in selectors:
+                        if selector.matches(element,context):
+                            return False
+                    return True
+                return notCheck
+            def isCheck(element:HtmlElementLike,
+                context:typing.Optional[MatchContext])->bool:
+                for selector in selectors:
+                    if selector.matches(element,context):
+                        return True
+                return False
+            return isCheck
+        if name=='lang':
+            return compileLangCheck(argument)
+        if not name.startswith('nth-'):
+            # eg :has(), which is not supported
+            return None
+        try:
+            nthCheck=compileNthCheck(argument)
+        except ValueError:
+            # eg :nth-child(2n of .x), which is not supported
+            return None
+        if name=='nth-child':
+            return lambda element,context: \
+                nthCheck(_siblingIndex(element,context)[0])
+        if name=='nth-last-child':
+            def nthLastChildCheck(element:HtmlElementLike,
+                context:typing.Optional[MatchContext])->bool:
+                index=_siblingIndex(element,context)
+                return nthCheck(index[1]-index[0]+1)
+            return nthLastChildCheck
+        if name=='nth-of-type':
+            return lambda element,context: \
+                nthCheck(_siblingIndex(element,context)[2])
+        if name=='nth-last-of-type':
+            def nthLastOfTypeCheck(element:HtmlElementLike,
+                context:typing.Optional[MatchContext])->bool:
+                index=_siblingIndex(element,context)
+                return nthCheck(index[3]-index[2]+1)
+            return nthLastOfTypeCheck
+        return None
+    if name=='first-child':
+        return lambda element,context: _siblingIndex(element,context)[0]==1
+    if name=='last-child':
+        def lastChildCheck(element:HtmlElementLike,
+            context:typing.Optional[MatchContext])->bool:
+            index=_siblingIndex(element,context)
+            return index[0]==index[1]
+        return lastChildCheck
+    if name=='only-child':
+        return lambda element,context: _siblingIndex(element,context)[1]==1
+    if name=='first-of-type':
+        return lambda element,context: _siblingIndex(element,context)[2]==1
+    if name=='last-of-type':
+        def lastOfTypeCheck(element:HtmlElementLike,
+            context:typing.Optional[MatchContext])->bool:
+            index=_siblingIndex(element,context)
+            return index[2]==index[3]
+        return lastOfTypeCheck
+    if name=='only-of-type':
+        return lambda element,context: _siblingIndex(element,context)[3]==1
+    if name=='empty':
+        return lambda element,context: isEmpty(element)
+    if name=='root':
+        return lambda element,context: getParent(element) is None
+    return None
+
+
+def splitSelectorList(selectors:str)->typing.List[str]:
+    """
+    Split a comma-separated list of selectors, taking care
+    not to split on commas inside of quotes, [] or ()
+
+    eg 'a[title="x,y"], b' -> ['a[title="x,y"]','b']
+    """
+    ret:typing.List[str]=[]
+    depth=0
+    quote=''
+    startIdx=0
+    for i,c in enumerate(selectors):
+        if quote:
+            if c==quote:
+                quote=''
+        elif c in '"\'':
+            quote=c
+        elif c in '[(':
+            depth+=1
+        elif c in '])':
+            depth-=1
+        elif c==',' and depth==0:
+            ret.append(selectors[startIdx:i].strip())
+            startIdx=i+1
+    ret.append(selectors[startIdx:].strip())
+    return [s for s in ret if s]
+
+
+def unescapeIdentifier(identifier:str)->str:
+    """
+    Remove backslash escapes from a css identifier
+
+    eg "sm\\:flex" -> "sm:flex"
+    """
+    if '\\' not in identifier:
+        return identifier
+    return re.sub(r'\\(.)',r'\1',identifier)
+
+
+def splitCombinators(selector:str)->typing.List[typing.Tuple[str,str]]:
+    """
+    Split a selector into its compound parts, each with the
+    combinator that preceeds it (' ', '>', '+', '~', or ''
+    for the first one), taking care not to split inside of
+    quotes, [] or ()
+
+    eg 'ul > li.x a' -> [('','ul'),('>','li.x'),(' ','a')]
+    """
+    ret:typing.List[typing.Tuple[str,str]]=[]
+    depth=0
+    quote=''
+    combinator=''
+    current:typing.List[str]=[]
+    escaped=False
+    for c in selector:
+        if escaped:
+            escaped=False
+        elif c=='\\':
+            escaped=True
+        elif quote:
+            if c==quote:
+                quote=''
+        elif c in '"\'':
+            quote=c
+        elif c in '[(':
+            depth+=1
+        elif c in '])':
+            depth-=1
+        elif depth==0 and (c.isspace() or c in '>+~'):
+            if current:
+                ret.append((combinator,''.join(current)))
+                current=[]
+                combinator=' '
+            if c in '>+~':
+                combinator=c
+            continue
+        current.append(c)
+    if current:
+        ret.append((combinator,''.join(current)))
+    return ret
+
+
 class CssSelectorRequirement:
     """
     Part of a css selector
+
+    That is, a series of simple selectors like
+        div#main.big[data-size^="lg" i]
+    that must all be true of a single element.
     """
-    PART_SPLITTER_RE=re.compile(r"""([.@])?([0-9a-z_]+)""",re.DOTALL|re.IGNORECASE)
+    PART_SPLITTER_RE=re.compile(r"""
+        (?P<tag>\*|(?:[-_a-z0-9\u00a0-\uffff]|\\.)+)
+        |(?P<id>[#@](?:[-_a-z0-9\u00a0-\uffff]|\\.)+)
+        |(?P<class>\.(?:[-_a-z0-9\u00a0-\uffff]|\\.)+)
+        |\[\s*(?P<attribute>[-_a-z0-9:]+)\s*
+            (?:(?P<operator>[~|^$*]?=)\s*
+                (?:"(?P<dquoted>[^"]*)"|'(?P<squoted>[^']*)'|(?P<unquoted>[^\]\s]+))
+                \s*(?P<flag>[is])?\s*
+            )?\]
+        |(?P<pseudo>::?[-_a-z0-9]+)(?P<pseudoArgument>\()?
+        """,re.DOTALL|re.IGNORECASE|re.VERBOSE)
 
     def __init__(self,match:typing.Union[None,str,typing.Match[str]]):
         """
         """
         self._matchString=''
-        self._nameMatchRe:typing.Union[None,str,typing.Pattern[str]]=None
-        self._attributeMatchRe:typing.Dict[
-            typing.Union[str,typing.Pattern[str]],
-            typing.Union[str,typing.Pattern[str]]]={} # attributeName,attributeValue
+        self._tagName:typing.Optional[str]=None
+        self._id:typing.Optional[str]=None
+        self._classes:typing.FrozenSet[str]=frozenset()
+        # (attributeName,check)
+        self._attributeChecks:typing.List[
+            typing.Tuple[str,typing.Optional[AttributeCheck]]]=[]
+        self._pseudoClassChecks:typing.List[PseudoClassCheck]=[]
+        self._neverMatches=False
         if match is not None:
             self.assign(match)
 
@@ -33,61 +377,117 @@ class CssSelectorRequirement:
         """
         Assign the value of this object
         """
-        if isinstance(matchString,str):
-            match=self.PART_SPLITTER_RE.split(matchString)
-        else:
-            match=matchString
-            matchString=matchString.string
-        if not match[0]:
-            # a selector that is just text
-            tagAttr=match[0].split('[')
-            if tagAttr[0]:
-                self._nameMatchRe=tagAttr[0]
-            if len(tagAttr)>1:
-                # has an attribute[] selector
-                for attrMatch in tagAttr[1:]:
-                    k,v=attrMatch.split('=',1)
-                    self._attributeMatchRe[k]=v
-            self._nameMatchRe=match[1]
-        elif match[0]=='.': # a class selector
-            # NOTE: any class matches are lumped in with _attributeMatchesRe
-            self._attributeMatchRe['class']=match[1]
-
-    def matches(self,element:HtmlElementLike)->bool:
+        if not isinstance(matchString,str):
+            matchString=matchString.group(0)
+        matchString=matchString.strip()
+        self._matchString=matchString
+        self._tagName=None
+        self._id=None
+        self._attributeChecks=[]
+        self._pseudoClassChecks=[]
+        self._neverMatches=False
+        classes:typing.List[str]=[]
+        pos=0
+        while pos<len(matchString):
+            m=self.PART_SPLITTER_RE.match(matchString,pos)
+            if m is None or (m.group('tag') is not None and pos!=0):
+                # an invalid selector, which (as in a browser) matches
+                # nothing rather than spoiling the whole stylesheet
+                self._neverMatches=True
+                break
+            pos=m.end()
+            if m.group('tag') is not None:
+                if m.group('tag')!='*':
+                    self._tagName=unescapeIdentifier(m.group('tag')).lower()
+            elif m.group('id') is not None:
+                self._id=unescapeIdentifier(m.group('id')[1:])
+            elif m.group('class') is not None:
+                classes.append(unescapeIdentifier(m.group('class')[1:]))
+            elif m.group('attribute') is not None:
+                self._addAttributeCheck(m)
+            else:
+                argument=None
+                if m.group('pseudoArgument') is not None:
+                    try:
+                        closeIdx=findClosingParen(matchString,m.end()-1)
+                    except ValueError:
+                        self._neverMatches=True
+                        break
+                    argument=matchString[m.end():closeIdx]
+                    pos=closeIdx+1
+                check=None
+                if not m.group('pseudo').startswith('::'):
+                    check=compilePseudoClass(
+                        m.group('pseudo')[1:].lower(),argument)
+                if check is None:
+                    # dynamic pseudo-classes and pseudo-elements
+                    # can never match a static document
+                    self._neverMatches=True
+                else:
+                    self._pseudoClassChecks.append(check)
+        self._classes=frozenset(classes)
+
+    def _addAttributeCheck(self,m:typing.Match[str])->None:
+        """
+        Compile an [attribute] selector match
+        """
+        attributeName=m.group('attribute')
+        operator=m.group('operator')
+        if operator is None:
+            self._attributeChecks.append((attributeName,None))
+            return
+        value=m.group('dquoted')
+        if value is None:
+            value=m.group('squoted')
+            if value is None:
+                value=m.group('unquoted')
+        ignoreCase=m.group('flag') is not None and m.group('flag').lower()=='i'
+        self._attributeChecks.append((attributeName,
+            compileAttributeCheck(operator,value,ignoreCase)))
+
+    @property
+    def bloomHashes(self)->typing.List[int]:
+        """
+        The ancestor bloom filter hashes that any element matching
+        this requirement is guaranteed to have
+        """
+        ret:typing.List[int]=[]
+        if self._tagName is not None:
+            ret.append(bloomHash(self._tagName))
+        if self._id is not None:
+            ret.append(bloomHash('#'+self._id))
+        for cssClass in self._classes:
+            ret.append(bloomHash('.'+cssClass))
+        return ret
+
+    def matches(self,
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]=None
+        )->bool:
         """
         Returns whether this matches the given element
         """
-        if self._nameMatchRe is not None:
-            if isinstance(self._nameMatchRe,str):
-                if element.tagName!=self._nameMatchRe:
-                    return False
-            elif self._nameMatchRe.match(element.tagName) is None:
+        if self._neverMatches:
+            return False
+        if self._tagName is not None:
+            if getTagName(element).lower()!=self._tagName:
                 return False
-        attributes=element.attributes
-        if self._attributeMatchRe:
-            if attributes is None:
+        if self._id is not None:
+            if getAttribute(element,'id')!=self._id:
+                return False
+        if self._classes:
+            classes=getAttribute(element,'class')
+            if classes is None or not self._classes.issubset(classes.split()):
+                return False
+        for attributeName,check in self._attributeChecks:
+            value=getAttribute(element,attributeName)
+            if value is None:
+                return False
+            if check is not None and not check(value):
+                return False
+        for pseudoClassCheck in self._pseudoClassChecks:
+            if not pseudoClassCheck(element,context):
                 return False
-            foundOne=False
-            for keyMatch,valueMatch in self._attributeMatchRe.items():
-                # check all attributes to see if they match
-                for k,v in attributes.items():
-                    # check attribute name
-                    if isinstance(keyMatch,str):
-                        if keyMatch!=k:
-                            continue
-                    elif keyMatch.match(k) is None:
-                        continue
-                    # check attribute value
-                    if isinstance(valueMatch,str):
-                        if valueMatch!=v:
-                            continue
-                    elif valueMatch.match(v) is None:
-                        continue
-                    # it matched!
-                    foundOne=True
-                    break
-                if foundOne:
-                    break
         return True
 
     def __repr__(self)->str:
@@ -97,6 +497,11 @@ class CssSelectorRequirement:
 class CssSelector:
     """
     A CSS selector
+
+    Made up of compound requirements joined by combinators.
+    Matching runs right-to-left, as browsers do, starting from
+    the requirement on the element being styled and only then
+    looking at its ancestors/siblings.
     """
 
     def __init__(self,
@@ -104,7 +509,10 @@ class CssSelector:
         """
         """
         self._selectorString:str=''
-        self._selectorRequirements:typing.List[CssSelectorRequirement]=[]
+        # (requirement,combinator to its left) from right to left
+        self._rightToLeft:typing.List[
+            typing.Tuple[CssSelectorRequirement,str]]=[]
+        self._ancestorBloomHashes:typing.List[int]=[]
         if selector is not None:
             self.assign(selector)
 
@@ -115,14 +523,59 @@ class CssSelector:
             return other==self._selectorString
         return self.matches(other)
 
-    def matches(self,element:HtmlElementLike)->bool:
+    def __hash__(self)->int:
+        return hash(self._selectorString)
+
+    def matches(self,
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]=None
+        )->bool:
         """
         Returns whether this matches the given element
+
+        :param context: if this is part of a document traversal
+            (see MatchContext.walk) the ancestor filter is used to
+            reject impossible selectors without walking the tree
         """
-        for requirement in self._selectorRequirements:
-            if not requirement.matches(element):
-                return False
-        return True
+        if not self._rightToLeft:
+            return False
+        if not self._rightToLeft[0][0].matches(element,context):
+            return False
+        ancestorFilter=None if context is None else context.ancestorFilter
+        if self._ancestorBloomHashes and ancestorFilter is not None \
+            and not ancestorFilter.mightContainAll(self._ancestorBloomHashes):
+            return False
+        return self._matchesLeftOf(0,element,context)
+
+    def _matchesLeftOf(self,
+        idx:int,
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]
+        )->bool:
+        """
+        Given that requirement idx matches element, determine
+        whether the rest of the selector (to its left) matches
+        """
+        if idx+1>=len(self._rightToLeft):
+            return True
+        combinator=self._rightToLeft[idx][1]
+        requirement=self._rightToLeft[idx+1][0]
+        candidates:typing.Iterable[HtmlElementLike]
+        if combinator=='>':
+            parent=getParent(element)
+            candidates=() if parent is None else (parent,)
+        elif combinator==' ':
+            candidates=getAncestors(element)
+        elif combinator=='+':
+            previous=next(getPreviousSiblings(element),None)
+            candidates=() if previous is None else (previous,)
+        else: # '~'
+            candidates=getPreviousSiblings(element)
+        for candidate in candidates:
+            if requirement.matches(candidate,context) \
+                and self._matchesLeftOf(idx+1,candidate,context):
+                return True
+        return False
 
     def assign(self,selector:CssSelectorCompatible):
         """
@@ -130,9 +583,26 @@ class CssSelector:
         """
         if not isinstance(selector,str):
             selector=str(selector)
-        self._selectorRequirements=[]
-        for m in CssSelectorRequirement.PART_SPLITTER_RE.split(selector):
-            self._selectorRequirements.append(CssSelectorRequirement(m))
+        self._selectorString=selector.strip()
+        self._rightToLeft=[]
+        parts=splitCombinators(self._selectorString)
+        for nextCombinator,part in reversed(parts):
+            self._rightToLeft.append(
+                (CssSelectorRequirement(part),nextCombinator))
+        # anything reached through only descendant and child
+        # combinators must be an ancestor, so can be checked against
+        # the ancestor filter.  That stops at the first sibling
+        # combinator, since eg in ".a + .b .c" the .a is a sibling
+        # of an ancestor, not an ancestor.
+        self._ancestorBloomHashes=[]
+        for idx in range(len(self._rightToLeft)-1):
+            if self._rightToLeft[idx][1] not in (' ','>'):
+                break
+            self._ancestorBloomHashes.extend(
+                self._rightToLeft[idx+1][0].bloomHashes)
+
+    def __repr__(self)->str:
+        return self._selectorString
 Selector=CssSelector
 
 
@@ -145,7 +615,6 @@ class CssSelectors:
         selectors:typing.Optional[CssSelectorsCompatible]=None):
         """
         """
-        self._selectorsString:str=''
         self._selectors:typing.List[CssSelector]=[]
         if selectors is not None:
             self.assign(selectors)
@@ -183,16 +652,21 @@ class CssSelectors:
     def __eq__(self,
         other:typing.Union[CssSelectorsCompatible,HtmlElementLike]
         )->bool:
-        if isinstance(other,(str,CssSelectors)):
-            return other==self._selectorsString
+        if isinstance(other,str):
+            other=CssSelectors(other)
+        if isinstance(other,CssSelectors):
+            return [str(s) for s in other]==[str(s) for s in self._selectors]
         return self.matches(other)
 
-    def matches(self,element:HtmlElementLike)->bool:
+    def matches(self,
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]=None
+        )->bool:
         """
         Returns whether this matches the given element
         """
         for selector in self._selectors:
-            if selector.matches(element):
+            if selector.matches(element,context):
                 return True
         return False
 
@@ -210,12 +684,12 @@ class CssSelectors:
         if selectors is None:
             return
         if isinstance(selectors,str):
-            for s in selectors.split(','):
+            for s in splitSelectorList(selectors):
                 self.addCssSelectors(CssSelector(s))
         elif isinstance(selectors,CssSelector):
             self._selectors.append(selectors)
         elif isinstance(selectors,CssSelectors):
-            self.extend(selectors)
+            self._selectors.extend(selectors)
         else:
             for selector in selectors:
                 self.addCssSelectors(selector)
@@ -233,7 +707,7 @@ class CssSelectors:
         if selectors is None:
             return
         if isinstance(selectors,str):
-            for s in selectors.split(','):
+            for s in splitSelectorList(selectors):
                 self._selectors.remove(CssSelector(s))
         elif isinstance(selectors,CssSelector):
             self._selectors.remove(selectors)
@@ -245,4 +719,7 @@ class CssSelectors:
     removeSelector=removeCssSelectors
     remove=removeCssSelectors
     __delitem__=removeCssSelectors
+
+    def __repr__(self)->str:
+        return ', '.join([str(s) for s in self._selectors])
 Selectors=CssSelectors
@@ -4,7 +4,12 @@ Manages Css styles
 CssStyles can be accessed like a dict of name:value
 """
 import typing
-import cssTools
+from collections import OrderedDict
+from .wunderlist import Wunderlist
+from .cssValues import CssValue,CssValueCompatible,asCssValue
+from .cssParser import findDelimiter
+from .shorthands import mergeDeclarations,collapseShorthands
+from .compressionOrder import canonicalDeclarationOrder
 
 
 CssStylesCompatible=typing.Union['CssStyles',str,
@@ -25,17 +30,63 @@ def asCssStyles(styles:CssStylesCompatible)->'CssStyles':
     return CssStyles(styles)
 
 
-class CssStyles(cssTools.Wunderlist['CssStyles',CssStylesCompatible]):
+class CssStyles(Wunderlist['CssStyles',CssStylesCompatible]):
     """
     Manages Css styles
 
     CssStyles can be accessed like a dict of name:value
     """
 
+    # whether _items may be shared with other CssStyles
+    # (in which case it is copied before being changed)
+    _shared=False
+
     def __init__(self,styles:typing.Optional[CssStylesCompatible]=None):
-        cssTools.Wunderlist.__init__(self,styles)
-        if styles is not None:
-            self.assign(styles)
+        Wunderlist.__init__(self,styles)
+
+    def copy(self)->'CssStyles':
+        """
+        Get a copy of these styles
+
+        The declarations are shared (a flyweight) until either
+        copy is changed, so copies are cheap to make and to keep.
+        """
+        ret=CssStyles()
+        ret._items=self._items
+        ret._shared=True
+        self._shared=True
+        return ret
+
+    def _ownItems(self)->None:
+        """
+        Call before changing _items, to stop sharing them
+        """
+        if self._shared:
+            self._items=OrderedDict(self._items)
+            self._shared=False
+
+    def __setitem__(self,name:str,value:CssValueCompatible)->None:
+        self._ownItems()
+        self._items[name]=asCssValue(value)
+
+    def __delitem__(self,name:str)->None:
+        self._ownItems()
+        del self._items[name]
+
+    def __contains__(self,name:typing.Any)->bool:
+        return name in self._items
+
+    def items(self)->typing.ItemsView[str,str]:
+        """
+        Access like a dict of name:value
+        """
+        return self._items.items()
+
+    def keys(self)->typing.KeysView[str]:
+        """
+        Access like a dict of name:value
+        """
+        return self._items.keys()
 
     def combined(self,other:CssStylesCompatible)->"CssStyles":
         """
@@ -58,22 +109,71 @@ class CssStyles(cssTools.Wunderlist['CssStyles',CssStylesCompatible]):
         otherStyles=asCssStyles(otherStyles)
         if len(self._items)!=len(otherStyles):
             return False
-        for item in self:
-            if item not in otherStyles:
+        for name,value in self._items.items():
+            if otherStyles._items.get(name)!=value:
                 return False
         return True
 
+    def append(self, # type: ignore
+        styles:typing.Optional[CssStylesCompatible]
+        )->None:
+        """
+        Add more styles.  Any that are already present
+        will be overridden by the new values.
+
+        Css strings are added as-is, but when merging other styles,
+        shorthands are expanded into longhands so that the
+        result is the same as the browser's cascade.
+        """
+        if styles is None:
+            return
+        if isinstance(styles,str):
+            self.appendCssString(styles)
+        elif isinstance(styles,(CssStyles,dict)):
+            # cascade them in, with shorthands expanded so
+            # that eg margin and margin-top interact correctly
+            self._ownItems()
+            mergeDeclarations(self._items,styles.items())
+        elif hasattr(styles,'styles'):
+            # eg, a CssRule
+            self.append(styles.styles)
+        else:
+            for style in styles:
+                self.append(style)
+
     def appendCssString(self,data:str)->None:
         """
         decode from css string
         """
         data=data.strip()
+        if not data:
+            return
         if data[0]=='{':
             data=data[1:-1].strip()
-        for styleItem in data.split(';'):
-            nameval=[nv.strip() for nv in styleItem.split(':',1)]
+        self._ownItems()
+        pos=0
+        while pos<len(data):
+            # semicolons may be inside of strings or url()s
+            end=findDelimiter(data,pos,len(data),';')
+            nameval=[nv.strip() for nv in data[pos:end].split(':',1)]
             if len(nameval)>1:
-                self._items[nameval[0]]=nameval[1]
+                self._items[nameval[0]]=CssValue(nameval[1])
+            pos=end+1
+
+    def clear(self):
+        """
+        clear out these styles
+        """
+        Wunderlist.clear(self)
+        self._shared=False
+
+    def getValue(self,name:str)->typing.Optional[CssValue]:
+        """
+        Get the typed value of a property
+
+        (its tokens are parsed on first access and cached)
+        """
+        return self._items.get(name)
 
     @property
     def styleAttribute(self)->str:
@@ -87,7 +187,7 @@ class CssStyles(cssTools.Wunderlist['CssStyles',CssStylesCompatible]):
         """
         given a style="" attribute, just the stuff in quotes
         """
-        kvset=['%s:%s'%kv for kv in self._items.items()]
+        kvset=['%s:%s'%kv for kv in collapseShorthands(self._items)]
         return ';'.join(kvset)
 
     @property
@@ -102,7 +202,9 @@ class CssStyles(cssTools.Wunderlist['CssStyles',CssStylesCompatible]):
         """
         return self.getCssFileFormat()
 
-    def getCssFileFormat(self,indent='',indenter='\t',newline='\n',curlies=True)->str:
+    def getCssFileFormat(self,
+        indent='',indenter='\t',newline='\n',curlies=True,
+        collapse=True,canonicalOrder=False)->str:
         """
         returns css of the form:
         {
@@ -110,11 +212,23 @@ class CssStyles(cssTools.Wunderlist['CssStyles',CssStylesCompatible]):
             color:red;
             ...
         }
+
+        :param collapse: collapse complete sets of longhands
+            (eg margin-top/right/bottom/left) into shorthands
+        :param canonicalOrder: sort the declarations into a canonical
+            order (where that does not change their meaning) so that
+            the output compresses better
         """
         ret:typing.List[str]=[]
         if curlies:
             ret=[indent+'{']
-        for kv in self._items.items():
+        if collapse:
+            items=collapseShorthands(self._items)
+        else:
+            items=list(self._items.items())
+        if canonicalOrder:
+            items=canonicalDeclarationOrder(items)
+        for kv in items:
             ret.append(f'{indent}{indenter}{kv[0]}: {kv[1]};')
         if curlies:
             ret.append(indent+'}')
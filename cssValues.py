@@ -0,0 +1,430 @@
+"""
+Typed css declaration values
+
+A CssValue is still a str (so everything that treats values as
+text keeps working) but the first time its tokens are asked for,
+it is parsed into compact numeric representations (lengths,
+percentages, colors, numbers, keywords) which are then cached
+on the value itself.
+"""
+import typing
+import re
+import colorsys
+
+
+class CssNumber(typing.NamedTuple):
+    """
+    A plain number, eg the 1.5 in line-height:1.5
+    """
+    value:float
+
+    def __str__(self)->str:
+        return formatNumber(self.value)
+
+
+class CssLength(typing.NamedTuple):
+    """
+    A number with a unit, eg 12px, 1.5em, 90deg, 200ms
+    """
+    value:float
+    unit:str
+
+    def __str__(self)->str:
+        return formatNumber(self.value)+self.unit
+
+
+class CssPercentage(typing.NamedTuple):
+    """
+    A percentage, eg 50%
+    """
+    value:float
+
+    def __str__(self)->str:
+        return formatNumber(self.value)+'%'
+
+
+class CssColor(typing.NamedTuple):
+    """
+    A color, packed into a single 0xRRGGBBAA integer
+    """
+    rgba:int
+
+    @property
+    def r(self)->int:
+        """
+        red, 0..255
+        """
+        return (self.rgba>>24)&0xff
+
+    @property
+    def g(self)->int:
+        """
+        green, 0..255
+        """
+        return (self.rgba>>16)&0xff
+
+    @property
+    def b(self)->int:
+        """
+        blue, 0..255
+        """
+        return (self.rgba>>8)&0xff
+
+    @property
+    def a(self)->int:
+        """
+        alpha, 0..255
+        """
+        return self.rgba&0xff
+
+    @classmethod
+    def fromRgba(cls,r:float,g:float,b:float,a:float=1.0)->'CssColor':
+        """
+        Create from 0..255 color components and 0..1 alpha
+        """
+        def clamp(x:float)->int:
+            return max(0,min(255,int(round(x))))
+        return cls((clamp(r)<<24)|(clamp(g)<<16)|(clamp(b)<<8)|clamp(a*255))
+
+    def __str__(self)->str:
+        if self.a==0xff:
+            return '#%06x'%(self.rgba>>8)
+        return '#%08x'%self.rgba
+
+
+class CssKeyword(typing.NamedTuple):
+    """
+    An identifier, eg solid, auto, sans-serif
+    """
+    value:str
+
+    def __str__(self)->str:
+        return self.value
+
+
+class CssString(typing.NamedTuple):
+    """
+    A quoted string (value is without the quotes)
+    """
+    value:str
+    quote:str='"'
+
+    def __str__(self)->str:
+        return self.quote+self.value+self.quote
+
+
+class CssFunction(typing.NamedTuple):
+    """
+    A function that is not otherwise understood,
+    eg url(...), calc(...), var(...)
+    """
+    name:str
+    arguments:str
+
+    def __str__(self)->str:
+        return '%s(%s)'%(self.name,self.arguments)
+
+
+class CssSeparator(typing.NamedTuple):
+    """
+    A "," or "/" between parts of a value
+    """
+    value:str
+
+    def __str__(self)->str:
+        return self.value
+
+
+CssToken=typing.Union[CssNumber,CssLength,CssPercentage,CssColor,
+    CssKeyword,CssString,CssFunction,CssSeparator]
+
+
+def formatNumber(value:float)->str:
+    """
+    Format a number as briefly as possible without losing precision
+    """
+    if value==int(value):
+        return str(int(value))
+    ret=repr(value)
+    if 'e' in ret:
+        ret=('%.20f'%value).rstrip('0').rstrip('.')
+    return ret
+
+
+NAMED_COLORS:typing.Dict[str,int]={
+    'aliceblue':0xf0f8ff,'antiquewhite':0xfaebd7,'aqua':0x00ffff,
+    'aquamarine':0x7fffd4,'azure':0xf0ffff,'beige':0xf5f5dc,'bisque':0xffe4c4,
+    'black':0x000000,'blanchedalmond':0xffebcd,'blue':0x0000ff,
+    'blueviolet':0x8a2be2,'brown':0xa52a2a,'burlywood':0xdeb887,
+    'cadetblue':0x5f9ea0,'chartreuse':0x7fff00,'chocolate':0xd2691e,
+    'coral':0xff7f50,'cornflowerblue':0x6495ed,'cornsilk':0xfff8dc,
+    'crimson':0xdc143c,'cyan':0x00ffff,'darkblue':0x00008b,'darkcyan':0x008b8b,
+    'darkgoldenrod':0xb8860b,'darkgray':0xa9a9a9,'darkgreen':0x006400,
+    'darkgrey':0xa9a9a9,'darkkhaki':0xbdb76b,'darkmagenta':0x8b008b,
+    'darkolivegreen':0x556b2f,'darkorange':0xff8c00,'darkorchid':0x9932cc,
+    'darkred':0x8b0000,'darksalmon':0xe9967a,'darkseagreen':0x8fbc8f,
+    'darkslateblue':0x483d8b,'darkslategray':0x2f4f4f,'darkslategrey':0x2f4f4f,
+    'darkturquoise':0x00ced1,'darkviolet':0x9400d3,'deeppink':0xff1493,
+    'deepskyblue':0x00bfff,'dimgray':0x696969,'dimgrey':0x696969,
+    'dodgerblue':0x1e90ff,'firebrick':0xb22222,'floralwhite':0xfffaf0,
+    'forestgreen':0x228b22,'fuchsia':0xff00ff,'gainsboro':0xdcdcdc,
+    'ghostwhite':0xf8f8ff,'gold':0xffd700,'goldenrod':0xdaa520,'gray':0x808080,
+    'green':0x008000,'greenyellow':0xadff2f,'grey':0x808080,
+    'honeydew':0xf0fff0,'hotpink':0xff69b4,'indianred':0xcd5c5c,
+    'indigo':0x4b0082,'ivory':0xfffff0,'khaki':0xf0e68c,'lavender':0xe6e6fa,
+    'lavenderblush':0xfff0f5,'lawngreen':0x7cfc00,'lemonchiffon':0xfffacd,
+    'lightblue':0xadd8e6,'lightcoral':0xf08080,'lightcyan':0xe0ffff,
+    'lightgoldenrodyellow':0xfafad2,'lightgray':0xd3d3d3,'lightgreen':0x90ee90,
+    'lightgrey':0xd3d3d3,'lightpink':0xffb6c1,'lightsalmon':0xffa07a,
+    'lightseagreen':0x20b2aa,'lightskyblue':0x87cefa,'lightslategray':0x778899,
+    'lightslategrey':0x778899,'lightsteelblue':0xb0c4de,'lightyellow':0xffffe0,
+    'lime':0x00ff00,'limegreen':0x32cd32,'linen':0xfaf0e6,'magenta':0xff00ff,
+    'maroon':0x800000,'mediumaquamarine':0x66cdaa,'mediumblue':0x0000cd,
+    'mediumorchid':0xba55d3,'mediumpurple':0x9370db,'mediumseagreen':0x3cb371,
+    'mediumslateblue':0x7b68ee,'mediumspringgreen':0x00fa9a,
+    'mediumturquoise':0x48d1cc,'mediumvioletred':0xc71585,
+    'midnightblue':0x191970,'mintcream':0xf5fffa,'mistyrose':0xffe4e1,
+    'moccasin':0xffe4b5,'navajowhite':0xffdead,'navy':0x000080,
+    'oldlace':0xfdf5e6,'olive':0x808000,'olivedrab':0x6b8e23,'orange':0xffa500,
+    'orangered':0xff4500,'orchid':0xda70d6,'palegoldenrod':0xeee8aa,
+    'palegreen':0x98fb98,'paleturquoise':0xafeeee,'palevioletred':0xdb7093,
+    'papayawhip':0xffefd5,'peachpuff':0xffdab9,'peru':0xcd853f,'pink':0xffc0cb,
+    'plum':0xdda0dd,'powderblue':0xb0e0e6,'purple':0x800080,
+    'rebeccapurple':0x663399,'red':0xff0000,'rosybrown':0xbc8f8f,
+    'royalblue':0x4169e1,'saddlebrown':0x8b4513,'salmon':0xfa8072,
+    'sandybrown':0xf4a460,'seagreen':0x2e8b57,'seashell':0xfff5ee,
+    'sienna':0xa0522d,'silver':0xc0c0c0,'skyblue':0x87ceeb,
+    'slateblue':0x6a5acd,'slategray':0x708090,'slategrey':0x708090,
+    'snow':0xfffafa,'springgreen':0x00ff7f,'steelblue':0x4682b4,'tan':0xd2b48c,
+    'teal':0x008080,'thistle':0xd8bfd8,'tomato':0xff6347,'turquoise':0x40e0d0,
+    'violet':0xee82ee,'wheat':0xf5deb3,'white':0xffffff,'whitesmoke':0xf5f5f5,
+    'yellow':0xffff00,'yellowgreen':0x9acd32}
+
+
+TOKEN_RE=re.compile(r"""
+    (?P<space>\s+)
+    |(?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+    |(?P<unicodeRange>u\+[0-9a-f?]+(?:-[0-9a-f]+)?)
+    |(?P<function>[-_a-z][-_a-z0-9]*)\(
+    |(?P<hash>\#[-_0-9a-z]+)
+    |(?P<number>[-+]?(?:[0-9]*\.[0-9]+|[0-9]+)(?:e[-+]?[0-9]+)?)(?P<unit>%|[a-z]+)?
+    |(?P<keyword>!?[-_a-z0-9]+)
+    |(?P<separator>[,/])
+    """,re.IGNORECASE|re.VERBOSE|re.DOTALL)
+
+
+def _parseHexColor(hexDigits:str)->typing.Optional[CssColor]:
+    """
+    Parse the digits of a #rgb, #rgba, #rrggbb or #rrggbbaa color
+    """
+    if len(hexDigits) in (3,4):
+        hexDigits=''.join(c+c for c in hexDigits)
+    if len(hexDigits)==6:
+        hexDigits+='ff'
+    if len(hexDigits)!=8:
+        return None
+    try:
+        return CssColor(int(hexDigits,16))
+    except ValueError:
+        return None
+
+
+def _parseColorComponent(component:str,scale:float)->float:
+    """
+    Parse a number or percentage inside of rgb()/hsl()
+    """
+    component=component.strip()
+    if component.endswith('%'):
+        return float(component[:-1])*scale/100.0
+    if component.endswith('deg'):
+        component=component[:-3]
+    return float(component)
+
+
+def _parseColorFunction(name:str,arguments:str)->typing.Optional[CssColor]:
+    """
+    Parse rgb(), rgba(), hsl() or hsla()
+    """
+    parts=[p for p in re.split(r'[\s,/]+',arguments.strip()) if p]
+    if len(parts) not in (3,4):
+        return None
+    try:
+        alpha=1.0 if len(parts)==3 else _parseColorComponent(parts[3],1.0)
+        if name in ('rgb','rgba'):
+            red,green,blue=[_parseColorComponent(p,255.0) for p in parts[0:3]]
+            return CssColor.fromRgba(red,green,blue,alpha)
+        hue=_parseColorComponent(parts[0],360.0)/360.0
+        saturation=_parseColorComponent(parts[1],1.0)
+        lightness=_parseColorComponent(parts[2],1.0)
+        r,g,b=colorsys.hls_to_rgb(hue%1.0,lightness,saturation)
+        return CssColor.fromRgba(r*255,g*255,b*255,alpha)
+    except ValueError:
+        return None
+
+
+def parseValue(value:str)->typing.Tuple[typing.Tuple[CssToken,...],bool]:
+    """
+    Parse a declaration value into tokens
+
+    :return: (tokens,important)
+    """
+    important=False
+    tokens:typing.List[CssToken]=[]
+    pos=0
+    end=len(value)
+    while pos<end:
+        m=TOKEN_RE.match(value,pos)
+        if m is None:
+            # something we don't understand, keep it verbatim
+            tokens.append(CssKeyword(value[pos]))
+            pos+=1
+            continue
+        pos=m.end()
+        kind=m.lastgroup
+        if kind=='unit':
+            kind='number'
+        if kind=='space':
+            continue
+        if kind=='string':
+            text=m.group('string')
+            tokens.append(CssString(text[1:-1],text[0]))
+        elif kind=='function':
+            name=m.group('function')
+            depth=1
+            argsStart=pos
+            while pos<end and depth>0:
+                if value[pos]=='(':
+                    depth+=1
+                elif value[pos]==')':
+                    depth-=1
+                pos+=1
+            arguments=value[argsStart:pos-1]
+            color=None
+            if name.lower() in ('rgb','rgba','hsl','hsla'):
+                color=_parseColorFunction(name.lower(),arguments)
+            if color is not None:
+                tokens.append(color)
+            else:
+                tokens.append(CssFunction(name,arguments))
+        elif kind=='unicodeRange':
+            tokens.append(CssKeyword(m.group('unicodeRange')))
+        elif kind=='hash':
+            color=_parseHexColor(m.group('hash')[1:])
+            if color is None:
+                tokens.append(CssKeyword(m.group('hash')))
+            else:
+                tokens.append(color)
+        elif kind=='number':
+            number=float(m.group('number'))
+            unit=m.group('unit')
+            if unit is None:
+                tokens.append(CssNumber(number))
+            elif unit=='%':
+                tokens.append(CssPercentage(number))
+            else:
+                tokens.append(CssLength(number,unit.lower()))
+        elif kind=='keyword':
+            keyword=m.group('keyword')
+            lowerKeyword=keyword.lower()
+            if lowerKeyword=='!important':
+                important=True
+            elif lowerKeyword=='transparent':
+                tokens.append(CssColor(0))
+            elif lowerKeyword in NAMED_COLORS:
+                tokens.append(CssColor((NAMED_COLORS[lowerKeyword]<<8)|0xff))
+            else:
+                tokens.append(CssKeyword(keyword))
+        else:
+            tokens.append(CssSeparator(m.group('separator')))
+    return tuple(tokens),important
+
+
+def serializeTokens(tokens:typing.Iterable[CssToken],
+    important:bool=False
+    )->str:
+    """
+    Turn tokens back into a value string
+    """
+    ret:typing.List[str]=[]
+    for token in tokens:
+        if isinstance(token,CssSeparator):
+            ret.append(token.value)
+        else:
+            if ret and ret[-1] not in (',','/'):
+                ret.append(' ')
+            ret.append(str(token))
+    if important:
+        ret.append('!important')
+    return ''.join(ret)
+
+
+class CssValue(str):
+    """
+    The value of a single css declaration.
+
+    Acts exactly like a str, but also parses itself into typed
+    tokens on first access to tokens/important, and caches them.
+    """
+
+    __slots__=('_tokens','_important')
+
+    def _parse(self)->None:
+        """
+        Parse and cache
+        """
+        self._tokens,self._important=parseValue(self)
+
+    @property
+    def tokens(self)->typing.Tuple[CssToken,...]:
+        """
+        The parsed value (without any !important)
+        """
+        try:
+            return self._tokens
+        except AttributeError:
+            self._parse()
+            return self._tokens
+
+    @property
+    def important(self)->bool:
+        """
+        Whether this value is marked !important
+        """
+        try:
+            return self._important
+        except AttributeError:
+            self._parse()
+            return self._important
+
+    @property
+    def isParsed(self)->bool:
+        """
+        Whether the tokens have been parsed yet
+        """
+        return hasattr(self,'_tokens')
+
+    @classmethod
+    def fromTokens(cls,
+        tokens:typing.Iterable[CssToken],
+        important:bool=False
+        )->'CssValue':
+        """
+        Create a value from tokens (already parsed)
+        """
+        tokens=tuple(tokens)
+        ret=cls(serializeTokens(tokens,important))
+        ret._tokens=tokens
+        ret._important=important
+        return ret
+
+
+CssValueCompatible=typing.Union[str,CssValue]
+def asCssValue(value:CssValueCompatible)->CssValue:
+    """
+    Always returns a CssValue object.
+    if value is already a CssValue object,
+        returns unchanged
+    """
+    if isinstance(value,CssValue):
+        return value
+    return CssValue(value)
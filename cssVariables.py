@@ -0,0 +1,387 @@
+"""
+Resolve css custom properties (--name: value) and var() references
+
+Resolving is done per "environment" (the set of custom property
+values an element sees), not per element.  Since most elements
+inherit their parent's environment unchanged, and many elements
+declare the same properties on top of the same parent environment,
+the work of building the dependency graph and substituting values
+is done once per unique environment and then reused.
+"""
+import typing
+import re
+from .cssParser import findDelimiter,findClosingParen
+from .cssStyles import CssStyles
+from .htmlTypes import HtmlElementLike,getParent
+if typing.TYPE_CHECKING:
+    from .rules import CssRules
+
+
+VAR_REFERENCE_RE=re.compile(r"""var\(\s*(--[^\s,)]+)""",re.IGNORECASE)
+VariableLookup=typing.Callable[[str],typing.Optional[str]]
+
+
+def isCustomProperty(name:str)->bool:
+    """
+    Whether a property name is a custom property, eg "--main-color"
+    """
+    return name.startswith('--')
+
+
+def getVariableReferences(value:str)->typing.List[str]:
+    """
+    Get the names of all custom properties a value refers
+    to with var(), including any in fallbacks
+    """
+    if 'var(' not in value.lower():
+        return []
+    return VAR_REFERENCE_RE.findall(value)
+
+
+def substituteVariables(value:str,lookup:VariableLookup)->typing.Optional[str]:
+    """
+    Replace all var(--name, fallback) references in a value
+
+    :param lookup: get the value of a custom property, or None if
+        it is not defined (or is invalid)
+    :return: the new value, or None if the value is invalid because
+        it refers to a missing variable with no fallback
+    """
+    lowerValue=value.lower()
+    if 'var(' not in lowerValue:
+        return value
+    ret:typing.List[str]=[]
+    pos=0
+    while True:
+        varIdx=lowerValue.find('var(',pos)
+        if varIdx<0:
+            ret.append(value[pos:])
+            break
+        ret.append(value[pos:varIdx])
+        closeIdx=findClosingParen(value,varIdx+3)
+        commaIdx=findDelimiter(value,varIdx+4,closeIdx,',')
+        name=value[varIdx+4:commaIdx].strip()
+        replacement=lookup(name)
+        if replacement is None:
+            if commaIdx>=closeIdx:
+                return None
+            fallback=value[commaIdx+1:closeIdx].strip()
+            replacement=substituteVariables(fallback,lookup)
+            if replacement is None:
+                return None
+        ret.append(replacement)
+        pos=closeIdx+1
+    return ''.join(ret)
+
+
+def _stronglyConnected(dependencies:typing.Dict[str,typing.List[str]]
+    )->typing.List[typing.List[str]]:
+    """
+    Tarjan's algorithm, without recursion so that a long chain
+    of references can't hit the recursion limit
+
+    :param dependencies: {name:names it depends on}
+    :return: the strongly connected components, each one after
+        all of the components it depends on
+    """
+    ret:typing.List[typing.List[str]]=[]
+    index:typing.Dict[str,int]={}
+    lowLink:typing.Dict[str,int]={}
+    stack:typing.List[str]=[]
+    onStack:typing.Set[str]=set()
+    for root in dependencies:
+        if root in index:
+            continue
+        # (name,position in its dependency list)
+        work=[(root,0)]
+        while work:
+            name,i=work.pop()
+            if i==0:
+                index[name]=lowLink[name]=len(index)
+                stack.append(name)
+                onStack.add(name)
+            edges=dependencies[name]
+            while i<len(edges):
+                dependency=edges[i]
+                i+=1
+                if dependency not in index:
+                    work.append((name,i))
+                    work.append((dependency,0))
+                    break
+                if dependency in onStack:
+                    lowLink[name]=min(lowLink[name],index[dependency])
+            else:
+                if lowLink[name]==index[name]:
+                    component:typing.List[str]=[]
+                    while True:
+                        member=stack.pop()
+                        onStack.discard(member)
+                        component.append(member)
+                        if member==name:
+                            break
+                    ret.append(component)
+                if work:
+                    parent=work[-1][0]
+                    lowLink[parent]=min(lowLink[parent],lowLink[name])
+    return ret
+
+
+class CustomPropertyEnvironment:
+    """
+    An immutable set of resolved custom property values,
+    as seen by an element.
+
+    A value of None means the property is "guaranteed-invalid"
+    (eg, it was part of a dependency cycle) so var() references
+    to it will use their fallback.
+    """
+
+    def __init__(self,
+        values:typing.Optional[typing.Dict[str,typing.Optional[str]]]=None):
+        """ """
+        self._values:typing.Dict[str,typing.Optional[str]]={}
+        if values is not None:
+            self._values=dict(values)
+        self.key:typing.Tuple[typing.Tuple[str,typing.Optional[str]],...]=\
+            tuple(sorted(self._values.items(),key=lambda kv: kv[0]))
+        self._substitutions:typing.Dict[str,typing.Optional[str]]={}
+
+    def get(self,name:str)->typing.Optional[str]:
+        """
+        Get the resolved value of a custom property,
+        or None if it is not defined or invalid
+        """
+        return self._values.get(name)
+
+    def substitute(self,value:str)->typing.Optional[str]:
+        """
+        Replace all var() references in a value.
+
+        Results are memoized, since the same values tend to
+        show up on many elements sharing this environment.
+
+        :return: the new value, or None if it is invalid
+        """
+        if value in self._substitutions:
+            return self._substitutions[value]
+        ret=substituteVariables(value,self.get)
+        self._substitutions[value]=ret
+        return ret
+
+    def __len__(self)->int:
+        return len(self._values)
+
+    def __iter__(self)->typing.Iterator[str]:
+        return iter(self._values)
+
+    def items(self)->typing.ItemsView[str,typing.Optional[str]]:
+        """
+        Access like a dict of name:value
+        """
+        return self._values.items()
+
+    def __repr__(self)->str:
+        return '; '.join(['%s: %s'%kv for kv in self.key])
+
+EMPTY_ENVIRONMENT=CustomPropertyEnvironment()
+
+
+class CssVariableResolver:
+    """
+    Resolves custom properties and var() references.
+
+    Each unique environment (custom property values) is only
+    built once, and is shared by every element that sees it.
+    """
+
+    def __init__(self):
+        # {environment.key:environment} so equal environments are shared
+        self._environments:typing.Dict[
+            typing.Tuple[typing.Tuple[str,typing.Optional[str]],...],
+            CustomPropertyEnvironment]={}
+        # {(id(inherited),declared items):environment}
+        self._derived:typing.Dict[
+            typing.Tuple[int,typing.Tuple[typing.Tuple[str,str],...]],
+            CustomPropertyEnvironment]={}
+        self.environmentsResolved=0
+
+    def _intern(self,
+        environment:CustomPropertyEnvironment
+        )->CustomPropertyEnvironment:
+        """
+        Get the shared copy of an environment
+        """
+        return self._environments.setdefault(environment.key,environment)
+
+    def resolveEnvironment(self,
+        declared:typing.Union[CssStyles,typing.Dict[str,str]],
+        inherited:typing.Optional[CustomPropertyEnvironment]=None
+        )->CustomPropertyEnvironment:
+        """
+        Get the environment seen by an element that declares
+        some custom properties on top of what it inherited.
+
+        :param declared: the element's styles (any properties that
+            are not custom properties are ignored)
+        :param inherited: the environment of the parent element
+        """
+        if inherited is None:
+            inherited=EMPTY_ENVIRONMENT
+        else:
+            inherited=self._intern(inherited)
+        declaredItems=tuple((k,v) for k,v in declared.items()
+            if isCustomProperty(k))
+        if not declaredItems:
+            return inherited
+        cacheKey=(id(inherited),declaredItems)
+        ret=self._derived.get(cacheKey)
+        if ret is None:
+            ret=self._intern(self._resolve(dict(declaredItems),inherited))
+            self._derived[cacheKey]=ret
+        return ret
+
+    def _resolve(self,
+        declared:typing.Dict[str,str],
+        inherited:CustomPropertyEnvironment
+        )->CustomPropertyEnvironment:
+        """
+        Build the dependency graph of the declared custom
+        properties and resolve them in dependency order.
+
+        Properties that are part of a cycle become invalid.
+        """
+        self.environmentsResolved+=1
+        dependencies={name:[ref for ref in getVariableReferences(value)
+                if ref in declared]
+            for name,value in declared.items()}
+        resolved:typing.Dict[str,typing.Optional[str]]=dict(inherited.items())
+
+        def lookup(name:str)->typing.Optional[str]:
+            return resolved.get(name)
+
+        for component in _stronglyConnected(dependencies):
+            name=component[0]
+            if len(component)>1 or name in dependencies[name]:
+                # every member of a cycle is invalid
+                for member in component:
+                    resolved[member]=None
+            else:
+                resolved[name]=substituteVariables(declared[name],lookup)
+        return CustomPropertyEnvironment(resolved)
+
+    def resolveStyles(self,
+        styles:CssStyles,
+        inherited:typing.Optional[CustomPropertyEnvironment]=None
+        )->typing.Tuple[CssStyles,CustomPropertyEnvironment]:
+        """
+        Resolve all var() references in a set of styles
+
+        Properties that become invalid (refer to a missing variable
+        with no fallback) are dropped, as a browser would.
+
+        :param inherited: the environment of the parent element
+        :return: (resolved styles,environment for children to inherit)
+        """
+        environment=self.resolveEnvironment(styles,inherited)
+        ret=CssStyles()
+        for name,value in styles.items():
+            if isCustomProperty(name):
+                value=environment.get(name)
+            else:
+                value=environment.substitute(value)
+            if value is not None:
+                ret[name]=value
+        return ret,environment
+
+    def resolveDocument(self,
+        stylesForDocument:typing.Dict[HtmlElementLike,CssStyles]
+        )->typing.Dict[HtmlElementLike,CssStyles]:
+        """
+        Resolve var() references for every element in a document,
+        with custom properties inherited from parent elements.
+
+        :param stylesForDocument: {element:styles} in document order,
+            such as from CssRules.getStylesForDocument()
+        :return: {element:resolved styles}
+        """
+        environments:typing.Dict[HtmlElementLike,CustomPropertyEnvironment]={}
+        ret:typing.Dict[HtmlElementLike,CssStyles]={}
+        for element,styles in stylesForDocument.items():
+            parent=getParent(element)
+            inherited=None if parent is None else environments.get(parent)
+            ret[element],environments[element]=self.resolveStyles(
+                styles,inherited)
+        return ret
+
+
+def flattenVariables(rules:'CssRules',removeDefinitions:bool=True)->int:
+    """
+    A build step that replaces var() references with their values,
+    wherever that can be done without knowing the document.
+
+    Only variables defined on :root (or html) and never redefined
+    anywhere else are flattened.  Anything else is left as var().
+
+    :param removeDefinitions: also remove the :root definitions
+        of the flattened variables
+    :return: the number of values that were changed
+    """
+    rootDeclared:typing.Dict[str,str]={}
+    redefined:typing.Set[str]=set()
+    for rule in rules:
+        isRoot=len(rule.selectors)>0 and rule.media is None \
+            and all(str(selector) in (':root','html')
+                for selector in rule.selectors)
+        for name,value in rule.styles.items():
+            if isCustomProperty(name):
+                if isRoot:
+                    rootDeclared[name]=value
+                else:
+                    redefined.add(name)
+    flattenable={k:v for k,v in rootDeclared.items() if k not in redefined}
+    if not flattenable:
+        return 0
+    environment=CssVariableResolver().resolveEnvironment(flattenable)
+
+    def lookup(name:str)->typing.Optional[str]:
+        if name in flattenable:
+            return environment.get(name)
+        return None
+
+    numChanged=0
+    stillReferenced:typing.Set[str]=set()
+    for rule in rules:
+        if rule.isOpaque:
+            # eg @supports blocks, which are kept as text
+            text=rule.text # type: ignore
+            stillReferenced.update(getVariableReferences(text))
+            continue
+        styles=rule.styles
+        for name,value in list(styles.items()):
+            references=getVariableReferences(value)
+            if not references:
+                continue
+            if isCustomProperty(name) \
+                or any(ref not in flattenable for ref in references):
+                # depends on something that can change per-element
+                stillReferenced.update(references)
+                continue
+            newValue=substituteVariables(value,lookup)
+            if newValue is None:
+                stillReferenced.update(references)
+            elif newValue!=value:
+                styles[name]=newValue
+                numChanged+=1
+    if removeDefinitions:
+        emptied:typing.Set[int]=set()
+        for rule in rules:
+            styles=rule.styles
+            for name in list(styles.keys()):
+                if name in flattenable and name not in stillReferenced:
+                    del styles[name]
+                    numChanged+=1
+                    if not styles:
+                        emptied.add(id(rule))
+        if emptied:
+            rules.assign([rule for rule in rules if id(rule) not in emptied])
+    return numChanged
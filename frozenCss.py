@@ -0,0 +1,277 @@
+"""
+An immutable, fully precompiled snapshot of a stylesheet
+
+A FrozenCss is built once and then only ever read, so any number
+of threads can query it at the same time without locks.  Everything
+that CssRules builds lazily (media partitions, parsed values, the
+rule index) is built up front, identical selectors and declaration
+blocks are shared, and per-rule bookkeeping is kept in flat arrays
+rather than lists of python objects.
+
+For pre-fork servers, build it in the parent and call
+prepareForFork() before forking, so the children can share its
+memory pages copy-on-write.
+"""
+import typing
+import gc
+from array import array
+from .htmlTypes import HtmlElementLike
+from .matchContext import MatchContext
+from .mediaQueries import MediaContext,MediaQueryList
+from .cssStyles import CssStyles
+from .cssSelectors import CssSelector,CssSelectors
+from .minify import getMinifiedCssString
+from .rules import CssRule,CssOpaqueRule,CssRules,CssRulesCompatible
+from .ruleIndex import RuleIndex
+
+
+class FrozenCss:
+    """
+    A read-only stylesheet that is safe to share between threads
+    (and between processes, copy-on-write, after a fork)
+
+    NOTE: the rules it returns are its own private copies, and
+    must not be modified.
+    """
+
+    __slots__=('_rules','_index','_styles','_conditions',
+        '_rulePartitions','_mediaMatches')
+
+    def __init__(self,rules:CssRulesCompatible):
+        """
+        :param rules: the rules to take a snapshot of
+        """
+        if not isinstance(rules,CssRules):
+            if hasattr(rules,'rules'):
+                rules=rules.rules # type: ignore
+            else:
+                rules=CssRules(rules)
+        selectors:typing.Dict[str,CssSelector]={}
+        styles:typing.Dict[
+            typing.Tuple[typing.Tuple[str,str],...],CssStyles]={}
+        conditions:typing.Dict[typing.Tuple[str,...],int]={(): 0}
+        conditionList:typing.List[typing.Optional[MediaQueryList]]=[None]
+        frozenRules:typing.List[CssRule]=[]
+        ruleStyles:typing.List[CssStyles]=[]
+        rulePartitions=array('l')
+        for rule in rules:
+            ruleSelectors=CssSelectors()
+            for selector in rule.selectors:
+                key=str(selector)
+                frozenSelector=selectors.get(key)
+                if frozenSelector is None:
+                    frozenSelector=CssSelector(key)
+                    selectors[key]=frozenSelector
+                ruleSelectors.append(frozenSelector)
+            declarations=tuple(rule.styles.items())
+            frozenStyles=styles.get(declarations)
+            if frozenStyles is None:
+                frozenStyles=CssStyles(rule.styles)
+                for value in frozenStyles._items.values():
+                    # parse now, rather than on first use by some thread
+                    value.tokens # pylint: disable=pointless-statement
+                styles[declarations]=frozenStyles
+            levels=() if rule.media is None else rule.media.levels
+            partition=conditions.get(levels)
+            if partition is None:
+                partition=len(conditionList)
+                conditions[levels]=partition
+                conditionList.append(MediaQueryList(levels))
+            condition=conditionList[partition]
+            if rule.isOpaque:
+                frozenRule=CssOpaqueRule(rule.text,condition) # type: ignore
+            else:
+                frozenRule=CssRule(ruleSelectors,(),condition)
+            frozenRule._styles=frozenStyles
+            frozenRules.append(frozenRule)
+            ruleStyles.append(frozenStyles)
+            rulePartitions.append(partition)
+        initAttribute=object.__setattr__
+        initAttribute(self,'_rules',tuple(frozenRules))
+        initAttribute(self,'_index',RuleIndex(frozenRules))
+        initAttribute(self,'_styles',tuple(ruleStyles))
+        initAttribute(self,'_conditions',tuple(conditionList))
+        initAttribute(self,'_rulePartitions',rulePartitions)
+        # {media:(whether each condition matches)}
+        # filled in on demand, but only ever with complete
+        # entries, so concurrent readers see an entry or nothing
+        initAttribute(self,'_mediaMatches',{})
+
+    def __setattr__(self,name:str,value:typing.Any)->None:
+        raise AttributeError('FrozenCss is immutable')
+
+    def __delattr__(self,name:str)->None:
+        raise AttributeError('FrozenCss is immutable')
+
+    def __len__(self)->int:
+        return len(self._rules)
+
+    def __iter__(self)->typing.Iterator[CssRule]:
+        return iter(self._rules)
+
+    @typing.overload
+    def __getitem__(self,idx:int
+        )->CssRule:
+        ...
+    @typing.overload
+    def __getitem__(self,idx:slice
+        )->typing.Iterable[CssRule]:
+        ...
+    def __getitem__(self,idx:typing.Union[int,slice]
+        )->typing.Union[CssRule,typing.Iterable[CssRule]]:
+        return self._rules[idx]
+
+    @property
+    def rules(self)->typing.Tuple[CssRule,...]:
+        """
+        All of the rules, in source order
+        """
+        return self._rules
+
+    def _conditionMatches(self,media:MediaContext)->typing.Tuple[bool,...]:
+        """
+        Whether each distinct @media condition is in effect
+        for a given media context (cached per context)
+        """
+        ret=self._mediaMatches.get(media)
+        if ret is None:
+            ret=tuple(condition is None or condition.matches(media)
+                for condition in self._conditions)
+            self._mediaMatches[media]=ret
+        return ret
+
+    def getRuleIndexesForElement(self,
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]=None,
+        media:typing.Optional[MediaContext]=None
+        )->typing.List[int]:
+        """
+        Get the indexes of all rules that apply to an element,
+        in source order
+
+        :param media: only include rules in effect for this media
+            (if None, media conditions are ignored)
+        """
+        ret=self._index.getRuleIndexesForElement(element,context)
+        if media is not None:
+            conditionMatches=self._conditionMatches(media)
+            rulePartitions=self._rulePartitions
+            ret=[i for i in ret if conditionMatches[rulePartitions[i]]]
+        return ret
+
+    def getRulesForElement(self,
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]=None,
+        media:typing.Optional[MediaContext]=None
+        )->typing.List[CssRule]:
+        """
+        Get all rules that apply to an element, in source order
+
+        :param media: only include rules in effect for this media
+            (if None, media conditions are ignored)
+        """
+        return [self._rules[i]
+            for i in self.getRuleIndexesForElement(element,context,media)]
+    getRules=getRulesForElement
+
+    def getRulesForMedia(self,
+        media:typing.Optional[MediaContext]
+        )->typing.List[CssRule]:
+        """
+        Get the rules that are in effect for a given media context,
+        in source order
+        """
+        if media is None:
+            return list(self._rules)
+        conditionMatches=self._conditionMatches(media)
+        return [rule
+            for rule,partition in zip(self._rules,self._rulePartitions)
+            if conditionMatches[partition]]
+
+    def getStyles(self,
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]=None,
+        media:typing.Optional[MediaContext]=None
+        )->CssStyles:
+        """
+        Collect all the styles that apply to an element
+
+        NOTE: does not yet include inherited ("cascaded") styles!
+
+        :return: a new CssStyles, which the caller is free to modify
+        """
+        return CssStyles([self._styles[i]
+            for i in self.getRuleIndexesForElement(element,context,media)])
+    getStyle=getStyles
+    getStylesForElement=getStyles
+    getStyleForElement=getStyles
+
+    def getStylesForDocument(self,
+        document:typing.Any,
+        media:typing.Optional[MediaContext]=None
+        )->typing.Dict[HtmlElementLike,CssStyles]:
+        """
+        Get the styles for every element in a document
+        in a single traversal
+
+        :return: {element:styles}
+        """
+        context=MatchContext()
+        ret:typing.Dict[HtmlElementLike,CssStyles]={}
+        for element in context.walk(document):
+            ret[element]=self.getStyles(element,context,media)
+        return ret
+
+    def hasSelector(self,cssSelector:typing.Union[str,CssSelector])->bool:
+        """
+        Determine if any rule has a given selector
+        """
+        for rule in self._rules:
+            if rule.hasSelector(cssSelector):
+                return True
+        return False
+
+    def thaw(self)->CssRules:
+        """
+        Get an ordinary, modifiable copy of these rules
+        """
+        return CssRules([CssOpaqueRule(rule.text,rule.media) # type: ignore
+            if rule.isOpaque
+            else CssRule(str(rule.selectors),rule.styles,rule.media)
+            for rule in self._rules])
+
+    def getMinifiedCssString(self)->str:
+        """
+        Returns the css text with no unnecessary whitespace
+        """
+        return getMinifiedCssString(self._rules)
+
+    def getCssString(self,indent='\t',prepend='\n')->str:
+        """
+        Returns the css text
+        """
+        return self.thaw().getCssString(indent,prepend)
+
+    @property
+    def cssString(self)->str:
+        """
+        This object as a css string
+        """
+        return self.getCssString()
+
+    @staticmethod
+    def prepareForFork()->None:
+        """
+        Call this in the parent process, after loading everything
+        to be shared and just before forking.
+
+        Moves every object that exists so far out of the way of
+        the cyclic garbage collector, which would otherwise write
+        to each of them (and so copy its memory page) in every child.
+        """
+        gc.collect()
+        if hasattr(gc,'freeze'):
+            gc.freeze()
+
+    def __repr__(self)->str:
+        return self.getCssString()
@@ -18,3 +18,206 @@ except ImportError:
 
 HtmlElementLike=typing.Union[LxmlElement,MinidomElement]
 HtmlElementsLike=typing.Union[HtmlElementLike,typing.Iterable[HtmlElementLike],HtmlCompatible]
+
+
+def getTagName(element:HtmlElementLike)->str:
+    """
+    Get the tag name of an element, regardless of which
+    dom implementation it came from
+    """
+    tagName=getattr(element,'tagName',None)
+    if tagName is None:
+        # lxml
+        tagName=element.tag
+        if not isinstance(tagName,str):
+            # comments, processing instructions, etc
+            return ''
+        if tagName[0]=='{':
+            tagName=tagName.split('}',1)[1]
+    return tagName
+
+
+def getAttribute(element:HtmlElementLike,name:str)->typing.Optional[str]:
+    """
+    Get the value of an attribute of an element, regardless of
+    which dom implementation it came from
+
+    :return: the value, or None if the attribute is not present
+    """
+    attrib=getattr(element,'attrib',None)
+    if attrib is not None:
+        # lxml and htmlTools
+        return attrib.get(name)
+    if element.hasAttribute(name):
+        # minidom
+        return element.getAttribute(name)
+    return None
+
+
+def setAttribute(element:HtmlElementLike,name:str,value:str)->None:
+    """
+    Set the value of an attribute of an element, regardless of
+    which dom implementation it came from
+    """
+    if hasattr(element,'attrib') and hasattr(element,'set'):
+        # lxml
+        element.set(name,value)
+    elif hasattr(element,'attrib'):
+        # htmlTools
+        element.attrib[name]=value
+    else:
+        # minidom
+        element.setAttribute(name,value)
+
+
+def toHtmlString(node:typing.Any)->str:
+    """
+    Serialize a document or element, regardless of which
+    dom implementation it came from
+    """
+    if hasattr(node,'toxml'):
+        # minidom
+        if getattr(node,'documentElement',None) is not None:
+            node=node.documentElement
+        return node.toxml()
+    if hasattr(node,'getroottree') or hasattr(node,'getroot'):
+        # lxml
+        import lxml.etree
+        return lxml.etree.tostring(node,method='html',encoding='unicode')
+    return str(node)
+
+
+def isElement(node:typing.Any)->bool:
+    """
+    Determine if a dom node is an element (as opposed to
+    text, comments, documents, etc)
+    """
+    nodeType=getattr(node,'nodeType',None)
+    if nodeType is not None:
+        # minidom
+        return nodeType==MinidomElement.ELEMENT_NODE
+    tag=getattr(node,'tag',None)
+    if tag is not None:
+        # lxml
+        return isinstance(tag,str)
+    return hasattr(node,'tagName')
+
+
+def getRootElement(node:typing.Any)->HtmlElementLike:
+    """
+    Given a document or an element, return the element to
+    start walking from
+    """
+    if isElement(node):
+        return node
+    documentElement=getattr(node,'documentElement',None)
+    if documentElement is not None:
+        # minidom
+        return documentElement
+    if hasattr(node,'getroot'):
+        # lxml ElementTree
+        return node.getroot()
+    return node
+
+
+def getParent(element:HtmlElementLike)->typing.Optional[HtmlElementLike]:
+    """
+    Get the parent element of an element, regardless of
+    which dom implementation it came from
+
+    :return: the parent, or None if this is the root element
+    """
+    if hasattr(element,'getparent'):
+        # lxml
+        parent=element.getparent()
+    elif hasattr(element,'parentNode'):
+        # minidom
+        parent=element.parentNode
+    else:
+        parent=getattr(element,'parent',None)
+    if parent is None or not isElement(parent):
+        return None
+    return parent
+
+
+def getAncestors(element:HtmlElementLike)->typing.Iterator[HtmlElementLike]:
+    """
+    Walk up the tree, starting with the element's parent
+    """
+    parent=getParent(element)
+    while parent is not None:
+        yield parent
+        parent=getParent(parent)
+
+
+def getChildElements(element:HtmlElementLike
+    )->typing.Iterator[HtmlElementLike]:
+    """
+    Get the child elements of an element (skipping text,
+    comments, etc) regardless of which dom implementation
+    it came from
+    """
+    children=getattr(element,'childNodes',None)
+    if children is None:
+        # lxml and htmlTools
+        children=element
+    for child in children:
+        if isElement(child):
+            yield child
+
+
+def getPreviousSiblings(element:HtmlElementLike
+    )->typing.Iterator[HtmlElementLike]:
+    """
+    Walk backwards through the element siblings that come
+    before this element, starting with the closest one
+    """
+    if hasattr(element,'getprevious'):
+        # lxml
+        sibling=element.getprevious()
+        while sibling is not None:
+            if isElement(sibling):
+                yield sibling
+            sibling=sibling.getprevious()
+        return
+    if hasattr(element,'previousSibling'):
+        # minidom
+        sibling=element.previousSibling
+        while sibling is not None:
+            if isElement(sibling):
+                yield sibling
+            sibling=sibling.previousSibling
+        return
+    parent=getParent(element)
+    if parent is None:
+        return
+    previous:typing.List[HtmlElementLike]=[]
+    for sibling in getChildElements(parent):
+        if sibling is element:
+            break
+        previous.append(sibling)
+    yield from reversed(previous)
+
+
+def isEmpty(element:HtmlElementLike)->bool:
+    """
+    Whether an element has no child elements and no text
+    (comments are allowed, as per css :empty)
+    """
+    childNodes=getattr(element,'childNodes',None)
+    if childNodes is not None:
+        # minidom
+        for child in childNodes:
+            if child.nodeType in (child.TEXT_NODE,child.CDATA_SECTION_NODE):
+                if child.data:
+                    return False
+            elif child.nodeType!=child.COMMENT_NODE:
+                return False
+        return True
+    # lxml and htmlTools
+    if getattr(element,'text',None):
+        return False
+    for child in element:
+        if isElement(child) or getattr(child,'tail',None):
+            return False
+    return True
@@ -0,0 +1,252 @@
+"""
+Inline css rules into style="" attributes, eg for html email
+
+A CssInliner compiles the stylesheet once (selectors, specificities,
+and a RuleIndex) so it can then be applied to any number of
+documents.  Each document is styled in a single walk:
+
+  1. the rules that match each element are found through the index
+     (with the ancestor filter rejecting impossible selectors)
+  2. they are merged in cascade order, that is by specificity, then
+     source order, with !important values winning
+  3. the element's own style="" is merged last, so it overrides
+     everything except !important rules, as in a browser
+
+Rules that can't be inlined, like :hover, @font-face, and @media
+rules that are not in effect, are collected in leftoverCss for the
+caller to put in a <style> element.
+
+Emails generated from the same templates have elements that match
+the same rules, so the combined style="" text is cached by which
+rules matched.
+"""
+import typing
+import os
+import concurrent.futures
+from collections import OrderedDict
+from .htmlTypes import HtmlElementLike,getAttribute,setAttribute,toHtmlString
+from .matchContext import MatchContext
+from .mediaQueries import MediaContext
+from .cssStyles import CssStyles
+from .cssSelectors import CssSelector,CssSelectors
+from .shorthands import mergeDeclarations
+from .minify import getMinifiedCssString
+from .rules import CssRule,CssRules,CssRulesCompatible
+from .ruleIndex import RuleIndex
+from .selectorCost import Specificity,getSpecificity
+
+
+# a parsed document/element, or html text
+DocumentCompatible=typing.Any
+
+
+def _isStatic(selector:CssSelector)->bool:
+    """
+    Whether a selector can match a static document
+    (that is, has no :hover, ::before, etc)
+    """
+    if not selector._rightToLeft:
+        return False
+    for requirement,_ in selector._rightToLeft:
+        if requirement._neverMatches:
+            return False
+    return True
+
+
+class CssInliner:
+    """
+    Applies a stylesheet to documents by writing
+    the styles of each element into its style="" attribute
+
+    Once created, it is only read from (apart from its cache
+    of style text), so can be shared between threads.
+    """
+
+    # the most distinct style="" texts to remember
+    MAX_CACHED_STYLES=4096
+
+    def __init__(self,
+        rules:CssRulesCompatible,
+        media:typing.Optional[MediaContext]=None):
+        """
+        :param rules: the stylesheet to inline
+        :param media: inline @media rules that are in effect for this
+            context.  If None, rules inside @media are never inlined
+            (they end up in leftoverCss), which is what responsive
+            emails want.
+        """
+        if not isinstance(rules,CssRules):
+            if hasattr(rules,'rules'):
+                rules=rules.rules # type: ignore
+            else:
+                rules=CssRules(rules)
+        self.rules=rules
+        self.media=media
+        inlined:typing.List[CssRule]=[]
+        leftover:typing.List[CssRule]=[]
+        self._specificities:typing.Dict[str,Specificity]={}
+        for rule in rules:
+            mediaMatches=rule.media is None \
+                or (media is not None and rule.media.matches(media))
+            if rule.isAtRule or not mediaMatches:
+                leftover.append(rule)
+                continue
+            static=CssSelectors()
+            dynamic=CssSelectors()
+            for selector in rule.selectors:
+                if _isStatic(selector):
+                    static.append(selector)
+                    selectorString=selector._selectorString
+                    if selectorString not in self._specificities:
+                        self._specificities[selectorString]=\
+                            getSpecificity(selectorString)
+                else:
+                    dynamic.append(selector)
+            if static:
+                inlinedRule=CssRule(static,())
+                inlinedRule._styles=rule.styles
+                inlined.append(inlinedRule)
+            if dynamic:
+                leftover.append(CssRule(dynamic,rule.styles,rule.media))
+        self._index=RuleIndex(inlined)
+        self.leftoverRules=CssRules(leftover)
+        # {(matched rule indexes,existing style):style text}
+        self._styleCache:typing.Dict[
+            typing.Tuple[typing.Tuple[int,...],typing.Optional[str]],str]={}
+
+    @property
+    def leftoverCss(self)->str:
+        """
+        The (minified) css that could not be inlined,
+        to go in a <style> element
+        """
+        return getMinifiedCssString(self.leftoverRules)
+
+    def getMatchingRuleIndexes(self,
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]=None
+        )->typing.Tuple[int,...]:
+        """
+        Get the indexes of the inlined rules that match an element,
+        in cascade order (least specific first)
+        """
+        specificities=self._specificities
+        # {rule index:specificity of its most specific matching selector}
+        matched:typing.Dict[int,Specificity]={}
+        for ruleIndex,selector in self._index.candidates(element):
+            specificity=specificities[selector._selectorString]
+            previous=matched.get(ruleIndex)
+            if previous is not None and previous>=specificity:
+                continue
+            if selector.matches(element,context):
+                matched[ruleIndex]=specificity
+        return tuple(sorted(matched,key=lambda i: (matched[i],i)))
+
+    def getStyleAttribute(self,
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]=None
+        )->typing.Optional[str]:
+        """
+        Get what the style="" attribute of an element should become
+
+        :return: the attribute contents, or None to leave it as it is
+        """
+        ruleIndexes=self.getMatchingRuleIndexes(element,context)
+        if not ruleIndexes:
+            return None
+        existing=getAttribute(element,'style')
+        key=(ruleIndexes,existing)
+        ret=self._styleCache.get(key)
+        if ret is None:
+            declarations:typing.Dict[str,typing.Any]=OrderedDict()
+            rules=self._index.rules
+            for i in ruleIndexes:
+                mergeDeclarations(declarations,rules[i].styles.items())
+            if existing:
+                mergeDeclarations(declarations,CssStyles(existing).items())
+            styles=CssStyles()
+            styles._items=declarations
+            ret=styles.styleAttributeContents
+            if len(self._styleCache)>=self.MAX_CACHED_STYLES:
+                self._styleCache.clear()
+            self._styleCache[key]=ret
+        return ret
+
+    def inlineDocument(self,document:typing.Any)->int:
+        """
+        Inline styles into a parsed document (or element subtree),
+        modifying it in place
+
+        :return: how many elements were changed
+        """
+        context=MatchContext()
+        changed=0
+        for element in context.walk(document):
+            style=self.getStyleAttribute(element,context)
+            if style is not None:
+                setAttribute(element,'style',style)
+                changed+=1
+        return changed
+
+    def inline(self,document:DocumentCompatible)->DocumentCompatible:
+        """
+        Inline styles into a document
+
+        :param document: html text, or a parsed document (which
+            is modified in place)
+        :return: html text if given html text, otherwise the document
+        """
+        if isinstance(document,str):
+            from htmlTools import Html
+            parsed=Html(document)
+            self.inlineDocument(parsed)
+            return toHtmlString(parsed)
+        self.inlineDocument(document)
+        return document
+
+    def inlineMany(self,
+        documents:typing.Iterable[DocumentCompatible],
+        jobs:typing.Optional[int]=1
+        )->typing.List[DocumentCompatible]:
+        """
+        Inline styles into a batch of documents
+
+        :param jobs: how many documents to process in parallel
+            (None is the number of cpus).  Documents given as html
+            text are parsed and styled in worker processes, each of
+            which compiles the stylesheet only once.  Parsed
+            documents can't be sent to another process, so are
+            styled one after the other.
+        :return: the results, in the same order (see inline())
+        """
+        documents=list(documents)
+        if jobs is None:
+            jobs=os.cpu_count() or 1
+        jobs=min(jobs,len(documents))
+        if jobs>1 and all(isinstance(document,str) for document in documents):
+            # the workers need to end up with exactly the same rules
+            cssText=self.rules.getCssString()
+            executor=concurrent.futures.ProcessPoolExecutor(jobs,
+                initializer=_initWorker,initargs=(cssText,self.media))
+            with executor:
+                return list(executor.map(_workerInline,documents,
+                    chunksize=max(1,len(documents)//(jobs*4))))
+        return [self.inline(document) for document in documents]
+
+
+# the inliner of each worker process
+_workerInliner:typing.Optional[CssInliner]=None
+
+def _initWorker(cssText:str,media:typing.Optional[MediaContext])->None:
+    """
+    Compile the css once per worker process
+    """
+    global _workerInliner # pylint: disable=global-statement
+    _workerInliner=CssInliner(cssText,media)
+
+def _workerInline(document:str)->str:
+    """
+    Inline styles into one html document, in a worker process
+    """
+    assert _workerInliner is not None
+    return _workerInliner.inline(document)
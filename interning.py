@@ -0,0 +1,226 @@
+"""
+Share identical strings and declaration blocks between rules
+and between stylesheets
+
+Themed variants of a stylesheet, or the many sheets of a large
+site, repeat the same property names, values, selectors and whole
+declaration blocks over and over.  Parsing them through one
+CssInterner keeps a single copy of each:
+
+    interner=CssInterner()
+    sheets=[Css(filename,interner=interner) for filename in filenames]
+    print(formatMemoryReport(interner.getMemoryReport()))
+
+Declaration blocks are shared copy-on-write (see CssStyles.copy)
+so changing one rule's styles never affects another.  Selectors and
+media conditions are shared as-is, so should be replaced rather
+than modified in place.
+"""
+import typing
+import sys
+from .cssValues import CssValue
+from .mediaQueries import MediaQueryList
+from .cssStyles import CssStyles
+from .cssSelectors import CssSelector,CssSelectors,splitSelectorList
+if typing.TYPE_CHECKING:
+    from .rules import CssRule
+
+
+def _deepSize(obj:typing.Any,seen:typing.Optional[typing.Set[int]]=None)->int:
+    """
+    Estimate the memory used by an object and everything it holds
+    (not counting classes, which are shared anyway)
+    """
+    if seen is None:
+        seen=set()
+    if id(obj) in seen or obj is None or isinstance(obj,type):
+        return 0
+    seen.add(id(obj))
+    ret=sys.getsizeof(obj)
+    if isinstance(obj,dict):
+        for key,value in obj.items():
+            ret+=_deepSize(key,seen)+_deepSize(value,seen)
+    elif isinstance(obj,(list,tuple,set,frozenset)):
+        for item in obj:
+            ret+=_deepSize(item,seen)
+    elif not isinstance(obj,(str,bytes,int,float,bool)):
+        if hasattr(obj,'__dict__'):
+            # (instance dicts are mostly stored inline, so
+            # only count what they hold)
+            for value in vars(obj).values():
+                ret+=_deepSize(value,seen)
+        for slot in getattr(type(obj),'__slots__',()):
+            if hasattr(obj,slot):
+                ret+=_deepSize(getattr(obj,slot),seen)
+    return ret
+
+
+class InternStats(typing.NamedTuple):
+    """
+    How much sharing happened for one kind of thing
+
+    :param category: what was shared, eg "values"
+    :param requests: how many were asked for
+    :param unique: how many distinct ones were kept
+    :param savedBytes: estimated memory not used, compared
+        to every request having its own copy
+    """
+    category:str
+    requests:int
+    unique:int
+    savedBytes:int
+
+    @property
+    def shared(self)->int:
+        """
+        requests answered with an existing copy
+        """
+        return self.requests-self.unique
+
+
+class _InternTable:
+    """
+    {key:(shared object,estimated size)} plus counters
+    """
+
+    def __init__(self,
+        category:str,
+        sizeOf:typing.Callable[[typing.Any],int]=_deepSize):
+        self.category=category
+        self.sizeOf=sizeOf
+        self.entries:typing.Dict[typing.Any,typing.Tuple[typing.Any,int]]={}
+        self.requests=0
+        self.savedBytes=0
+
+    def get(self,
+        key:typing.Any,
+        create:typing.Callable[[],typing.Any]
+        )->typing.Any:
+        """
+        Get the shared object for a key, creating it if need be
+        """
+        self.requests+=1
+        entry=self.entries.get(key)
+        if entry is None:
+            obj=create()
+            entry=(obj,self.sizeOf(obj))
+            self.entries[key]=entry
+        else:
+            self.savedBytes+=entry[1]
+        return entry[0]
+
+    @property
+    def stats(self)->InternStats:
+        return InternStats(self.category,self.requests,len(self.entries),
+            self.savedBytes)
+
+
+class CssInterner:
+    """
+    Keeps one shared copy of each property name, value, selector,
+    media condition and declaration block it is asked for
+    """
+
+    def __init__(self,maxValueLength:int=64):
+        """
+        :param maxValueLength: only share values up to this long
+            (long values, like data: urls, rarely repeat)
+        """
+        self.maxValueLength=maxValueLength
+        self._names=_InternTable('names',sys.getsizeof)
+        self._values=_InternTable('values')
+        self._selectors=_InternTable('selectors')
+        self._media=_InternTable('media')
+        self._blocks=_InternTable('blocks')
+
+    def name(self,name:str)->str:
+        """
+        Get the shared copy of a property name
+        """
+        return self._names.get(name,lambda: sys.intern(name))
+
+    def value(self,value:str)->CssValue:
+        """
+        Get the shared copy of a property value
+
+        (Sharing also means its tokens are only parsed once.)
+        """
+        if len(value)>self.maxValueLength:
+            return value if isinstance(value,CssValue) else CssValue(value)
+        return self._values.get(value,lambda: CssValue(value))
+
+    def selector(self,selector:str)->CssSelector:
+        """
+        Get the shared, compiled copy of a single selector
+        """
+        selector=selector.strip()
+        return self._selectors.get(selector,lambda: CssSelector(selector))
+
+    def selectors(self,selectors:str)->CssSelectors:
+        """
+        Get a selector list made of shared selectors
+        (the list itself belongs to the caller)
+        """
+        return CssSelectors(
+            [self.selector(s) for s in splitSelectorList(selectors)])
+
+    def media(self,
+        levels:typing.Tuple[str,...]
+        )->typing.Optional[MediaQueryList]:
+        """
+        Get the shared copy of an @media condition
+        """
+        if not levels:
+            return None
+        return self._media.get(levels,lambda: MediaQueryList(levels))
+
+    def styles(self,block:str)->CssStyles:
+        """
+        Get the styles for the text of a declaration block
+
+        The declarations are shared with every other identical
+        block, until they are changed.
+        """
+        def create()->CssStyles:
+            parsed=CssStyles(block)
+            ret=CssStyles()
+            for name,value in parsed.items():
+                ret._items[self.name(name)]=self.value(value)
+            return ret
+        return self._blocks.get(block.strip(),create).copy()
+
+    def rule(self,
+        selectors:str,
+        block:str,
+        media:typing.Tuple[str,...]=()
+        )->'CssRule':
+        """
+        Create a rule out of shared parts
+        """
+        from .rules import CssRule
+        ret=CssRule(self.selectors(selectors),(),self.media(media))
+        ret._styles=self.styles(block)
+        return ret
+
+    def getMemoryReport(self)->typing.List[InternStats]:
+        """
+        How much was shared, and roughly how much memory that saved
+        """
+        return [table.stats for table in (self._names,self._values,
+            self._selectors,self._media,self._blocks)]
+
+
+def formatMemoryReport(report:typing.Iterable[InternStats])->str:
+    """
+    Format an interning memory report as a table
+    """
+    ret=['%-12s %10s %10s %10s %12s'%(
+        'category','requests','unique','shared','saved')]
+    totalSaved=0
+    for stats in report:
+        ret.append('%-12s %10d %10d %10d %10.1fKB'%(stats.category,
+            stats.requests,stats.unique,stats.shared,stats.savedBytes/1024))
+        totalSaved+=stats.savedBytes
+    ret.append('%-12s %10s %10s %10s %10.1fKB'%(
+        'total','','','',totalSaved/1024))
+    return '\n'.join(ret)
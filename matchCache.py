@@ -0,0 +1,226 @@
+"""
+Cache the rules matched by (and styles computed for) elements
+
+Elements are keyed by a signature of everything about them that
+the selectors in a stylesheet can actually look at: tag, id,
+classes, the attributes that appear in [attribute] selectors or
+are read by pseudo-classes like :lang(), and the signature of the
+parent (recursively).  Sibling positions and
+previous siblings are only included if some selector uses them.
+
+Two elements with the same signature must match the same rules, so
+templated pages that repeat the same structure get many hits, and
+an element that is modified simply gets a new signature.  Whenever
+the rules change, the cache is cleared.
+"""
+import typing
+import re
+from collections import OrderedDict
+from .htmlTypes import HtmlElementLike,getTagName,getAttribute,getParent, \
+    getPreviousSiblings,isEmpty
+from .matchContext import MatchContext,getSiblingIndex
+from .mediaQueries import MediaContext
+from .cssStyles import CssStyles
+if typing.TYPE_CHECKING:
+    from .rules import CssRule,CssRules
+
+
+ATTRIBUTE_NAME_RE=re.compile(r'\[\s*([-_a-zA-Z0-9:]+)')
+PSEUDO_CLASS_NAME_RE=re.compile(r':([-_a-zA-Z0-9]+)')
+# {pseudo-class:the attributes it reads}
+PSEUDO_CLASS_ATTRIBUTES:typing.Dict[str,typing.Tuple[str,...]]={
+    'lang':('lang',),
+}
+STRUCTURAL_PSEUDO_RE=re.compile(r':(?:nth-|first-|last-|only-|not\()',
+    re.IGNORECASE)
+EMPTY_PSEUDO_RE=re.compile(r':empty\b',re.IGNORECASE)
+SIBLING_COMBINATOR_RE=re.compile(r'[+~](?![^\[]*\])|:not\(',re.IGNORECASE)
+
+ElementSignature=typing.Tuple[typing.Any,...]
+
+
+class MatchCacheStats(typing.NamedTuple):
+    """
+    How well the match cache is doing
+
+    :param hits: lookups answered from the cache
+    :param misses: lookups that had to match every rule
+    :param evictions: entries thrown out to stay under maxSize
+    :param size: entries currently cached
+    :param maxSize: the most entries that will be kept
+    """
+    hits:int
+    misses:int
+    evictions:int
+    size:int
+    maxSize:int
+
+    @property
+    def hitRate(self)->float:
+        """
+        Fraction of lookups that were hits
+        """
+        lookups=self.hits+self.misses
+        if not lookups:
+            return 0.0
+        return self.hits/lookups
+
+
+class MatchCache:
+    """
+    A bounded, least-recently-used cache of the rules
+    that match each element signature
+    """
+
+    def __init__(self,rules:'CssRules',maxSize:int=1024):
+        """
+        :param rules: the rules to match against
+        :param maxSize: the most element signatures to remember
+        """
+        if maxSize<1:
+            raise ValueError('maxSize must be at least 1, got %d'%maxSize)
+        self.rules=rules
+        self.maxSize=maxSize
+        self.hits=0
+        self.misses=0
+        self.evictions=0
+        # {(signature,media):(matching rules,combined styles)}
+        self._entries:typing.OrderedDict[typing.Any,
+            typing.Tuple[typing.List['CssRule'],CssStyles]]=OrderedDict()
+        # what the selectors look at (None until worked out)
+        self._attributeNames:typing.Optional[typing.Tuple[str,...]]=None
+        self._usesPositions=False
+        self._usesPreviousSiblings=False
+        self._usesEmpty=False
+
+    def clear(self)->None:
+        """
+        Forget everything (call whenever the rules change)
+        """
+        self._entries.clear()
+        self._attributeNames=None
+
+    def _analyzeRules(self)->None:
+        """
+        Work out which parts of an element the selectors look at
+        """
+        attributeNames:typing.Set[str]=set()
+        self._usesPositions=False
+        self._usesPreviousSiblings=False
+        self._usesEmpty=False
+        for rule in self.rules:
+            for selector in rule.selectors:
+                selectorString=str(selector)
+                attributeNames.update(
+                    ATTRIBUTE_NAME_RE.findall(selectorString))
+                for name in PSEUDO_CLASS_NAME_RE.findall(selectorString):
+                    attributeNames.update(
+                        PSEUDO_CLASS_ATTRIBUTES.get(name.lower(),()))
+                if STRUCTURAL_PSEUDO_RE.search(selectorString) is not None:
+                    self._usesPositions=True
+                if SIBLING_COMBINATOR_RE.search(selectorString) is not None:
+                    self._usesPositions=True
+                    self._usesPreviousSiblings=True
+                if EMPTY_PSEUDO_RE.search(selectorString) is not None:
+                    self._usesEmpty=True
+        self._attributeNames=tuple(sorted(attributeNames))
+
+    def _localSignature(self,element:HtmlElementLike)->ElementSignature:
+        """
+        The signature of an element on its own
+        """
+        assert self._attributeNames is not None
+        classes=getAttribute(element,'class')
+        ret=(getTagName(element).lower(),
+            getAttribute(element,'id'),
+            () if not classes else tuple(sorted(set(classes.split()))),
+            tuple(getAttribute(element,name) for name in self._attributeNames))
+        if self._usesEmpty:
+            ret+=(isEmpty(element),)
+        return ret
+
+    def signature(self,element:HtmlElementLike)->ElementSignature:
+        """
+        Get the signature of an element, which includes its ancestors
+
+        Elements with the same signature always match the same rules.
+        """
+        if self._attributeNames is None:
+            self._analyzeRules()
+        parts:typing.List[typing.Any]=[]
+        current:typing.Optional[HtmlElementLike]=element
+        while current is not None:
+            parts.append(self._localSignature(current))
+            if self._usesPositions:
+                parts.append(getSiblingIndex(current))
+            if self._usesPreviousSiblings:
+                parts.append(tuple(self._localSignature(sibling)
+                    for sibling in getPreviousSiblings(current)))
+            current=getParent(current)
+        return tuple(parts)
+
+    def _lookup(self,
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext],
+        media:typing.Optional[MediaContext]
+        )->typing.Tuple[typing.List['CssRule'],CssStyles]:
+        """
+        Get the (matching rules,combined styles) for an element
+        """
+        key=(self.signature(element),media)
+        entry=self._entries.get(key)
+        if entry is not None:
+            self.hits+=1
+            self._entries.move_to_end(key)
+            return entry
+        self.misses+=1
+        matched=[rule for rule in self.rules.getRulesForMedia(media)
+            if rule.matches(element,context)]
+        entry=(matched,CssStyles([rule.styles for rule in matched]))
+        self._entries[key]=entry
+        if len(self._entries)>self.maxSize:
+            self._entries.popitem(last=False)
+            self.evictions+=1
+        return entry
+
+    def getRulesForElement(self,
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]=None,
+        media:typing.Optional[MediaContext]=None
+        )->typing.List['CssRule']:
+        """
+        Get all rules that apply to an element, in source order
+        """
+        return list(self._lookup(element,context,media)[0])
+
+    def getStyles(self,
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]=None,
+        media:typing.Optional[MediaContext]=None
+        )->CssStyles:
+        """
+        Get the combined styles for an element
+
+        :return: a new CssStyles, which the caller is free to modify
+        """
+        return CssStyles(self._lookup(element,context,media)[1])
+
+    def invalidateElement(self,element:HtmlElementLike)->None:
+        """
+        Forget what was cached for an element as it is now
+
+        Changing an element's tag, id, classes or relevant attributes
+        already gives it a new signature, so this is only needed
+        after changes the signature cannot see.
+        """
+        signature=self.signature(element)
+        for key in [key for key in self._entries if key[0]==signature]:
+            del self._entries[key]
+
+    @property
+    def stats(self)->MatchCacheStats:
+        """
+        Hit/miss statistics
+        """
+        return MatchCacheStats(self.hits,self.misses,self.evictions,
+            len(self._entries),self.maxSize)
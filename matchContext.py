@@ -0,0 +1,212 @@
+"""
+State that is shared by all selector tests during a
+single traversal of a document.
+
+When computing the styles of a whole document, each element
+is tested against every selector.  Anything that can be
+worked out once per traversal (rather than once per test)
+lives here.
+"""
+import typing
+from .htmlTypes import HtmlElementLike,getTagName,getAttribute,\
+    getRootElement,getParent,getAncestors,getChildElements
+
+
+# (position,siblingCount,typePosition,typeCount) positions are 1-based
+SiblingIndex=typing.Tuple[int,int,int,int]
+
+
+def bloomHash(key:str)->int:
+    """
+    The hash used for ancestor bloom filter keys.
+
+    Keys look like:
+        tag - tag name, lowercase
+        #id - element id
+        .class - a single class name
+    """
+    return hash(key)
+
+
+def elementBloomHashes(element:HtmlElementLike)->typing.List[int]:
+    """
+    All of the bloom filter hashes for a given element
+    (its tag, id, and each of its classes)
+    """
+    ret=[bloomHash(getTagName(element).lower())]
+    elementId=getAttribute(element,'id')
+    if elementId:
+        ret.append(bloomHash('#'+elementId))
+    classes=getAttribute(element,'class')
+    if classes:
+        for cssClass in classes.split():
+            ret.append(bloomHash('.'+cssClass))
+    return ret
+
+
+def computeSiblingIndexes(element:HtmlElementLike
+    )->typing.Dict[HtmlElementLike,SiblingIndex]:
+    """
+    Compute the sibling indexes of an element and all of its
+    siblings in one pass over their parent.
+
+    :return: {element:(position,siblingCount,typePosition,typeCount)}
+    """
+    parent=getParent(element)
+    if parent is None:
+        return {element:(1,1,1,1)}
+    siblings=list(getChildElements(parent))
+    tagNames=[getTagName(sibling).lower() for sibling in siblings]
+    typeCounts:typing.Dict[str,int]={}
+    typePositions:typing.List[int]=[]
+    for tagName in tagNames:
+        typeCounts[tagName]=typeCounts.get(tagName,0)+1
+        typePositions.append(typeCounts[tagName])
+    siblingCount=len(siblings)
+    ret:typing.Dict[HtmlElementLike,SiblingIndex]={}
+    for i,sibling in enumerate(siblings):
+        ret[sibling]=(i+1,siblingCount,
+            typePositions[i],typeCounts[tagNames[i]])
+    return ret
+
+
+def getSiblingIndex(element:HtmlElementLike)->SiblingIndex:
+    """
+    Compute the sibling index of a single element, without
+    any caching.  (Use MatchContext.siblingIndex() when testing
+    many elements.)
+
+    :return: (position,siblingCount,typePosition,typeCount)
+    """
+    return computeSiblingIndexes(element)[element]
+
+
+class AncestorFilter:
+    """
+    A counting bloom filter of the tag/id/class hashes of
+    all ancestors of the element currently being matched.
+
+    This lets a selector like ".a .b .c" be rejected in O(1)
+    when there is no ".a" or ".b" anywhere above the element,
+    without walking the ancestors at all.
+
+    False positives are possible (and simply fall back to
+    walking the ancestors), false negatives are not.
+    """
+
+    SIZE_BITS=12
+    SIZE=1<<SIZE_BITS
+    MASK=SIZE-1
+
+    def __init__(self):
+        self._counts:typing.List[int]=[0]*self.SIZE
+        self._pushed:typing.List[typing.List[int]]=[]
+
+    def _slots(self,hashValue:int)->typing.Tuple[int,int]:
+        """
+        The two filter slots for a given hash
+        """
+        return (hashValue&self.MASK,(hashValue>>self.SIZE_BITS)&self.MASK)
+
+    def push(self,element:HtmlElementLike)->None:
+        """
+        Add an element to the filter as we descend into it
+        """
+        hashes=elementBloomHashes(element)
+        for hashValue in hashes:
+            slot1,slot2=self._slots(hashValue)
+            self._counts[slot1]+=1
+            self._counts[slot2]+=1
+        self._pushed.append(hashes)
+
+    def pop(self)->None:
+        """
+        Remove the most recently pushed element from the filter
+        as we ascend back out of it
+        """
+        for hashValue in self._pushed.pop():
+            slot1,slot2=self._slots(hashValue)
+            self._counts[slot1]-=1
+            self._counts[slot2]-=1
+
+    def mightContain(self,hashValue:int)->bool:
+        """
+        Whether some ancestor might have the given hash.
+
+        If this returns False, no ancestor has it for sure.
+        """
+        slot1,slot2=self._slots(hashValue)
+        return self._counts[slot1]>0 and self._counts[slot2]>0
+
+    def mightContainAll(self,hashValues:typing.Iterable[int])->bool:
+        """
+        Whether ancestors might satisfy all of the given hashes.
+
+        If this returns False, no ancestor chain can for sure.
+        """
+        for hashValue in hashValues:
+            if not self.mightContain(hashValue):
+                return False
+        return True
+
+    def __len__(self)->int:
+        return len(self._pushed)
+
+
+class MatchContext:
+    """
+    State that is shared by all selector tests during a
+    single traversal of a document.
+
+    Use walk() to traverse the document.  While an element
+    from walk() is being processed, ancestorFilter holds
+    exactly that element's ancestors.
+
+    Sibling positions (for :nth-child() and friends) are
+    computed once per parent and reused by every selector test.
+    """
+
+    def __init__(self):
+        self.ancestorFilter:typing.Optional[AncestorFilter]=None
+        self._siblingIndexes:typing.Dict[HtmlElementLike,SiblingIndex]={}
+
+    def siblingIndex(self,element:HtmlElementLike)->SiblingIndex:
+        """
+        The position of this element amongst its siblings
+
+        :return: (position,siblingCount,typePosition,typeCount)
+        """
+        ret=self._siblingIndexes.get(element)
+        if ret is None:
+            self._siblingIndexes.update(computeSiblingIndexes(element))
+            ret=self._siblingIndexes[element]
+        return ret
+
+    def walk(self,root:typing.Any)->typing.Iterator[HtmlElementLike]:
+        """
+        Walk all elements of a document (or element subtree)
+        in document order, keeping the ancestor filter up to date.
+
+        :param root: a document or element to start from
+        """
+        root=getRootElement(root)
+        self._siblingIndexes={}
+        ancestorFilter=AncestorFilter()
+        for ancestor in reversed(list(getAncestors(root))):
+            ancestorFilter.push(ancestor)
+        self.ancestorFilter=ancestorFilter
+        try:
+            yield root
+            ancestorFilter.push(root)
+            stack=[iter(getChildElements(root))]
+            while stack:
+                child=next(stack[-1],None)
+                if child is None:
+                    stack.pop()
+                    ancestorFilter.pop()
+                    continue
+                yield child
+                ancestorFilter.push(child)
+                stack.append(iter(getChildElements(child)))
+        finally:
+            self.ancestorFilter=None
@@ -0,0 +1,372 @@
+"""
+Decode and evaluate @media queries
+
+Queries are compiled, when parsed, into a list of checks
+that are run against a MediaContext describing the
+viewport (width, height, type, resolution).
+"""
+import typing
+import re
+
+
+class MediaContext(typing.NamedTuple):
+    """
+    The environment that media queries are evaluated against.
+
+    Being a tuple, it is hashable, so can be used as a cache key.
+
+    :param width: viewport width in css px
+    :param height: viewport height in css px
+    :param type: media type, eg "screen" or "print"
+    :param resolution: in dpi (css px are 96dpi)
+    """
+    width:float=1024
+    height:float=768
+    type:str='screen'
+    resolution:float=96
+
+    @property
+    def orientation(self)->str:
+        """
+        "portrait" or "landscape"
+        """
+        if self.height>=self.width:
+            return 'portrait'
+        return 'landscape'
+
+    @property
+    def aspectRatio(self)->float:
+        """
+        width/height
+        """
+        if not self.height:
+            return 0.0
+        return self.width/self.height
+
+# some handy starting points
+MOBILE=MediaContext(375,667,'screen',192)
+TABLET=MediaContext(768,1024,'screen',192)
+DESKTOP=MediaContext(1440,900,'screen',96)
+PRINT=MediaContext(816,1056,'print',300)
+
+MediaQueryListCompatible=typing.Union[str,'MediaQueryList']
+MediaCheck=typing.Callable[[MediaContext],bool]
+
+# to css px (relative units are relative to the initial font,
+# and ex and ch use the spec's fallback of .5em)
+LENGTH_UNITS={'px':1.0,'em':16.0,'rem':16.0,'ex':8.0,'ch':8.0,
+    'in':96.0,'cm':96.0/2.54,'mm':96.0/25.4,'q':96.0/101.6,
+    'pt':96.0/72.0,'pc':16.0}
+# to dpi
+RESOLUTION_UNITS={'dpi':1.0,'dpcm':2.54,'dppx':96.0,'x':96.0}
+MEDIA_TYPES=('all','screen','print','speech')
+
+
+def _parseMediaValue(value:str)->typing.Union[None,float,str]:
+    """
+    Convert a media feature value into a number in
+    standard units (css px, dpi, or a ratio), or leave
+    keywords as lowercase strings
+
+    :return: the value, or None if it can't be understood
+        (eg, it has an unknown unit)
+    """
+    value=value.strip().lower()
+    if '/' in value:
+        numerator,denominator=value.split('/',1)
+        try:
+            return float(numerator)/float(denominator)
+        except (ValueError,ZeroDivisionError):
+            return None
+    m=re.match(r'^([-+]?[0-9]*\.?[0-9]+)([a-z]*)$',value)
+    if m is None:
+        if re.match(r'^[a-z][-a-z0-9]*$',value) is None:
+            return None
+        return value
+    number=float(m.group(1))
+    unit=m.group(2)
+    if not unit:
+        return number
+    if unit in LENGTH_UNITS:
+        return number*LENGTH_UNITS[unit]
+    if unit in RESOLUTION_UNITS:
+        return number*RESOLUTION_UNITS[unit]
+    return None
+
+
+# features whose values are keywords rather than numbers
+KEYWORD_FEATURES=('orientation',)
+
+def _getFeature(name:str
+    )->typing.Optional[typing.Callable[[MediaContext],typing.Any]]:
+    """
+    Get a function to retrieve a media feature from a context
+    """
+    if name.startswith('device-'):
+        name=name[7:]
+    if name=='width':
+        return lambda context: context.width
+    if name=='height':
+        return lambda context: context.height
+    if name=='resolution':
+        return lambda context: context.resolution
+    if name=='aspect-ratio':
+        return lambda context: context.aspectRatio
+    if name=='orientation':
+        return lambda context: context.orientation
+    return None
+
+
+def _never(context:MediaContext)->bool:
+    """
+    A check for things that can never match (unknown features, etc)
+    """
+    _=context
+    return False
+
+
+RANGE_OPERATORS:typing.Dict[str,
+    typing.Callable[[typing.Any,typing.Any],bool]]={
+    '<':lambda a,b: a<b,
+    '<=':lambda a,b: a<=b,
+    '>':lambda a,b: a>b,
+    '>=':lambda a,b: a>=b,
+    '=':lambda a,b: a==b}
+FLIPPED_OPERATORS={'<':'>','<=':'>=','>':'<','>=':'<=','=':'='}
+RANGE_RE=re.compile(r'\s*(<=|>=|<|>|=)\s*')
+
+def compileMediaFeature(feature:str)->MediaCheck:
+    """
+    Compile the inside of a media feature like
+        min-width: 600px
+        orientation: landscape
+        width >= 600px
+        400px < width <= 800px
+    into a check function
+
+    Unknown features never match, and values that can't be
+    understood (eg, an unknown unit) raise a ValueError.
+    """
+    feature=feature.strip().lower()
+    if ':' in feature:
+        name,value=[x.strip() for x in feature.split(':',1)]
+        operator='='
+        if name.startswith('min-'):
+            name=name[4:]
+            operator='>='
+        elif name.startswith('max-'):
+            name=name[4:]
+            operator='<='
+        parts=[name,operator,value]
+    else:
+        parts=RANGE_RE.split(feature)
+    if len(parts)==1:
+        # eg (color) ... boolean context
+        getter=_getFeature(parts[0])
+        if getter is None:
+            return _never
+        return lambda context: bool(getter(context))
+    checks:typing.List[MediaCheck]=[]
+    for i in range(0,len(parts)-2,2):
+        left,operator,right=parts[i],parts[i+1],parts[i+2]
+        if _getFeature(left) is None:
+            # value on the left, so flip it around
+            left,right=right,left
+            operator=FLIPPED_OPERATORS[operator]
+        getter=_getFeature(left)
+        if getter is None:
+            return _never
+        value=_parseMediaValue(right)
+        if value is None \
+            or isinstance(value,str)!=left.endswith(KEYWORD_FEATURES):
+            # eg an unknown unit, or (width:landscape)
+            raise ValueError('Unable to evaluate media feature "%s"'%feature)
+        checks.append(_compileComparison(getter,RANGE_OPERATORS[operator],
+            value))
+    if len(checks)==1:
+        return checks[0]
+    return lambda context: all(check(context) for check in checks)
+
+
+def compileMediaCondition(condition:str)->MediaCheck:
+    """
+    Compile media features that are all joined by "and", or all
+    joined by "or", like
+        (min-width: 600px) and (orientation: landscape)
+    into a check function
+
+    Anything else (eg, nested conditions) raises a ValueError.
+    """
+    condition=condition.strip()
+    if not condition.startswith('(') or not condition.endswith(')'):
+        raise ValueError('Unable to parse media condition "%s"'%condition)
+    combine=all
+    features=re.split(r'\)\s*and\s*\(',condition[1:-1],flags=re.IGNORECASE)
+    if len(features)==1:
+        features=re.split(r'\)\s*or\s*\(',condition[1:-1],
+            flags=re.IGNORECASE)
+        combine=any
+    checks:typing.List[MediaCheck]=[]
+    for feature in features:
+        if '(' in feature or ')' in feature:
+            raise ValueError('Unable to parse media condition "%s"'%condition)
+        checks.append(compileMediaFeature(feature))
+    if len(checks)==1:
+        return checks[0]
+    return lambda context: combine(check(context) for check in checks)
+
+
+def _compileComparison(
+    getter:typing.Callable[[MediaContext],typing.Any],
+    operator:typing.Callable[[typing.Any,typing.Any],bool],
+    value:typing.Any
+    )->MediaCheck:
+    """
+    Bind a single feature comparison into a check
+    """
+    return lambda context: operator(getter(context),value)
+
+
+class MediaQuery:
+    """
+    A single media query, like
+        not screen and (min-width:600px)
+    """
+
+    QUERY_RE=re.compile(r"""
+        ^\s*(?:(?P<modifier>not|only)\s+)?
+        (?P<type>[a-z]+)?\s*
+        (?:and\s*)?(?P<features>\(.*\))?\s*$
+        """,re.IGNORECASE|re.DOTALL|re.VERBOSE)
+
+    def __init__(self,query:str):
+        self._queryString=query.strip()
+        self._negated=False
+        self._mediaType='all'
+        self._checks:typing.List[MediaCheck]=[]
+        self.assign(query)
+
+    def assign(self,query:str)->None:
+        """
+        Assign the value of this query
+        """
+        self._queryString=query.strip()
+        self._checks=[]
+        m=self.QUERY_RE.match(self._queryString)
+        if m is None:
+            # per spec, an unparseable query becomes "not all"
+            self._negated=False
+            self._checks.append(_never)
+            return
+        self._negated=(m.group('modifier') or '').lower()=='not'
+        self._mediaType=(m.group('type') or 'all').lower()
+        if self._mediaType not in MEDIA_TYPES:
+            self._checks.append(_never)
+        features=m.group('features')
+        if features:
+            try:
+                self._checks.append(compileMediaCondition(features))
+            except ValueError:
+                # a query that can't be understood becomes "not all"
+                self._negated=False
+                self._checks=[_never]
+
+    def matches(self,context:MediaContext)->bool:
+        """
+        Whether this query applies to the given context
+        """
+        ret=self._mediaType in ('all',context.type)
+        if ret:
+            for check in self._checks:
+                if not check(context):
+                    ret=False
+                    break
+        return ret!=self._negated
+
+    def __repr__(self)->str:
+        return self._queryString
+
+
+class MediaQueryList:
+    """
+    The condition on an @media block.
+
+    This is a comma-separated list of queries, any of which may
+    match.  When @media blocks are nested, each level must match.
+    """
+
+    def __init__(self,
+        media:typing.Union[None,MediaQueryListCompatible,
+            typing.Iterable[MediaQueryListCompatible]]=None):
+        """ """
+        self._levels:typing.List[typing.Tuple[str,typing.List[MediaQuery]]]=[]
+        if media is not None:
+            self.addLevel(media)
+
+    def addLevel(self,
+        media:typing.Union[MediaQueryListCompatible,
+            typing.Iterable[MediaQueryListCompatible]]
+        )->None:
+        """
+        Add a nested level of @media condition
+        """
+        if isinstance(media,MediaQueryList):
+            self._levels.extend(media._levels)
+        elif isinstance(media,str):
+            media=' '.join(media.split())
+            queries=[MediaQuery(query) for query in media.split(',')]
+            self._levels.append((media,queries))
+        else:
+            for level in media:
+                self.addLevel(level)
+
+    def nested(self,media:MediaQueryListCompatible)->'MediaQueryList':
+        """
+        Get a new list for an @media block nested inside this one
+        """
+        return MediaQueryList((self,media))
+
+    @property
+    def levels(self)->typing.Tuple[str,...]:
+        """
+        The text of each nested level of @media condition,
+        outermost first
+        """
+        return tuple(level[0] for level in self._levels)
+
+    def matches(self,context:MediaContext)->bool:
+        """
+        Whether this media condition applies to the given context
+        """
+        for _,queries in self._levels:
+            for query in queries:
+                if query.matches(context):
+                    break
+            else:
+                return False
+        return True
+
+    def __eq__(self,other:typing.Any)->bool:
+        if isinstance(other,str):
+            other=MediaQueryList(other)
+        if not isinstance(other,MediaQueryList):
+            return False
+        return self.levels==other.levels
+
+    def __hash__(self)->int:
+        return hash(self.levels)
+
+    def __repr__(self)->str:
+        return ' and '.join(self.levels)
+
+
+def asMediaQueryList(media:typing.Optional[MediaQueryListCompatible]
+    )->typing.Optional[MediaQueryList]:
+    """
+    Always returns a MediaQueryList (or None if media is None)
+    if media is already a MediaQueryList object,
+        returns unchanged
+    """
+    if media is None or isinstance(media,MediaQueryList):
+        return media
+    return MediaQueryList(media)
@@ -0,0 +1,675 @@
+"""
+Minify css
+
+The minifier is a pipeline of passes.  Value-level passes (colors,
+zero units, numbers) all run during a single traversal of the
+declarations, operating on the typed tokens of each value, and
+then rule-level passes (duplicate declarations, empty rules,
+merging adjacent rules) each run once over the rule list.
+
+Passes can be added by subclassing MinifyPass and registering
+them in MINIFY_PASSES (or by passing instances to minify()).
+"""
+import typing
+import time
+import re
+from .cssValues import CssValue,CssToken,CssColor,CssKeyword,CssLength,\
+    CssNumber,CssPercentage,CssSeparator,NAMED_COLORS,formatNumber,asCssValue
+from .cssSelectors import splitCombinators
+from .shorthands import collapseShorthands,SHORTHANDS
+from .compressionOrder import compressionOrderIndexes,canonicalDeclarationOrder
+from .sourceMaps import SourceMap
+if typing.TYPE_CHECKING:
+    from .rules import CssRule,CssRules
+
+
+Timings=typing.Dict[str,float]
+
+
+class MinifyPass:
+    """
+    A single step of the minification pipeline.
+
+    Override minifyTokens() for a value-level pass, or
+    minifyRules() for a rule-level pass.
+    """
+
+    name='pass'
+    minifiesValues=False
+    minifiesRules=False
+
+    def minifyTokens(self,
+        propertyName:str,
+        tokens:typing.Tuple[CssToken,...]
+        )->typing.Tuple[CssToken,...]:
+        """
+        Minify the tokens of a single declaration value
+
+        :return: the same tuple if nothing was changed, else a new one
+        """
+        _=propertyName
+        return tokens
+
+    def minifyRules(self,rules:'CssRules')->None:
+        """
+        Minify the rule list in-place
+        """
+        _=rules
+
+
+# {color:shortest text} for named colors that are shorter than their hex
+SHORT_COLOR_NAMES:typing.Dict[int,str]={}
+for _name,_rgb in NAMED_COLORS.items():
+    _rgba=(_rgb<<8)|0xff
+    _shortest=SHORT_COLOR_NAMES.get(_rgba)
+    if _shortest is None or len(_name)<len(_shortest):
+        SHORT_COLOR_NAMES[_rgba]=_name
+
+
+def _shortestAlpha(alpha:int)->str:
+    """
+    The shortest 0..1 number that means the same 0..255 alpha
+    """
+    for digits in (1,2):
+        ret=trimNumber(round(alpha/255,digits))
+        if round(float(ret)*255)==alpha:
+            return ret
+    return trimNumber(round(alpha/255,3))
+
+
+def shortestColor(color:CssColor)->str:
+    """
+    The shortest way to write a color
+
+    Colors that are not opaque are not written as 4 or 8 digit hex,
+    since older browsers do not understand it.
+    """
+    rgba=color.rgba
+    if color.a!=0xff:
+        if rgba==0:
+            return 'transparent'
+        return 'rgba(%d,%d,%d,%s)'%(color.r,color.g,color.b,
+            _shortestAlpha(color.a))
+    hexDigits='%06x'%(rgba>>8)
+    if all(hexDigits[i]==hexDigits[i+1] for i in range(0,len(hexDigits),2)):
+        hexDigits=hexDigits[::2]
+    ret='#'+hexDigits
+    name=SHORT_COLOR_NAMES.get(rgba)
+    if name is not None and len(name)<len(ret):
+        ret=name
+    return ret
+
+
+def trimNumber(value:float)->str:
+    """
+    Format a number as briefly as possible, eg 0.50 -> .5
+    """
+    ret=formatNumber(value)
+    if ret.startswith('0.'):
+        ret=ret[1:]
+    elif ret.startswith('-0.'):
+        ret='-'+ret[2:]
+    return ret
+
+
+# properties whose values are (or include) colors
+COLOR_PROPERTIES=frozenset((
+    'color','background','background-color','border','border-color',
+    'border-top','border-right','border-bottom','border-left',
+    'border-top-color','border-right-color','border-bottom-color',
+    'border-left-color','border-block','border-block-color',
+    'border-block-start','border-block-end','border-block-start-color',
+    'border-block-end-color','border-inline','border-inline-color',
+    'border-inline-start','border-inline-end','border-inline-start-color',
+    'border-inline-end-color','outline','outline-color','box-shadow',
+    'text-shadow','text-decoration','text-decoration-color',
+    'text-emphasis','text-emphasis-color','column-rule',
+    'column-rule-color','caret-color','accent-color','scrollbar-color',
+    'fill','stroke','stop-color','flood-color','lighting-color'))
+
+# properties whose values are names, or otherwise not safe to rewrite
+VERBATIM_PROPERTIES=frozenset((
+    'font-family','animation-name','unicode-range','src'))
+
+def isVerbatimProperty(propertyName:str)->bool:
+    """
+    Whether a property's value must never be rewritten
+
+    This includes custom properties (--*), since there is no
+    telling how they will be used, eg --gap:0px may end up in
+    calc(var(--gap) + 5px) where a unitless 0 is invalid.
+    """
+    return propertyName.startswith('--') \
+        or propertyName in VERBATIM_PROPERTIES
+
+
+class ShortestColors(MinifyPass):
+    """
+    Write every color in its shortest form, eg
+        #FF0000 -> red
+        rgb(255,255,255) -> #fff
+
+    Only in COLOR_PROPERTIES, since elsewhere a color name may
+    just be a name, eg font-family:Black Ops One
+    """
+
+    name='colors'
+    minifiesValues=True
+
+    def minifyTokens(self,
+        propertyName:str,
+        tokens:typing.Tuple[CssToken,...]
+        )->typing.Tuple[CssToken,...]:
+        if propertyName not in COLOR_PROPERTIES \
+            or not any(isinstance(token,CssColor) for token in tokens):
+            return tokens
+        return tuple(CssKeyword(shortestColor(token))
+            if isinstance(token,CssColor) else token for token in tokens)
+
+
+ZERO_STRIPPABLE_UNITS=('px','em','rem','ex','ch','vw','vh','vmin','vmax',
+    'cm','mm','q','in','pt','pc')
+ZERO_UNIT_UNSAFE_PROPERTIES=('flex','flex-basis')
+
+
+def _isStrippableZero(token:CssToken)->bool:
+    """
+    Whether a token is a zero length that does not need its unit
+    """
+    return isinstance(token,CssLength) and token.value==0 \
+        and token.unit in ZERO_STRIPPABLE_UNITS
+
+
+class StripZeroUnits(MinifyPass):
+    """
+    Lengths of zero do not need a unit, eg 0px -> 0
+
+    (times, angles and percentages are left alone since
+    a unitless zero is not always valid for them)
+    """
+
+    name='zeroUnits'
+    minifiesValues=True
+
+    def minifyTokens(self,
+        propertyName:str,
+        tokens:typing.Tuple[CssToken,...]
+        )->typing.Tuple[CssToken,...]:
+        if propertyName in ZERO_UNIT_UNSAFE_PROPERTIES \
+            or isVerbatimProperty(propertyName):
+            return tokens
+        if not any(_isStrippableZero(token) for token in tokens):
+            return tokens
+        return tuple(CssNumber(0) if _isStrippableZero(token) else token
+            for token in tokens)
+
+
+class TrimNumbers(MinifyPass):
+    """
+    Write numbers as briefly as possible, eg 0.50em -> .5em
+    """
+
+    name='numbers'
+    minifiesValues=True
+
+    def minifyTokens(self,
+        propertyName:str,
+        tokens:typing.Tuple[CssToken,...]
+        )->typing.Tuple[CssToken,...]:
+        if isVerbatimProperty(propertyName) or not any(
+            isinstance(token,(CssNumber,CssLength,CssPercentage))
+            for token in tokens):
+            return tokens
+        ret:typing.List[CssToken]=[]
+        for token in tokens:
+            if isinstance(token,CssNumber):
+                token=CssKeyword(trimNumber(token.value))
+            elif isinstance(token,CssLength):
+                token=CssKeyword(trimNumber(token.value)+token.unit)
+            elif isinstance(token,CssPercentage):
+                token=CssKeyword(trimNumber(token.value)+'%')
+            ret.append(token)
+        return tuple(ret)
+
+
+BOX_SHORTHANDS=('margin','padding',
+    'border-width','border-style','border-color',
+    'inset','scroll-margin','scroll-padding')
+
+class ShortenBoxShorthands(MinifyPass):
+    """
+    Drop repeated sides from box shorthands, eg
+        margin:0 1px 0 1px -> margin:0 1px
+    """
+
+    name='boxShorthands'
+    minifiesValues=True
+
+    def minifyTokens(self,
+        propertyName:str,
+        tokens:typing.Tuple[CssToken,...]
+        )->typing.Tuple[CssToken,...]:
+        if propertyName not in BOX_SHORTHANDS or not 2<=len(tokens)<=4 \
+            or any(isinstance(token,CssSeparator) for token in tokens):
+            return tokens
+        sides=list(tokens)
+        if len(sides)==4 and sides[3]==sides[1]:
+            sides.pop()
+        if len(sides)==3 and sides[2]==sides[0]:
+            sides.pop()
+        if len(sides)==2 and sides[1]==sides[0]:
+            sides.pop()
+        if len(sides)==len(tokens):
+            return tokens
+        return tuple(sides)
+
+
+def _ruleKey(rule:typing.Any
+    )->typing.Tuple[typing.Tuple[str,...],typing.Tuple[str,...]]:
+    """
+    Rules with the same key have the same selectors and media
+
+    (Not for at-rules, which all look alike, eg two @font-face.)
+    """
+    media=() if rule.media is None else rule.media.levels
+    selectors=tuple(minifySelector(str(selector))
+        for selector in rule.selectors)
+    return (selectors,media)
+
+
+class RemoveDuplicateDeclarations(MinifyPass):
+    """
+    Remove declarations that are always overridden by a later
+    rule with the same selectors and media, eg
+        a{color:red;margin:0} ... a{color:blue}
+    becomes
+        a{margin:0} ... a{color:blue}
+    """
+
+    name='duplicateDeclarations'
+    minifiesRules=True
+
+    def minifyRules(self,rules:'CssRules')->None:
+        # {rule key:{property:important}} for later rules
+        seen:typing.Dict[typing.Any,typing.Dict[str,bool]]={}
+        for rule in reversed(list(rules)):
+            if rule.isAtRule:
+                continue
+            key=_ruleKey(rule)
+            overridden=seen.get(key)
+            if overridden is None:
+                overridden={}
+                seen[key]=overridden
+            styles=rule.styles
+            for name,value in list(styles.items()):
+                important=asCssValue(value).important
+                laterImportant=overridden.get(name)
+                if laterImportant is None:
+                    continue
+                if laterImportant or not important:
+                    del styles[name]
+            for name,value in styles.items():
+                important=asCssValue(value).important
+                names=[name]
+                shorthand=SHORTHANDS.get(name)
+                if shorthand is not None:
+                    names.extend(shorthand.longhands)
+                for overriddenName in names:
+                    overridden[overriddenName]=important \
+                        or overridden.get(overriddenName,False)
+
+
+class RemoveEmptyRules(MinifyPass):
+    """
+    Remove rules that have no declarations
+    """
+
+    name='emptyRules'
+    minifiesRules=True
+
+    def minifyRules(self,rules:'CssRules')->None:
+        keep=[rule for rule in rules if len(rule.styles)>0 or rule.isOpaque]
+        if len(keep)!=len(rules):
+            rules.assign(keep)
+
+
+class MergeAdjacentRules(MinifyPass):
+    """
+    Merge rules that are next to each other and have the
+    same selectors and media, eg
+        a{color:red}a{margin:0}
+    becomes
+        a{color:red;margin:0}
+    """
+
+    name='mergeAdjacentRules'
+    minifiesRules=True
+
+    def minifyRules(self,rules:'CssRules')->None:
+        merged:typing.List[typing.Any]=[]
+        previousKey=None
+        for rule in rules:
+            key=None if rule.isAtRule else _ruleKey(rule)
+            if merged and key is not None and key==previousKey:
+                target=merged[-1].styles
+                for name,value in rule.styles.items():
+                    existing=target.get(name)
+                    if existing is not None:
+                        if asCssValue(existing).important \
+                            and not asCssValue(value).important:
+                            continue
+                        # re-insert so the order stays correct
+                        del target[name]
+                    target[name]=value
+            else:
+                merged.append(rule)
+                previousKey=key
+        if len(merged)!=len(rules):
+            rules.assign(merged)
+
+
+# in the order they should run
+MINIFY_PASSES:typing.Dict[str,typing.Type[MinifyPass]]={
+    'colors':ShortestColors,
+    'zeroUnits':StripZeroUnits,
+    'numbers':TrimNumbers,
+    'boxShorthands':ShortenBoxShorthands,
+    'duplicateDeclarations':RemoveDuplicateDeclarations,
+    'emptyRules':RemoveEmptyRules,
+    'mergeAdjacentRules':MergeAdjacentRules}
+
+MinifyPassCompatible=typing.Union[str,MinifyPass,typing.Type[MinifyPass]]
+def asMinifyPass(minifyPass:MinifyPassCompatible)->MinifyPass:
+    """
+    Always returns a MinifyPass object.
+
+    :param minifyPass: a pass, pass class, or name from MINIFY_PASSES
+    """
+    if isinstance(minifyPass,str):
+        minifyPass=MINIFY_PASSES[minifyPass]
+    if isinstance(minifyPass,type):
+        minifyPass=minifyPass()
+    return minifyPass
+
+
+SAFE_KEYWORD_RE=re.compile(r"""^!?[-_a-z0-9#.%]+$""",re.IGNORECASE)
+
+def _serializeMinified(tokens:typing.Iterable[CssToken],important:bool)->str:
+    """
+    Turn tokens back into the shortest possible value string
+    """
+    ret:typing.List[str]=[]
+    for token in tokens:
+        if isinstance(token,CssSeparator):
+            ret.append(token.value)
+            continue
+        if ret and ret[-1] not in (',','/'):
+            ret.append(' ')
+        if isinstance(token,CssColor):
+            ret.append(shortestColor(token))
+        else:
+            ret.append(str(token))
+    if important:
+        ret.append('!important')
+    return ''.join(ret)
+
+
+def minify(rules:'CssRules',
+    passes:typing.Optional[typing.Iterable[MinifyPassCompatible]]=None,
+    timings:typing.Optional[Timings]=None
+    )->'CssRules':
+    """
+    Minify css rules in-place
+
+    :param passes: the passes to run (default is all of MINIFY_PASSES)
+    :param timings: if given, the time spent in each pass (in seconds)
+        is accumulated into it as {passName:seconds}
+    :return: the same rules that were passed in, for convenience
+    """
+    if passes is None:
+        passes=MINIFY_PASSES.keys()
+    # the rules will no longer match their source text, but
+    # keep track of where they came from (for source maps)
+    detachSource=getattr(rules,'_detachSource',None)
+    if detachSource is not None:
+        detachSource()
+    passList=[asMinifyPass(p) for p in passes]
+    if timings is not None:
+        for minifyPass in passList:
+            timings.setdefault(minifyPass.name,0.0)
+    valuePasses=[p for p in passList if p.minifiesValues]
+    if valuePasses:
+        for rule in rules:
+            styles=rule.styles
+            for name,value in list(styles.items()):
+                if isVerbatimProperty(name):
+                    continue
+                value=asCssValue(value)
+                originalTokens=value.tokens
+                isColorProperty=name in COLOR_PROPERTIES
+                for token in originalTokens:
+                    if isinstance(token,CssKeyword):
+                        understood=SAFE_KEYWORD_RE.match(
+                            token.value) is not None
+                    else:
+                        # not a name that only looks like a color,
+                        # eg animation:white 1s
+                        understood=isColorProperty \
+                            or not isinstance(token,CssColor)
+                    if not understood:
+                        # there is something in here we do not fully
+                        # understand, so leave it alone
+                        break
+                else:
+                    tokens=originalTokens
+                    for minifyPass in valuePasses:
+                        if timings is None:
+                            tokens=minifyPass.minifyTokens(name,tokens)
+                        else:
+                            startTime=time.perf_counter()
+                            tokens=minifyPass.minifyTokens(name,tokens)
+                            elapsed=time.perf_counter()-startTime
+                            timings[minifyPass.name]+=elapsed
+                    if tokens is not originalTokens:
+                        newValue=CssValue(
+                            _serializeMinified(tokens,value.important))
+                        if len(newValue)<len(value):
+                            styles[name]=newValue
+    for minifyPass in passList:
+        if minifyPass.minifiesRules:
+            startTime=time.perf_counter()
+            minifyPass.minifyRules(rules)
+            if timings is not None:
+                timings[minifyPass.name]+=time.perf_counter()-startTime
+    return rules
+
+
+# selectors with no quotes, brackets or escapes, where whitespace
+# can be squeezed out without having to split them up
+PLAIN_SELECTOR_RE=re.compile(r"""[^"'\[\]()\\]*\Z""")
+# a dangling or doubled combinator, which splitCombinators() drops
+BAD_COMBINATOR_RE=re.compile(r"""[>+~](?:[>+~]|\Z)""")
+
+def minifySelector(selector:str)->str:
+    """
+    Remove unnecessary whitespace from a selector
+    eg "ul > li  a" -> "ul>li a"
+    """
+    if PLAIN_SELECTOR_RE.match(selector) is not None:
+        squeezed=' '.join(selector.split())
+        for combinator in '>+~':
+            if combinator in squeezed:
+                squeezed=squeezed.replace(' '+combinator,combinator)\
+                    .replace(combinator+' ',combinator)
+        if BAD_COMBINATOR_RE.search(squeezed) is None:
+            return squeezed
+    ret:typing.List[str]=[]
+    for combinator,part in splitCombinators(selector):
+        ret.append(combinator)
+        ret.append(part)
+    return ''.join(ret)
+
+
+MEDIA_WHITESPACE_RE=re.compile(r"""\s*([():,])\s*""")
+
+def minifyMedia(condition:str)->str:
+    """
+    Remove unnecessary whitespace from a media condition
+    eg "screen and (max-width: 600px)" -> "screen and (max-width:600px)"
+    """
+    condition=MEDIA_WHITESPACE_RE.sub(r'\1',' '.join(condition.split()))
+    # "and(" is not valid, so put back the space before a "("
+    return re.sub(r"""([a-zA-Z])\(""",r'\1 (',condition)
+
+
+def iterMinifiedCssString(rules:typing.Iterable['CssRule'],
+    compressionOrder:bool=False,
+    sourceMap:typing.Optional[SourceMap]=None
+    )->typing.Iterator[str]:
+    """
+    Serialize css rules with no unnecessary whitespace, a piece
+    at a time, so that the output can be streamed somewhere
+    without ever holding all of it
+
+    (See getMinifiedCssString.)
+    """
+    # the output is all on one line, so this is the current column
+    length=0
+    currentLevels:typing.Tuple[str,...]=()
+    ruleList=rules if isinstance(rules,typing.Sequence) else list(rules)
+    order:typing.Iterable[int]=range(len(ruleList))
+    if compressionOrder:
+        order=compressionOrderIndexes(ruleList)
+    getRuleOrigin=None
+    if sourceMap is not None:
+        getRuleOrigin=getattr(rules,'getRuleOrigin',None)
+    for ruleIndex in order:
+        rule=ruleList[ruleIndex]
+        levels=() if rule.media is None else rule.media.levels
+        if levels!=currentLevels:
+            common=0
+            while common<min(len(levels),len(currentLevels)) \
+                and levels[common]==currentLevels[common]:
+                common+=1
+            text='}'*(len(currentLevels)-common)+''.join(
+                '@media %s{'%minifyMedia(level) for level in levels[common:])
+            yield text
+            length+=len(text)
+            currentLevels=levels
+        if rule.isOpaque:
+            text=rule.text # type: ignore
+        else:
+            declarations=collapseShorthands(rule.styles._items)
+            if compressionOrder:
+                declarations=canonicalDeclarationOrder(declarations)
+            text='%s{%s}'%(
+                ','.join(minifySelector(str(s)) for s in rule.selectors),
+                ';'.join('%s:%s'%(name,value.strip())
+                    for name,value in declarations))
+        if getRuleOrigin is not None:
+            origin=getRuleOrigin(ruleIndex)
+            if origin is not None:
+                sourceIndex=sourceMap.addSource(origin[0],origin[1])
+                sourceMap.addMapping(0,length,sourceIndex,origin[2])
+        yield text
+        length+=len(text)
+    if currentLevels:
+        yield '}'*len(currentLevels)
+
+
+def getMinifiedCssString(rules:typing.Iterable['CssRule'],
+    compressionOrder:bool=False,
+    sourceMap:typing.Optional[SourceMap]=None
+    )->str:
+    """
+    Serialize css rules with no unnecessary whitespace
+
+    :param compressionOrder: reorder declarations and rules,
+        wherever the cascade allows, so that the output compresses
+        better
+    :param sourceMap: if given, mappings from the start of each
+        rule back to where it came from are added to it
+        (requires rules to be a CssRules)
+    """
+    return ''.join(iterMinifiedCssString(rules,compressionOrder,sourceMap))
+
+
+class MinifyBenchmark(typing.NamedTuple):
+    """
+    Size and time results of minifying one stylesheet
+
+    :param name: what was minified (eg, a filename)
+    :param rawBefore: bytes before minifying
+    :param rawAfter: bytes after minifying
+    :param gzipBefore: gzipped bytes before minifying
+    :param gzipAfter: gzipped bytes after minifying
+    :param timings: {passName:seconds}, plus "parse" and "serialize"
+    """
+    name:str
+    rawBefore:int
+    rawAfter:int
+    gzipBefore:int
+    gzipAfter:int
+    timings:Timings
+
+    @property
+    def rawSaved(self)->int:
+        """
+        bytes saved, uncompressed
+        """
+        return self.rawBefore-self.rawAfter
+
+    @property
+    def gzipSaved(self)->int:
+        """
+        bytes saved, gzipped
+        """
+        return self.gzipBefore-self.gzipAfter
+
+
+def benchmarkMinify(name:str,
+    cssText:str,
+    passes:typing.Optional[typing.Iterable[MinifyPassCompatible]]=None
+    )->MinifyBenchmark:
+    """
+    Minify some css text and measure the results
+
+    :param name: a name to report the results under
+    :param passes: the passes to run (default is all of MINIFY_PASSES)
+    """
+    import gzip
+    from .rules import CssRules
+    timings:Timings={}
+    startTime=time.perf_counter()
+    rules=CssRules(cssText)
+    timings['parse']=time.perf_counter()-startTime
+    minify(rules,passes,timings)
+    startTime=time.perf_counter()
+    minified=getMinifiedCssString(rules)
+    timings['serialize']=time.perf_counter()-startTime
+    before=cssText.encode('utf-8')
+    after=minified.encode('utf-8')
+    return MinifyBenchmark(name,len(before),len(after),
+        len(gzip.compress(before,mtime=0)),len(gzip.compress(after,mtime=0)),
+        timings)
+
+
+def formatBenchmarkReport(results:typing.Iterable[MinifyBenchmark])->str:
+    """
+    Format benchmark results as a table
+    """
+    ret=['%-24s %10s %10s %7s %10s %10s %7s'%(
+        'name','raw','minified','saved','gzip','gzip min','saved')]
+    totalTimings:Timings={}
+    for result in results:
+        ret.append('%-24s %10d %10d %6.1f%% %10d %10d %6.1f%%'%(result.name,
+            result.rawBefore,result.rawAfter,
+            100.0*result.rawSaved/max(1,result.rawBefore),
+            result.gzipBefore,result.gzipAfter,
+            100.0*result.gzipSaved/max(1,result.gzipBefore)))
+        for passName,seconds in result.timings.items():
+            totalTimings[passName]=totalTimings.get(passName,0.0)+seconds
+    ret.append('')
+    for passName,seconds in totalTimings.items():
+        ret.append('%-24s %10.2fms'%(passName,seconds*1000))
+    return '\n'.join(ret)
@@ -0,0 +1,251 @@
+"""
+Split one big stylesheet into a shared bundle plus
+small per-page bundles
+
+Given the pages of a site, this works out which rules each
+page actually uses.  Rules used by most pages go into a shared
+bundle (which browsers can cache across the whole site) and
+the rest go into a bundle for each page that uses them.
+Rules used by no page at all are dropped.
+"""
+import typing
+import os
+import concurrent.futures
+from .htmlTypes import getRootElement
+from .compressionOrder import propertyFamily
+from .rules import CssRule,CssRules
+from .ruleIndex import RuleIndex
+if typing.TYPE_CHECKING:
+    from .css import Css
+
+
+# a parsed document/element, or html text
+PageCompatible=typing.Any
+PagesCompatible=typing.Union[
+    typing.Mapping[str,PageCompatible],
+    typing.Iterable[typing.Tuple[str,PageCompatible]]]
+
+
+def _parsePage(page:PageCompatible)->typing.Any:
+    """
+    Parse a page if it is html text
+    """
+    if isinstance(page,str):
+        from htmlTools import Html
+        page=Html(page)
+    return getRootElement(page)
+
+
+# the rule index of each worker process
+_workerIndex:typing.Optional[RuleIndex]=None
+
+def _initWorker(cssText:str)->None:
+    """
+    Parse the css once per worker process
+    """
+    global _workerIndex # pylint: disable=global-statement
+    _workerIndex=RuleIndex(CssRules(cssText),ignoreDynamic=True)
+
+def _workerUsedRules(page:str)->typing.Set[int]:
+    """
+    Find the rules used by a page, in a worker process
+    """
+    assert _workerIndex is not None
+    return _workerIndex.getUsedRuleIndexes(_parsePage(page))
+
+
+def computeRuleUsage(rules:typing.Union[CssRules,'Css'],
+    pages:PagesCompatible,
+    jobs:typing.Optional[int]=None
+    )->typing.Dict[str,typing.Set[int]]:
+    """
+    Work out which rules each page uses
+
+    A rule is used by a page if any of its selectors match an
+    element on the page, ignoring :hover, ::before, and the like.
+
+    :param pages: {pageName:page} where a page is a parsed
+        document/element or html text
+    :param jobs: how many pages to process in parallel (default
+        is the number of cpus).  Pages given as html text are
+        parsed and matched in worker processes, since that is
+        cpu bound.  Parsed documents cannot be sent to another
+        process, so are matched by a pool of threads.
+    :return: {pageName:set of rule indexes}
+    """
+    if not isinstance(rules,CssRules):
+        rules=rules.rules
+    if isinstance(pages,typing.Mapping):
+        pages=pages.items()
+    pages=list(pages)
+    if jobs is None:
+        jobs=os.cpu_count() or 1
+    jobs=min(jobs,len(pages))
+    if jobs>1 and all(isinstance(page,str) for _,page in pages):
+        # the workers need to end up with exactly the same rules
+        cssText=rules.getCssString()
+        if len(CssRules(cssText))==len(rules):
+            with concurrent.futures.ProcessPoolExecutor(jobs,
+                initializer=_initWorker,initargs=(cssText,)) as executor:
+                used=executor.map(_workerUsedRules,[page for _,page in pages],
+                    chunksize=max(1,len(pages)//(jobs*4)))
+                return {name:pageUsed for (name,_),pageUsed in zip(pages,used)}
+    index=RuleIndex(rules,ignoreDynamic=True)
+    def usedRules(page:PageCompatible)->typing.Set[int]:
+        return index.getUsedRuleIndexes(_parsePage(page))
+    if jobs<=1:
+        return {name:usedRules(page) for name,page in pages}
+    with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+        used=executor.map(usedRules,[page for _,page in pages])
+        return {name:pageUsed for (name,_),pageUsed in zip(pages,used)}
+
+
+class PageBundles:
+    """
+    The result of splitting a stylesheet into a shared
+    bundle and per-page bundles
+    """
+
+    def __init__(self,
+        shared:CssRules,
+        pages:typing.Dict[str,CssRules],
+        usage:typing.Dict[str,typing.Set[int]],
+        unused:typing.List[CssRule]):
+        """
+        :param shared: the rules every page loads
+        :param pages: {pageName:rules only that page loads}
+        :param usage: {pageName:indexes of the original rules it uses}
+        :param unused: rules that no page uses (and are in no bundle)
+        """
+        self.shared=shared
+        self.pages=pages
+        self.usage=usage
+        self.unused=unused
+
+    def getManifest(self,
+        sharedHref:str='shared.css',
+        pageHref:str='%s.css'
+        )->typing.Dict[str,typing.List[str]]:
+        """
+        Get the stylesheets each page should link to, in order
+
+        :param sharedHref: the url of the shared bundle
+        :param pageHref: the url of a page bundle, with a %s
+            for the page name
+        :return: {pageName:[hrefs]}
+        """
+        ret:typing.Dict[str,typing.List[str]]={}
+        for name,pageRules in self.pages.items():
+            hrefs=[]
+            if len(self.shared)>0:
+                hrefs.append(sharedHref)
+            if len(pageRules)>0:
+                hrefs.append(pageHref%name)
+            ret[name]=hrefs
+        return ret
+    manifest=property(getManifest)
+
+    def getLinkTags(self,
+        pageName:str,
+        sharedHref:str='shared.css',
+        pageHref:str='%s.css'
+        )->str:
+        """
+        Get the html <link> tags for a page
+        """
+        hrefs=self.getManifest(sharedHref,pageHref)[pageName]
+        return '\n'.join('<link rel="stylesheet" href="%s">'%href
+            for href in hrefs)
+
+    def getFiles(self,
+        sharedHref:str='shared.css',
+        pageHref:str='%s.css',
+        minified:bool=True
+        )->typing.Dict[str,str]:
+        """
+        Get the css text of every bundle
+
+        :return: {href:css text}
+        """
+        def cssText(rules:CssRules)->str:
+            if minified:
+                return rules.getMinifiedCssString()
+            return rules.getCssString()
+        ret:typing.Dict[str,str]={}
+        if len(self.shared)>0:
+            ret[sharedHref]=cssText(self.shared)
+        for name,pageRules in self.pages.items():
+            if len(pageRules)>0:
+                ret[pageHref%name]=cssText(pageRules)
+        return ret
+
+
+def _ruleFamilies(rule:CssRule)->typing.Set[str]:
+    return {propertyFamily(name) for name in rule.styles.keys()}
+
+
+def _familiesOverlap(families:typing.Set[str],
+    others:typing.Set[str]
+    )->bool:
+    """
+    Whether rules setting these property families could
+    affect rules setting the others
+    """
+    return 'all' in others or not others.isdisjoint(families)
+
+
+def splitCss(rules:typing.Union[CssRules,'Css'],
+    pages:PagesCompatible,
+    sharedThreshold:float=0.5,
+    jobs:typing.Optional[int]=None
+    )->PageBundles:
+    """
+    Split a stylesheet into a shared bundle plus per-page bundles
+
+    Each page links the shared bundle first and then its own, so a
+    page-specific rule would end up after every shared rule.  To
+    keep the cascade the same as the original stylesheet, any
+    page-specific rule that comes before a shared rule setting an
+    overlapping property (on a page that uses both) is moved into
+    the shared bundle instead.
+
+    :param pages: {pageName:page} where a page is a parsed
+        document/element or html text
+    :param sharedThreshold: rules used by at least this fraction
+        of the pages go in the shared bundle
+    :param jobs: how many pages to process in parallel
+    """
+    if not isinstance(rules,CssRules):
+        rules=rules.rules
+    usage=computeRuleUsage(rules,pages,jobs)
+    numPages=max(1,len(usage))
+    # {rule index:[page names]}
+    usedBy:typing.Dict[int,typing.List[str]]={}
+    for name,used in usage.items():
+        for ruleIndex in used:
+            usedBy.setdefault(ruleIndex,[]).append(name)
+    shared:typing.Set[int]=set()
+    for ruleIndex,names in usedBy.items():
+        if rules[ruleIndex].isAtRule or len(names)>=sharedThreshold*numPages:
+            shared.add(ruleIndex)
+    # walk backwards, tracking the properties set by later
+    # shared rules on each page
+    laterShared:typing.Dict[str,typing.Set[str]]={name:set() for name in usage}
+    for ruleIndex in sorted(usedBy,reverse=True):
+        rule=rules[ruleIndex]
+        families=_ruleFamilies(rule)
+        names=usedBy[ruleIndex]
+        if ruleIndex not in shared:
+            if 'all' in families or any(
+                    _familiesOverlap(families,laterShared[name])
+                    for name in names):
+                shared.add(ruleIndex)
+        if ruleIndex in shared:
+            for name in names:
+                laterShared[name].update(families)
+    sharedRules=CssRules([rules[i] for i in sorted(shared)])
+    pageRules={name:CssRules([rules[i] for i in sorted(used)
+            if i not in shared])
+        for name,used in usage.items()}
+    unused=[rule for i,rule in enumerate(rules) if i not in usedBy]
+    return PageBundles(sharedRules,pageRules,usage,unused)
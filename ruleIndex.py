@@ -0,0 +1,170 @@
+"""
+Index rules by the rightmost part of their selectors
+
+Most selectors end in an id, a class, or a tag name, so for any
+given element only the rules filed under its own id, classes and
+tag (plus the few with universal selectors) need to be tested,
+instead of every rule in the stylesheet.
+"""
+import typing
+from .htmlTypes import HtmlElementLike,getTagName,getAttribute
+from .matchContext import MatchContext
+from .cssParser import findClosingParen
+from .cssSelectors import CssSelector,CssSelectorRequirement,\
+    splitCombinators,compilePseudoClass
+from .rules import CssRule
+
+
+# (rule index,selector)
+IndexedSelector=typing.Tuple[int,CssSelector]
+
+
+def stripDynamicPseudos(selector:str)->str:
+    """
+    Remove the parts of a selector that depend on user interaction
+    or are pseudo-elements, leaving the part that can be matched
+    against a static document, eg
+        "a.nav:hover::before" -> "a.nav"
+
+    This is what determines whether a rule is "used" by a page.
+    """
+    ret:typing.List[str]=[]
+    for combinator,part in splitCombinators(selector):
+        kept:typing.List[str]=[]
+        pos=0
+        while pos<len(part):
+            m=CssSelectorRequirement.PART_SPLITTER_RE.match(part,pos)
+            if m is None:
+                kept.append(part[pos:])
+                break
+            end=m.end()
+            if m.group('pseudo') is None:
+                kept.append(m.group(0))
+            else:
+                argument=None
+                if m.group('pseudoArgument') is not None:
+                    try:
+                        closeIdx=findClosingParen(part,end-1)
+                    except ValueError:
+                        kept.append(part[m.start():])
+                        break
+                    argument=part[end:closeIdx]
+                    end=closeIdx+1
+                pseudo=m.group('pseudo')
+                if not pseudo.startswith('::') and compilePseudoClass(
+                        pseudo[1:].lower(),argument) is not None:
+                    kept.append(part[m.start():end])
+            pos=end
+        if not kept:
+            kept=['*']
+        ret.append(combinator)
+        ret.append(''.join(kept))
+    return ''.join(ret)
+
+
+class RuleIndex:
+    """
+    Rules filed by the id, class, or tag of the rightmost
+    part of each of their selectors
+    """
+
+    def __init__(self,rules:typing.Iterable[CssRule],ignoreDynamic:bool=False):
+        """
+        :param ignoreDynamic: match selectors as if dynamic pseudo-classes
+            and pseudo-elements (:hover, ::before, etc) were not there,
+            which is what you want when asking "is this rule used?"
+        """
+        self.rules:typing.List[CssRule]=list(rules)
+        self._byId:typing.Dict[str,typing.List[IndexedSelector]]={}
+        self._byClass:typing.Dict[str,typing.List[IndexedSelector]]={}
+        self._byTag:typing.Dict[str,typing.List[IndexedSelector]]={}
+        self._universal:typing.List[IndexedSelector]=[]
+        # at-rules like @font-face, which do not select elements
+        self.atRules:typing.List[int]=[]
+        for i,rule in enumerate(self.rules):
+            if rule.isAtRule:
+                self.atRules.append(i)
+                continue
+            for selector in rule.selectors:
+                if ignoreDynamic:
+                    selector=CssSelector(stripDynamicPseudos(str(selector)))
+                self._add(i,selector)
+
+    def _add(self,ruleIndex:int,selector:CssSelector)->None:
+        """
+        File a selector under its most selective key
+        """
+        if not selector._rightToLeft:
+            return
+        requirement=selector._rightToLeft[0][0]
+        if requirement._neverMatches:
+            return
+        entry=(ruleIndex,selector)
+        if requirement._id is not None:
+            self._byId.setdefault(requirement._id,[]).append(entry)
+        elif requirement._classes:
+            # any one of the classes will do, since all are required
+            cssClass=min(requirement._classes)
+            self._byClass.setdefault(cssClass,[]).append(entry)
+        elif requirement._tagName is not None:
+            self._byTag.setdefault(requirement._tagName,[]).append(entry)
+        else:
+            self._universal.append(entry)
+
+    def candidates(self,
+        element:HtmlElementLike
+        )->typing.Iterator[IndexedSelector]:
+        """
+        Get every (rule index,selector) that could possibly
+        match an element (in no particular order)
+        """
+        elementId=getAttribute(element,'id')
+        if elementId is not None and elementId in self._byId:
+            yield from self._byId[elementId]
+        classes=getAttribute(element,'class')
+        if classes is not None:
+            for cssClass in set(classes.split()):
+                entries=self._byClass.get(cssClass)
+                if entries is not None:
+                    yield from entries
+        entries=self._byTag.get(getTagName(element).lower())
+        if entries is not None:
+            yield from entries
+        yield from self._universal
+
+    def getRuleIndexesForElement(self,
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]=None
+        )->typing.List[int]:
+        """
+        Get the indexes of all rules that match an element,
+        in source order
+        """
+        matched:typing.Set[int]=set()
+        for ruleIndex,selector in self.candidates(element):
+            if ruleIndex not in matched and selector.matches(element,context):
+                matched.add(ruleIndex)
+        return sorted(matched)
+
+    def getRulesForElement(self,
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]=None
+        )->typing.List[CssRule]:
+        """
+        Get all rules that match an element, in source order
+        """
+        return [self.rules[i]
+            for i in self.getRuleIndexesForElement(element,context)]
+
+    def getUsedRuleIndexes(self,document:typing.Any)->typing.Set[int]:
+        """
+        Get the indexes of all rules that match at least
+        one element in a document (at-rules always count as used)
+        """
+        used:typing.Set[int]=set(self.atRules)
+        context=MatchContext()
+        for element in context.walk(document):
+            for ruleIndex,selector in self.candidates(element):
+                if ruleIndex not in used and selector.matches(element,context):
+                    used.add(ruleIndex)
+        return used
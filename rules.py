@@ -5,16 +5,121 @@ A rule consists of a series of selectors and
 a series of CssStyles that they all map to
 """
 import typing
+import os
 import re
-from htmlTypes import HtmlElementLike
+import heapq
+import bisect
+from array import array
+from .htmlTypes import HtmlElementLike
+from .matchContext import MatchContext
+from .cssParser import ParsedRule,parseRules,parseRulesFromBuffer,\
+    DEFAULT_CHUNK_SIZE
+from .mediaQueries import MediaContext,MediaQueryList,\
+    MediaQueryListCompatible,asMediaQueryList
+from .cssVariables import CssVariableResolver,flattenVariables
+from .compressionOrder import compressionOrderIndexes,propertyFamily,\
+    CompressionGain,gzipSize
+from .sourceMaps import SourceMap,PositionTracker
+from .matchCache import MatchCache,MatchCacheStats
+from .interning import CssInterner
+from .cssDiff import diffRules,CssDiff
+from .minify import minify,getMinifiedCssString,MinifyPassCompatible,Timings
 from .cssStyles import CssStyles,CssStylesCompatible
 from .cssSelectors import CssSelector,CssSelectors,CssSelectorsCompatible,CssSelectorCompatible
 if typing.TYPE_CHECKING:
     from .css import Css
+    from .inliner import CssInliner
+    from .cssMerge import MergeResult
 
 CssRuleCompatible=typing.Union[str,'CssRule']
+# (source name,source text,offset) of where a rule came from
+RuleOrigin=typing.Tuple[str,str,int]
+# at-rules that parse as a rule with a declaration block
+# (as opposed to "@name" which is an id selector)
+AT_RULE_KEYWORDS=('@font-face','@page','@counter-style','@property',
+    '@font-feature-values','@viewport')
 CssRulesCompatible=typing.Union[
     CssRuleCompatible,'CssRules','Css',typing.Iterable['CssRuleCompatible']]
+AT_KEYWORD_RE=re.compile(r'@[-_a-zA-Z0-9]+')
+# vendor-specific pseudo-classes/elements, which make browsers
+# that do not know them drop the whole rule they are in
+VENDOR_PSEUDO_RE=re.compile(r':-[a-zA-Z]')
+CLASS_NAME_RE=re.compile(r'\.(-?[_a-zA-Z][-_a-zA-Z0-9]*)')
+SIMPLE_CLASS_RE=re.compile(r'^\.-?[_a-zA-Z][-_a-zA-Z0-9]*$')
+# the class and id names in a selector (or an [attribute] to skip over)
+OBFUSCATABLE_NAME_RE=re.compile(
+    r'\[[^\]]*\]|([.#])(-?[_a-zA-Z][-_a-zA-Z0-9]*)')
+# text that can come between rules without being part of either
+BETWEEN_RULES_RE=re.compile(r'(?:\s|/\*.*?\*/)*',re.DOTALL)
+
+
+def _isBalanced(text:str,start:int,end:int)->bool:
+    """
+    Whether the {}'s, ()'s and []'s in a section of css text are
+    balanced, with no comment or string left open, so that
+    it can be parsed independently of the text around it
+    """
+    # the closing brackets expected, innermost last
+    closers:typing.List[str]=[]
+    pos=start
+    while pos<end:
+        c=text[pos]
+        if c in '"\'':
+            closeQuote=pos+1
+            while closeQuote<end and text[closeQuote]!=c:
+                if text[closeQuote]=='\\':
+                    closeQuote+=1
+                closeQuote+=1
+            if closeQuote>=end:
+                return False
+            pos=closeQuote
+        elif c=='/' and text.startswith('/*',pos):
+            commentEnd=text.find('*/',pos+2,end)
+            if commentEnd<0:
+                return False
+            pos=commentEnd+1
+        elif c=='{':
+            closers.append('}')
+        elif c=='(':
+            closers.append(')')
+        elif c=='[':
+            closers.append(']')
+        elif c in '})]':
+            if not closers or closers.pop()!=c:
+                return False
+        pos+=1
+    return not closers
+
+
+def _differingSpan(old:str,
+    new:str,
+    blockSize:int=4096
+    )->typing.Tuple[int,int,int]:
+    """
+    Find the part of the old text that was replaced to make the new
+
+    :return: (start,end in old,end in new)
+    """
+    maxCommon=min(len(old),len(new))
+    start=0
+    while start<maxCommon:
+        blockEnd=min(start+blockSize,maxCommon)
+        if old[start:blockEnd]!=new[start:blockEnd]:
+            while old[start]==new[start]:
+                start+=1
+            break
+        start=blockEnd
+    maxCommon-=start
+    suffix=0
+    while suffix<maxCommon:
+        blockLen=min(suffix+blockSize,maxCommon)
+        oldBlock=old[len(old)-blockLen:len(old)-suffix]
+        if oldBlock!=new[len(new)-blockLen:len(new)-suffix]:
+            while old[len(old)-suffix-1]==new[len(new)-suffix-1]:
+                suffix+=1
+            break
+        suffix=blockLen
+    return (start,len(old)-suffix,len(new)-suffix)
 
 
 class CssRule:
@@ -25,12 +130,27 @@ class CssRule:
     a series of CssStyles that they all map to
     """
 
+    # whether this is a CssOpaqueRule
+    isOpaque=False
+
     def __init__(self,
         selectors:CssSelectorsCompatible,
-        styles:CssStylesCompatible):
-        """ """
+        styles:CssStylesCompatible,
+        media:typing.Optional[MediaQueryListCompatible]=None):
+        """
+        :param media: the @media condition this rule is inside of, if any
+        """
         self._styles:CssStyles=CssStyles(styles)
         self.selectors=CssSelectors(selectors)
+        self.media:typing.Optional[MediaQueryList]=asMediaQueryList(media)
+
+    def appliesToMedia(self,media:typing.Optional[MediaContext])->bool:
+        """
+        Whether this rule is in effect for a given media context.
+
+        If media is None, media conditions are ignored.
+        """
+        return media is None or self.media is None or self.media.matches(media)
 
     @property
     def styles(self)->CssStyles:
@@ -51,6 +171,17 @@ class CssRule:
     def style(self,styles:CssStylesCompatible):
         self._styles:CssStyles=CssStyles(styles)
 
+    @property
+    def isAtRule(self)->bool:
+        """
+        Whether this is an at-rule such as @font-face,
+        rather than a rule with selectors
+        """
+        if len(self.selectors)!=1:
+            return False
+        keyword=str(self.selectors[0]).split(None,1)[0].lower()
+        return keyword in AT_RULE_KEYWORDS
+
     @property
     def numSelectors(self)->int:
         """
@@ -121,23 +252,29 @@ class CssRule:
                 return False
             if other._styles!=self._styles:
                 return False
+            if other.media!=self.media:
+                return False
             return True
         return self.matches(other)
 
-    def matches(self,element:HtmlElementLike)->bool:
+    def matches(self,
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]=None
+        )->bool:
         """
         Determine if this rule applies to the given selection
         :rtype: bool
         """
-        return self.selectors.matches(element)
+        return self.selectors.matches(element,context)
 
     def getStyles(self,
-        element:HtmlElementLike
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]=None
         )->typing.Optional[CssStyles]:
         """
         collect all the styles that apply to a given element
         """
-        if self.matches(element):
+        if self.matches(element,context):
             return self.styles
         return CssStyles()
     getStyle=getStyles
@@ -154,15 +291,20 @@ class CssRule:
             ignore={}
         return {}
 
-    def getCssString(self,indent='\t',prepend='\n'):
+    def getCssString(self,indent='\t',prepend='\n',compressionOrder=False):
         """
         Returns the css text
+
+        :param compressionOrder: put the declarations in canonical
+            order so that the output compresses better
         """
         ret:typing.List[str]=[]
         for selector in self.selectors:
             ret.append(str(selector))
-        ret=[', '.join(ret),' {']
-        ret.append(self.styles.getCssString(indent,prepend))
+        ret=[', '.join(ret),' {',prepend]
+        ret.append(self.styles.getCssFileFormat(
+            indenter=indent,newline=prepend,curlies=False,
+            canonicalOrder=compressionOrder))
         ret.append(prepend)
         ret.append('}')
         return ''.join(ret)
@@ -183,19 +325,487 @@ class CssRule:
 Rule=CssRule
 
 
+class CssOpaqueRule(CssRule):
+    """
+    A rule that is kept as text and written back out verbatim
+
+    These are statements like @import and @charset, and at-rules
+    whose block is not just declarations, like @keyframes and
+    @supports.  They have no selectors or styles, so never match
+    anything.
+    """
+
+    isOpaque=True
+
+    def __init__(self,
+        text:str,
+        media:typing.Optional[MediaQueryListCompatible]=None):
+        """
+        :param text: the complete rule, eg "@import url(x.css);"
+        :param media: the @media condition this rule is inside of, if any
+        """
+        CssRule.__init__(self,(),(),media)
+        self.text=text.strip()
+
+    @property
+    def keyword(self)->str:
+        """
+        The at-keyword, lowercase, eg "@import"
+        """
+        m=AT_KEYWORD_RE.match(self.text)
+        return '' if m is None else m.group(0).lower()
+
+    @property
+    def isAtRule(self)->bool:
+        return True
+
+    def __eq__(self, # type: ignore
+        other:typing.Union[None,str,CssRule]
+        )->bool:
+        if isinstance(other,str):
+            other=CssOpaqueRule(other)
+        if not isinstance(other,CssOpaqueRule):
+            return False
+        return other.text==self.text and other.media==self.media
+
+    def matches(self,
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]=None
+        )->bool:
+        _=element,context
+        return False
+
+    def getCssString(self,indent='\t',prepend='\n',compressionOrder=False):
+        """
+        Returns the css text, exactly as it was given
+        """
+        _=indent,prepend,compressionOrder
+        return self.text
+OpaqueRule=CssOpaqueRule
+
+
 class CssRules:
     """
     A set of formatting rules.
     """
 
-    RULES_SPLITTER_RE=re.compile(
-        r"""(?P<selectors>[.@:a-z][^{]*)\{(?P<styles>[^}]*)\}""",re.IGNORECASE|re.DOTALL)
-
-    def __init__(self,rules:typing.Optional[CssRulesCompatible]=None):
+    def __init__(self,
+        rules:typing.Optional[CssRulesCompatible]=None,
+        interner:typing.Optional[CssInterner]=None):
+        """
+        :param interner: if given, parsed rules share their selectors,
+            values and declaration blocks with everything else parsed
+            through the same interner
+        """
         self._rules:typing.List[CssRule]=[]
+        # {media levels:(condition,[rule indexes])} built on demand
+        self._mediaPartitions:typing.Optional[typing.Dict[
+            typing.Tuple[str,...],
+            typing.Tuple[typing.Optional[MediaQueryList],
+                typing.List[int]]]]=None
+        # {media context:([rule indexes],[rules])}
+        self._rulesForMedia:typing.Dict[MediaContext,
+            typing.Tuple[typing.List[int],typing.List[CssRule]]]={}
+        # the css text the rules were parsed from, with the source
+        # span of each rule, or None if the rules have been changed
+        # in a way that no longer corresponds to any text
+        self._source:typing.Optional[str]=None
+        # whether the whole source is balanced (see _isBalanced),
+        # or None if not checked yet
+        self._sourceBalanced:typing.Optional[bool]=None
+        self._spanStarts=array('q')
+        self._spanEnds=array('q')
+        # the spans of rules at index _shiftFrom or later are really
+        # _shiftBy further along (so edits need not update them all)
+        self._shiftFrom=0
+        self._shiftBy=0
+        # where each rule originally came from, once the source text
+        # no longer corresponds to the rules (eg, after minifying)
+        # as indexes into _originSources and offsets, or -1 if unknown
+        self.sourceName='<css>'
+        self._originSources:typing.List[typing.Tuple[str,str]]=[]
+        self._originSourceIndexes:typing.Dict[typing.Tuple[str,int],int]={}
+        self._originFiles=array('l')
+        self._originOffsets=array('q')
+        # {id(rule):origin} of rules being re-added by assign()
+        self._knownOrigins:typing.Optional[typing.Dict[int,RuleOrigin]]=None
+        self._matchCache:typing.Optional[MatchCache]=None
+        # {media:CssInliner}
+        self._inliners:typing.Dict[typing.Optional[MediaContext],typing.Any]={}
+        self.interner=interner
         if rules is not None:
             self.addCssRules(rules)
 
+    def _changed(self)->None:
+        """
+        Call whenever the rules change to throw away anything
+        that was derived from them
+        """
+        self._mediaPartitions=None
+        self._rulesForMedia={}
+        self._inliners={}
+        if self._matchCache is not None:
+            self._matchCache.clear()
+
+    def _forgetSource(self)->None:
+        """
+        Drop the source text and spans
+        """
+        self._source=None
+        self._sourceBalanced=None
+        self._spanStarts=array('q')
+        self._spanEnds=array('q')
+        self._shiftFrom=0
+        self._shiftBy=0
+
+    def _detachSource(self)->None:
+        """
+        Call before changing the rules in a way that will no longer
+        correspond to the source text.  Where each rule is in the
+        text is kept as its origin (for source maps).
+        """
+        if self._source is None:
+            return
+        numRules=len(self._rules)
+        sourceIndex=self._addOriginSource(self.sourceName,self._source)
+        self._originFiles=array('l',[sourceIndex])*numRules
+        self._originOffsets=array('q',self._spanStarts)
+        for i in range(self._shiftFrom,numRules):
+            self._originOffsets[i]+=self._shiftBy
+        self._forgetSource()
+
+    def _addOriginSource(self,name:str,text:str)->int:
+        key=(name,id(text))
+        ret=self._originSourceIndexes.get(key)
+        if ret is None:
+            ret=len(self._originSources)
+            self._originSources.append((name,text))
+            self._originSourceIndexes[key]=ret
+        return ret
+
+    def _appendOrigin(self,origin:typing.Optional[RuleOrigin])->None:
+        if origin is None:
+            self._originFiles.append(-1)
+            self._originOffsets.append(-1)
+        else:
+            self._originFiles.append(
+                self._addOriginSource(origin[0],origin[1]))
+            self._originOffsets.append(origin[2])
+
+    def getRuleOrigin(self,idx:int)->typing.Optional[RuleOrigin]:
+        """
+        Get where a rule originally came from.
+
+        This follows the rule through transformations like
+        minify() and obfuscate(), unlike getSourceSpan().
+
+        :return: (source name,source text,offset) or None if unknown
+        """
+        if self._source is not None:
+            return (self.sourceName,self._source,self._spanStart(idx))
+        sourceIndex=self._originFiles[idx]
+        if sourceIndex<0:
+            return None
+        name,text=self._originSources[sourceIndex]
+        return (name,text,self._originOffsets[idx])
+
+    @property
+    def source(self)->typing.Optional[str]:
+        """
+        The css text these rules were parsed from (kept up to date
+        by applyEdit()) or None if they were not parsed from text
+        or have since been changed in some other way
+        """
+        return self._source
+
+    def getSourceSpan(self,idx:int)->typing.Optional[typing.Tuple[int,int]]:
+        """
+        Get where a rule is in the source text
+
+        :param idx: the index of the rule
+        :return: (start,end) offsets or None if there is no source
+        """
+        if self._source is None:
+            return None
+        if idx<0:
+            idx+=len(self._rules)
+        shift=self._shiftBy if idx>=self._shiftFrom else 0
+        return (self._spanStarts[idx]+shift,self._spanEnds[idx]+shift)
+
+    def _spanStart(self,idx:int)->int:
+        shift=self._shiftBy if idx>=self._shiftFrom else 0
+        return self._spanStarts[idx]+shift
+
+    def _spanEnd(self,idx:int)->int:
+        shift=self._shiftBy if idx>=self._shiftFrom else 0
+        return self._spanEnds[idx]+shift
+
+    def _shiftSpans(self,start:int,end:int,shift:int)->None:
+        """
+        Add shift to the stored spans of rules [start,end)
+        """
+        if shift==0:
+            return
+        starts=self._spanStarts
+        ends=self._spanEnds
+        for i in range(start,end):
+            starts[i]+=shift
+            ends[i]+=shift
+
+    def _levels(self,idx:int)->typing.Tuple[str,...]:
+        media=self._rules[idx].media
+        return () if media is None else media.levels
+
+    def applyEdit(self,start:int,end:int,newText:str)->typing.Tuple[int,int]:
+        """
+        Replace source[start:end] with newText, reparsing only
+        the rules that overlap the edit (and the one after it).
+
+        The spans of later rules are shifted (lazily) and the
+        media partitions and per-media caches are patched in
+        place rather than rebuilt, so the cost of an edit does
+        not grow with the size of the stylesheet.
+
+        If the edit changes the structure around it (eg, adds or
+        removes a brace of an @media block), the text outside of
+        it is not balanced (eg, an earlier edit left a comment
+        open), or it leaves text that would run on into a later
+        rule, everything is reparsed.
+
+        :return: (first index,end index) of the rules that were
+            reparsed
+        """
+        source=self._source
+        if source is None:
+            raise ValueError('Cannot edit css rules that have no source text')
+        if start<0 or end<start or end>len(source):
+            raise ValueError('Edit span %d:%d is outside of the source text'
+                %(start,end))
+        newSource=source[:start]+newText+source[end:]
+        delta=len(newText)-(end-start)
+        numRules=len(self._rules)
+        # rules [first,last) overlap the edit (including touching its end,
+        # since text typed right before a rule becomes part of it)
+        lo,hi=0,numRules
+        while lo<hi:
+            mid=(lo+hi)//2
+            if self._spanEnd(mid)>start:
+                hi=mid
+            else:
+                lo=mid+1
+        first=lo
+        hi=numRules
+        while lo<hi:
+            mid=(lo+hi)//2
+            if self._spanStart(mid)>end:
+                hi=mid
+            else:
+                lo=mid+1
+        last=lo
+        # the rule after the edit is reparsed too, since anything
+        # left over at the end of it (eg a stray "*/", or text typed
+        # ahead of a comment) becomes part of that rule's selector
+        if last<numRules:
+            last+=1
+        regionStart=self._spanEnd(first-1) if first>0 else 0
+        regionEnd=self._spanStart(last) if last<numRules else len(source)
+        levels=self._levels(first-1) if first>0 else ()
+        # replacing one balanced region with another leaves the
+        # balance of the whole unchanged, so it is only checked once
+        if self._sourceBalanced is None:
+            self._sourceBalanced=_isBalanced(source,0,len(source))
+        sameLevels=all(self._levels(i)==levels
+            for i in range(first,min(last+1,numRules)))
+        if not self._sourceBalanced or not sameLevels \
+            or not _isBalanced(source,regionStart,regionEnd) \
+            or not _isBalanced(newSource,regionStart,regionEnd+delta):
+            self.assign(newSource)
+            return (0,len(self._rules))
+        media=MediaQueryList(levels) if levels else None
+        newRules:typing.List[CssRule]=[]
+        newStarts=array('q')
+        newEnds=array('q')
+        parsedEnd=regionStart
+        for parsed in parseRules(newSource,regionStart,regionEnd+delta,levels):
+            ruleMedia=media
+            if len(parsed.media)!=len(levels):
+                ruleMedia=MediaQueryList(parsed.media)
+            newRules.append(self._ruleFromParsed(parsed,ruleMedia))
+            newStarts.append(parsed.start)
+            newEnds.append(parsed.end)
+            parsedEnd=parsed.end
+        # anything else left at the end (eg the selector of a rule whose
+        # block an edit turned into a comment) is the start of the next
+        # rule's selector, so the rest of the sheet has to be reparsed
+        if last<numRules:
+            between=BETWEEN_RULES_RE.match(newSource,parsedEnd,
+                regionEnd+delta)
+            if between is None or between.end()<regionEnd+delta:
+                self.assign(newSource)
+                return (0,len(self._rules))
+        # bring the lazy shift up to date so that the replaced rules,
+        # the rules before them, and the rules after them are all correct
+        indexShift=len(newRules)-(last-first)
+        if self._shiftBy==0 or self._shiftFrom>=numRules:
+            self._shiftFrom=last
+            self._shiftBy=0
+        if self._shiftFrom<=last:
+            self._shiftSpans(self._shiftFrom,first,self._shiftBy)
+            shiftFrom=last
+        else:
+            self._shiftSpans(last,self._shiftFrom,delta)
+            shiftFrom=self._shiftFrom
+        self._spanStarts[first:last]=newStarts
+        self._spanEnds[first:last]=newEnds
+        self._shiftFrom=shiftFrom+indexShift
+        self._shiftBy+=delta
+        oldRules=self._rules[first:last]
+        self._rules[first:last]=newRules
+        self._source=newSource
+        self._rulesReplaced(first,oldRules,newRules)
+        return (first,first+len(newRules))
+
+    def _rulesReplaced(self,
+        first:int,
+        oldRules:typing.List[CssRule],
+        newRules:typing.List[CssRule]
+        )->None:
+        """
+        Patch the media partitions and per-media caches in place
+        after rules [first,first+len(oldRules)) were replaced
+        """
+        last=first+len(oldRules)
+        indexShift=len(newRules)-len(oldRules)
+
+        def patch(indexes:typing.List[int],
+            rules:typing.Optional[typing.List[CssRule]],
+            include:typing.Callable[[CssRule],bool]
+            )->None:
+            lo=bisect.bisect_left(indexes,first)
+            hi=bisect.bisect_left(indexes,last)
+            added=[(first+i,rule) for i,rule in enumerate(newRules)
+                if include(rule)]
+            if indexShift:
+                indexes[hi:]=[i+indexShift for i in indexes[hi:]]
+            indexes[lo:hi]=[i for i,_ in added]
+            if rules is not None:
+                rules[lo:hi]=[rule for _,rule in added]
+
+        if self._mediaPartitions is not None:
+            for rule in newRules:
+                levels=() if rule.media is None else rule.media.levels
+                if levels not in self._mediaPartitions:
+                    self._mediaPartitions[levels]=(rule.media,[])
+            for levels,(_,indexes) in self._mediaPartitions.items():
+                patch(indexes,None,lambda rule,levels=levels: # type: ignore
+                    (() if rule.media is None else rule.media.levels)==levels)
+        for media,(indexes,rules) in self._rulesForMedia.items():
+            patch(indexes,rules,lambda rule,media=media: # type: ignore
+                rule.appliesToMedia(media))
+        self._inliners={}
+        if self._matchCache is not None:
+            self._matchCache.clear()
+
+    @property
+    def mediaPartitions(self)->typing.Dict[
+        typing.Tuple[str,...],
+        typing.Tuple[typing.Optional[MediaQueryList],typing.List[int]]]:
+        """
+        The rules, partitioned by @media condition
+
+        :return: {media levels:(condition,[rule indexes in source order])}
+            where rules outside of any @media have levels ()
+        """
+        if self._mediaPartitions is None:
+            partitions:typing.Dict[
+                typing.Tuple[str,...],
+                typing.Tuple[typing.Optional[MediaQueryList],
+                    typing.List[int]]]={}
+            for i,rule in enumerate(self._rules):
+                levels=() if rule.media is None else rule.media.levels
+                partition=partitions.get(levels)
+                if partition is None:
+                    partition=(rule.media,[])
+                    partitions[levels]=partition
+                partition[1].append(i)
+            self._mediaPartitions=partitions
+        return self._mediaPartitions
+
+    def getRulesForMedia(self,
+        media:typing.Optional[MediaContext]
+        )->typing.List[CssRule]:
+        """
+        Get the rules that are in effect for a given media context,
+        in source order.
+
+        Each distinct @media condition is evaluated only once, and
+        the result is cached per context, so switching back and forth
+        between viewports is cheap.
+
+        :param media: the context to evaluate against.  If None,
+            media conditions are ignored and all rules are returned.
+        """
+        if media is None:
+            return self._rules
+        cached=self._rulesForMedia.get(media)
+        if cached is None:
+            indexLists:typing.List[typing.List[int]]=[]
+            for condition,indexes in self.mediaPartitions.values():
+                if condition is None or condition.matches(media):
+                    indexLists.append(indexes)
+            ruleIndexes=list(heapq.merge(*indexLists))
+            cached=(ruleIndexes,[self._rules[i] for i in ruleIndexes])
+            self._rulesForMedia[media]=cached
+        return cached[1]
+
+    def enableMatchCache(self,maxSize:int=1024)->None:
+        """
+        Cache the rules matched by elements, so that asking about
+        the same (or an identical) element again is fast
+
+        The cache is cleared whenever the rules are changed through
+        this object.  If rules or their styles are modified directly,
+        call invalidateMatchCache().
+
+        :param maxSize: the most element signatures to remember
+            (least recently used ones are dropped first)
+        """
+        self._matchCache=MatchCache(self,maxSize)
+
+    def disableMatchCache(self)->None:
+        """
+        Stop caching matched rules
+        """
+        self._matchCache=None
+
+    def invalidateMatchCache(self,
+        element:typing.Optional[HtmlElementLike]=None
+        )->None:
+        """
+        Throw away cached matches
+
+        :param element: only forget this element (as it is now),
+            otherwise forget everything (including compiled inliners)
+        """
+        if element is None:
+            self._inliners={}
+        if self._matchCache is None:
+            return
+        if element is None:
+            self._matchCache.clear()
+        else:
+            self._matchCache.invalidateElement(element)
+
+    @property
+    def matchCacheStats(self)->typing.Optional[MatchCacheStats]:
+        """
+        Hit/miss statistics of the match cache
+        (None if it is not enabled)
+        """
+        if self._matchCache is None:
+            return None
+        return self._matchCache.stats
+
     def __iter__(self)->typing.Iterator[CssRule]:
         return iter(self._rules)
 
@@ -219,29 +829,94 @@ class CssRules:
         clear out all rules
         """
         self._rules.clear()
+        self._changed()
+        self._forgetSource()
+        self._originSources=[]
+        self._originSourceIndexes={}
+        self._originFiles=array('l')
+        self._originOffsets=array('q')
 
     def assign(self,rules:CssRulesCompatible)->None:
         """
         Assign this object to a set of rules
         """
+        if isinstance(rules,str) or not self._rules:
+            self.clear()
+            self.addCssRules(rules)
+            return
+        # the rules being assigned may include some of the current
+        # ones (eg, when filtering) so remember where they came from
+        knownOrigins:typing.Dict[int,RuleOrigin]={}
+        for i,rule in enumerate(self._rules):
+            origin=self.getRuleOrigin(i)
+            if origin is not None:
+                knownOrigins[id(rule)]=origin
         self.clear()
-        self.addCssRules(rules)
+        self._knownOrigins=knownOrigins
+        try:
+            self.addCssRules(rules)
+        finally:
+            self._knownOrigins=None
+
+    def _ruleFromParsed(self,
+        parsed:ParsedRule,
+        media:typing.Optional[MediaQueryList]=None
+        )->CssRule:
+        """
+        Create a rule from what the parser found
+
+        :param media: the rule's @media condition, if already known
+        """
+        if parsed.styles is not None and self.interner is not None:
+            return self.interner.rule(
+                parsed.selectors,parsed.styles,parsed.media)
+        if media is None and parsed.media:
+            media=MediaQueryList(parsed.media)
+        if parsed.styles is None:
+            return CssOpaqueRule(parsed.selectors,media)
+        return CssRule(parsed.selectors,parsed.styles,media)
 
     def addCssRules(self,rules:CssRulesCompatible)->None:
         """
         Add one or more rules
         """
         if isinstance(rules,str):
-            for m in self.RULES_SPLITTER_RE.finditer(rules):
-                rule=CssRule(m.group('selectors'),m.group('styles'))
-                self._rules.append(rule)
-        elif isinstance(rules,CssRule):
-            self._rules.append(rules)
-        elif isinstance(rules,CssRules):
-            self._rules.extend(rules)
+            keepSource=self._source is not None or not self._rules
+            offset=0
+            if keepSource:
+                if self._source:
+                    # the new text is treated as appended to the old
+                    self._shiftSpans(self._shiftFrom,len(self._rules),
+                        self._shiftBy)
+                    self._shiftFrom,self._shiftBy=0,0
+                    offset=len(self._source)+1
+                    self._source=self._source+'\n'+rules
+                else:
+                    self._source=rules
+                self._sourceBalanced=None
+            for parsed in parseRules(rules):
+                self._rules.append(self._ruleFromParsed(parsed))
+                if keepSource:
+                    self._spanStarts.append(parsed.start+offset)
+                    self._spanEnds.append(parsed.end+offset)
+                else:
+                    self._appendOrigin((self.sourceName,rules,parsed.start))
         else:
-            for rule in rules:
-                self.addCssRule(rule)
+            self._detachSource()
+            if isinstance(rules,CssRule):
+                self._rules.append(rules)
+                origin=None
+                if self._knownOrigins is not None:
+                    origin=self._knownOrigins.get(id(rules))
+                self._appendOrigin(origin)
+            elif isinstance(rules,CssRules):
+                for i,rule in enumerate(rules):
+                    self._rules.append(rule)
+                    self._appendOrigin(rules.getRuleOrigin(i))
+            else:
+                for rule in rules:
+                    self.addCssRule(rule)
+        self._changed()
     addCssRule=addCssRules
     addRules=addCssRules
     addRule=addCssRules
@@ -249,24 +924,209 @@ class CssRules:
     append=addCssRules
     extend=addCssRules
 
-    def getRulesForElement(self,element:HtmlElementLike)->typing.Iterable[CssRule]:
+    def addCssBuffer(self,
+        buffer:typing.Any,
+        encoding:str='utf-8-sig',
+        chunkSize:int=DEFAULT_CHUNK_SIZE
+        )->None:
+        """
+        Add rules parsed directly from css bytes, such as an mmap
+        or memoryview, decoding only a chunk at a time
+        (see parseRulesFromBuffer)
+
+        The source text is never held in memory as a whole, so it
+        is not kept, and the rules have no source spans or origins.
+        """
+        self._detachSource()
+        for parsed in parseRulesFromBuffer(buffer,encoding,chunkSize):
+            self._rules.append(self._ruleFromParsed(parsed))
+            self._appendOrigin(None)
+        self._changed()
+
+    def loadMapped(self,
+        filename:str,
+        encoding:str='utf-8-sig',
+        chunkSize:int=DEFAULT_CHUNK_SIZE
+        )->None:
+        """
+        Add the rules from a css file, parsed from a memory map of
+        it rather than first reading it all into a str, which keeps
+        memory use small for very large files
+
+        (See addCssBuffer.)
+        """
+        import mmap
+        with open(filename,'rb') as f:
+            if os.fstat(f.fileno()).st_size==0:
+                return
+            with mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) as mapped:
+                self.addCssBuffer(mapped,encoding,chunkSize)
+
+    def merge(self,
+        *others:CssRulesCompatible,
+        names:typing.Optional[typing.Iterable[str]]=None
+        )->'MergeResult':
+        """
+        Merge other stylesheets into this one, in cascade order,
+        dropping exact duplicate rules and reporting properties
+        that are given different values for the same selector
+
+        :param names: what to call this and each of the others
+            in the conflict report (default is their sourceNames)
+        :return: the merge result, whose rules are this object
+        """
+        from .cssMerge import mergeStylesheets
+        return mergeStylesheets((self,)+others,names,into=self)
+
+    def getRulesForElement(self,
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]=None,
+        media:typing.Optional[MediaContext]=None
+        )->typing.Iterable[CssRule]:
         """
         get all rules that apply to a given element
+
+        :param media: only include rules in effect for this media
+            (if None, media conditions are ignored)
         """
-        for rule in self._rules:
-            if rule.matches(element):
-                yield rule
+        if self._matchCache is not None:
+            return self._matchCache.getRulesForElement(element,context,media)
+        return (rule for rule in self.getRulesForMedia(media)
+            if rule.matches(element,context))
     getRules=getRulesForElement
 
-    def getStylesForElement(self,element:HtmlElementLike)->CssStyles:
+    def getStylesForElement(self,
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]=None,
+        media:typing.Optional[MediaContext]=None
+        )->CssStyles:
         """
         Get the final style for this element.
 
         NOTE: does not yet include inherited ("cascaded") styles!
         """
-        return CssStyles(self.getRulesForElement(element))
+        if self._matchCache is not None:
+            return self._matchCache.getStyles(element,context,media)
+        return CssStyles(self.getRulesForElement(element,context,media))
     getStyleForElement=getStylesForElement
 
+    def getStylesForDocument(self,
+        document:typing.Any,
+        media:typing.Optional[MediaContext]=None,
+        resolveVariables:bool=False
+        )->typing.Dict[HtmlElementLike,CssStyles]:
+        """
+        Get the final style for every element in a document
+        (or element subtree) in a single traversal.
+
+        This is much faster than calling getStylesForElement()
+        for each element, since descendant selectors that cannot
+        possibly match are rejected without walking up the tree.
+
+        NOTE: does not yet include inherited ("cascaded") styles!
+
+        :param resolveVariables: replace var() references with the
+            values of the custom properties each element inherits
+        :return: {element:styles}
+        """
+        context=MatchContext()
+        ret:typing.Dict[HtmlElementLike,CssStyles]={}
+        for element in context.walk(document):
+            ret[element]=self.getStylesForElement(element,context,media)
+        if resolveVariables:
+            ret=CssVariableResolver().resolveDocument(ret)
+        return ret
+
+    def getInliner(self,
+        media:typing.Optional[MediaContext]=None
+        )->'CssInliner':
+        """
+        Get an inliner for these rules, compiled on first use
+        and kept until the rules change
+
+        :param media: see CssInliner
+        """
+        inliner=self._inliners.get(media)
+        if inliner is None:
+            from .inliner import CssInliner
+            inliner=CssInliner(self,media)
+            self._inliners[media]=inliner
+        return inliner
+
+    def flattenVariables(self,removeDefinitions:bool=True)->int:
+        """
+        Replace var() references with the values of :root custom
+        properties wherever that is safe to do without a document.
+
+        :param removeDefinitions: also remove the :root definitions
+            of the flattened variables
+        :return: the number of values that were changed
+        """
+        return flattenVariables(self,removeDefinitions)
+
+    def minify(self,
+        passes:typing.Optional[typing.Iterable[MinifyPassCompatible]]=None,
+        timings:typing.Optional[Timings]=None,
+        sourceMap:typing.Optional[SourceMap]=None
+        )->str:
+        """
+        Minify these rules in-place
+
+        :param passes: the passes to run (default is all of MINIFY_PASSES)
+        :param timings: if given, accumulates {passName:seconds}
+        :param sourceMap: if given, mappings from the minified css
+            back to the original source are added to it
+        :return: the minified css text
+        """
+        minify(self,passes,timings)
+        return self.getMinifiedCssString(sourceMap=sourceMap)
+
+    def getMinifiedCssString(self,
+        compressionOrder:bool=False,
+        sourceMap:typing.Optional[SourceMap]=None
+        )->str:
+        """
+        Returns the css text with no unnecessary whitespace
+
+        :param compressionOrder: reorder declarations and rules,
+            wherever the cascade allows, so that the output compresses
+            better
+        :param sourceMap: if given, mappings from the start of each
+            rule back to where it came from are added to it
+        """
+        return getMinifiedCssString(self,compressionOrder,sourceMap)
+
+    def getCompressionGain(self,minified:bool=True)->CompressionGain:
+        """
+        Measure how much smaller the gzipped css gets
+        when written in compression order
+
+        :param minified: measure the minified css text (otherwise,
+            the regular formatted text)
+        """
+        if minified:
+            before=self.getMinifiedCssString()
+            after=self.getMinifiedCssString(compressionOrder=True)
+        else:
+            before=self.getCssString()
+            after=self.getCssString(compressionOrder=True)
+        return CompressionGain(
+            len(before.encode('utf-8')),len(after.encode('utf-8')),
+            gzipSize(before),gzipSize(after))
+
+    def diff(self,other:CssRulesCompatible)->CssDiff:
+        """
+        Find what changed going from these rules to some others
+
+        :param other: the new version
+        """
+        if not isinstance(other,CssRules):
+            if hasattr(other,'rules'):
+                other=other.rules # type: ignore
+            else:
+                other=CssRules(other)
+        return diffRules(self._rules,other._rules)
+
     def hasSelector(self,cssSelector:CssSelectorCompatible)->bool:
         """
         determine if the thing has a given css selector
@@ -289,36 +1149,104 @@ class CssRules:
         becomes
             .style1, .style2 { color:red }
 
+        A rule is only folded into an earlier one if no rule in
+        between sets any of the same properties, so the cascade
+        is unchanged.
+
         rename - an aggressive optomization that in the above example
             will delete .style2 and in the returned dict tell you it
             renamed{'.style2':'.style1'}
+            (only done for classes used nowhere else in the css)
         """
         renamed:typing.Dict[str,str]={}
-        # TODO: write the condensing routine
-        _=rename
+        keep:typing.List[CssRule]=[]
+        # {(styles,media):index in keep}
+        targets:typing.Dict[typing.Any,int]={}
+        # {property family:index in keep of the last rule setting it}
+        lastSet:typing.Dict[str,int]={}
+        for rule in self._rules:
+            families={propertyFamily(name) for name in rule.styles.keys()}
+            vendorPseudo=any(VENDOR_PSEUDO_RE.search(str(s)) is not None
+                for s in rule.selectors)
+            mergeable=not rule.isAtRule and len(rule.selectors)>0 \
+                and 'all' not in families and not vendorPseudo
+            if mergeable:
+                key=(tuple(rule.styles.items()),
+                    () if rule.media is None else rule.media.levels)
+                target=targets.get(key)
+                if target is not None and lastSet.get('all',-1)<=target \
+                    and all(lastSet.get(family,-1)<=target
+                        for family in families):
+                    targetRule=keep[target]
+                    for selector in rule.selectors:
+                        if not targetRule.hasSelector(selector):
+                            targetRule.addSelector(selector)
+                    continue
+                targets[key]=len(keep)
+            for family in families:
+                lastSet[family]=len(keep)
+            keep.append(rule)
+        if len(keep)!=len(self._rules):
+            self.assign(keep)
+        if rename:
+            classUses:typing.Dict[str,int]={}
+            for rule in self._rules:
+                for selector in rule.selectors:
+                    for name in CLASS_NAME_RE.findall(str(selector)):
+                        classUses[name]=classUses.get(name,0)+1
+            def isRenamable(selector:CssSelector)->bool:
+                """
+                A lone class name that is not used in any other selector
+                """
+                if SIMPLE_CLASS_RE.match(str(selector)) is None:
+                    return False
+                return classUses.get(str(selector)[1:])==1
+            for rule in self._rules:
+                renamable=[selector for selector in rule.selectors
+                    if isRenamable(selector)]
+                if len(renamable)<2:
+                    continue
+                for selector in renamable[1:]:
+                    renamed[str(selector)]=str(renamable[0])
+                    rule.removeSelector(selector)
+            if renamed:
+                self._detachSource()
+                self._changed()
         return renamed
 
     def removeSelector(self,cssSelector:CssSelectorCompatible)->None:
         """
         remove one or more css selectors from the list
         """
-        for rule in self._rules:
+        self._detachSource()
+        keep:typing.List[int]=[]
+        for i,rule in enumerate(self._rules):
             if rule.hasSelector(cssSelector):
                 rule.removeSelector(cssSelector)
-                # if there are no selectors left, there is no rule
-                if rule.numSelectors<1:
-                    self._rules.remove(rule)
+            # if there are no selectors left, there is no rule
+            if rule.numSelectors>0:
+                keep.append(i)
+        if len(keep)!=len(self._rules):
+            self._rules=[self._rules[i] for i in keep]
+            self._originFiles=array('l',(self._originFiles[i] for i in keep))
+            self._originOffsets=array('q',
+                (self._originOffsets[i] for i in keep))
+        self._changed()
     remove=removeSelector
 
     def getStyles(self,
-        element:HtmlElementLike
+        element:HtmlElementLike,
+        context:typing.Optional[MatchContext]=None,
+        media:typing.Optional[MediaContext]=None
         )->typing.Optional[CssStyles]:
         """
         collect all the styles that apply to a given element
         """
+        if self._matchCache is not None:
+            return self._matchCache.getStyles(element,context,media)
         styleList:typing.List[CssStyles]=[]
-        for rule in self._rules:
-            style=rule.getStyles(element)
+        for rule in self.getRulesForMedia(media):
+            style=rule.getStyles(element,context)
             if style is not None:
                 styleList.append(style)
         return CssStyles(styleList)
@@ -337,64 +1265,142 @@ class CssRules:
         """
         import random
         obfuscationKey:typing.Dict[CssSelector,CssSelector]={}
+        # {"."/"#" + name:obfuscated name} so that every selector
+        # using a class or id renames it the same way
+        names:typing.Dict[str,str]={}
         if ignore is not None:
             # each "ignore" key simply obfuscates to itself
             ignore=CssSelectors(ignore)
             for s in ignore:
                 obfuscationKey[s]=s
-        used:typing.Set[str]=set()
+                for m in OBFUSCATABLE_NAME_RE.finditer(str(s)):
+                    if m.group(1) is not None:
+                        names[m.group(0)]=m.group(2)
+        used:typing.Set[str]=set(names.values())
+        def obfuscatedString()->str:
+            """
+            Gets a single obfuscated string we haven't used before.
+            This leans toward creating shorter strings for efficiency.
+            """
+            buf=bytearray((random.randint(0x61,0x7a),))
+            result=str(buf,encoding='ascii')
+            while result in used:
+                choice=random.randint(0,2)
+                if choice==0: # numeric digits
+                    buf.append(random.randint(0x30,0x39))
+                elif choice==1: # capital letters
+                    buf.append(random.randint(0x41,0x5a))
+                else: # lowercase letters
+                    buf.append(random.randint(0x61,0x7a))
+                result=str(buf,encoding='ascii')
+            used.add(result)
+            return result
+        def obfuscateName(m:typing.Match[str])->str:
+            if m.group(1) is None:
+                return m.group(0)
+            name=names.get(m.group(0))
+            if name is None:
+                name=obfuscatedString()
+                names[m.group(0)]=name
+            return m.group(1)+name
         def obfuscateSelector(original:CssSelector)->CssSelector:
             """
             Takes a selector like
-                "@myElement.element1" and transforms it into
-                something unreadable like "@wM5a13.q1XjY"
+                "div#myElement.element1" and transforms it into
+                something unreadable like "div#wM5a13.q1XjY"
             """
-            def obfuscatedString()->str:
-                """
-                Gets a single obfuscated string we haven't used before.
-                This leans toward creating shorter strings for efficiency.
-                """
-                buf=bytearray((random.randint(0x61,0x7a),))
-                result=str(buf,encoding='ascii')
-                while buf in used:
-                    choice=random.randint(0,2)
-                    if choice==0: # numeric digits
-                        buf.append(random.randint(0x30,0x39))
-                    elif choice==1: # capital letters
-                        buf.append(random.randint(0x41,0x5a))
-                    elif choice==1: # lowercase letters
-                        buf.append(random.randint(0x61,0x7a))
-                    result=str(buf,encoding='ascii')
-                used.add(result)
-                return result
-            parts=re.finditer('([^a-zA-Z0-9]+)|([a-zA-Z0-9])',str(original))
-            results:typing.List[str]=[]
-            for m in parts:
-                part=str(m.group(0))
-                if part[0].isalpha():
-                    results.append(obfuscatedString())
-                else:
-                    results.append(part)
-            return CssSelector(''.join(results))
+            obfuscated=OBFUSCATABLE_NAME_RE.sub(obfuscateName,str(original))
+            return CssSelector(obfuscated)
         # go through all the selectors and make sure they all
         # translate to the same values
+        self._detachSource()
         for rule in self._rules:
-            for selector in rule.selectors:
+            selectors=list(rule.selectors)
+            for selector in selectors:
                 if selector not in obfuscationKey:
                     obfuscationKey[selector]=obfuscateSelector(selector)
-                rule.removeSelector(selector)
-                rule.addSelector(obfuscationKey[selector])
+            rule.selectors=CssSelectors(
+                [obfuscationKey[selector] for selector in selectors])
+        self._changed()
         return obfuscationKey
 
-    def getCssString(self,indent='\t',prepend='\n'):
+    def getCssString(self,indent='\t',prepend='\n',compressionOrder=False,
+        sourceMap:typing.Optional[SourceMap]=None):
         """
         Returns the css text
+
+        :param compressionOrder: reorder declarations and rules,
+            wherever the cascade allows, so that the output compresses
+            better (see also getCompressionGain())
+        :param sourceMap: if given, mappings from the start of each
+            rule back to where it came from are added to it
         """
         ret:typing.List[str]=[]
-        for rule in self._rules:
-            ret.append(rule.getCssString(indent,prepend))
-        return ('\n'+prepend).join(ret)
-    setCssString=assign
+        # the rule index of each item in ret, or -1
+        retRules:typing.List[int]=[]
+        currentLevels:typing.Tuple[str,...]=()
+        order:typing.Iterable[int]=range(len(self._rules))
+        if compressionOrder:
+            order=compressionOrderIndexes(self._rules)
+        for ruleIndex in order:
+            rule=self._rules[ruleIndex]
+            levels=() if rule.media is None else rule.media.levels
+            if levels!=currentLevels:
+                # close and open @media blocks as needed
+                common=0
+                while common<min(len(levels),len(currentLevels)) \
+                    and levels[common]==currentLevels[common]:
+                    common+=1
+                for _ in currentLevels[common:]:
+                    ret.append('}')
+                for level in levels[common:]:
+                    ret.append('@media %s {'%level)
+                retRules.extend([-1]*(len(ret)-len(retRules)))
+                currentLevels=levels
+            ret.append(rule.getCssString(indent,prepend,compressionOrder))
+            retRules.append(ruleIndex)
+        for _ in currentLevels:
+            ret.append('}')
+        separator='\n'+prepend
+        if sourceMap is not None:
+            position=PositionTracker()
+            for i,text in enumerate(ret):
+                if i>0:
+                    position.advance(separator)
+                if i<len(retRules) and retRules[i]>=0:
+                    self._addMapping(sourceMap,retRules[i],
+                        position.line,position.column)
+                position.advance(text)
+        return separator.join(ret)
+
+    def _addMapping(self,
+        sourceMap:SourceMap,
+        ruleIndex:int,
+        generatedLine:int,
+        generatedColumn:int
+        )->None:
+        """
+        Add a source map mapping for where a rule was written out
+        """
+        origin=self.getRuleOrigin(ruleIndex)
+        if origin is not None:
+            sourceIndex=sourceMap.addSource(origin[0],origin[1])
+            sourceMap.addMapping(generatedLine,generatedColumn,
+                sourceIndex,origin[2])
+
+    def setCssString(self,cssString:str)->None:
+        """
+        Assign the css text.
+
+        If the rules were parsed from text, only the part that
+        differs from the old text is reparsed (see applyEdit())
+        """
+        if self._source is None or not self._rules:
+            self.assign(cssString)
+            return
+        start,oldEnd,newEnd=_differingSpan(self._source,cssString)
+        if start!=oldEnd or start!=newEnd:
+            self.applyEdit(start,oldEnd,cssString[start:newEnd])
 
     @property
     def cssString(self)->str:
@@ -0,0 +1,379 @@
+"""
+Estimate how expensive each selector is for the matcher
+
+Matching works the way RuleIndex and CssSelector do it: a selector
+is only tested against elements that have the id, class or tag of
+its rightmost part (universal ones are tested against everything),
+and then checked right-to-left, walking ancestors for descendant
+combinators and previous siblings for "~".
+
+So the cost of a selector is roughly
+    (how often it is a candidate) * (how much work one test is)
+where the first comes from its RuleIndex bucket (measured on a
+real document if one is given) and the second from its shape.
+
+The numbers are estimates for ranking selectors against each
+other, not timings.
+"""
+import typing
+from collections import Counter
+from .htmlTypes import getTagName,getAttribute
+from .matchContext import MatchContext
+from .cssParser import findClosingParen
+from .cssSelectors import CssSelector,CssSelectorRequirement,\
+    splitCombinators,splitSelectorList
+from .rules import CssRule
+from .ruleIndex import RuleIndex
+
+
+# (ids,classes/attributes/pseudo-classes,tags/pseudo-elements)
+Specificity=typing.Tuple[int,int,int]
+
+# how often a selector in each bucket is a candidate, when there is
+# no document to measure it on (fraction of all elements)
+DEFAULT_CANDIDATE_RATES={'id':0.001,'class':0.02,'tag':0.1,'universal':1.0}
+# typical document shape, used to estimate combinator costs
+AVERAGE_DEPTH=12
+AVERAGE_SIBLINGS=6
+# extra work for each descendant combinator after the first
+DESCENDANT_BACKTRACKING=2.0
+# relative cost of the individual checks
+ATTRIBUTE_COST=1.0
+UNANCHORED_ATTRIBUTE_COST=3.0
+PSEUDO_CLASS_COST=2.0
+SIBLING_COUNTING_COST=float(AVERAGE_SIBLINGS)
+
+LEGACY_PSEUDO_ELEMENTS=frozenset(('before','after',
+    'first-line','first-letter'))
+# pseudo-classes whose specificity is that of their most specific argument
+SELECTOR_ARGUMENT_PSEUDOS=frozenset(('not','is','matches',
+    '-webkit-any','-moz-any','has'))
+# pseudo-classes that have to look at following siblings
+SIBLING_COUNTING_PSEUDOS=frozenset(('last-child','last-of-type','only-child',
+    'only-of-type','nth-last-child','nth-last-of-type'))
+# attribute operators that can't just compare the start of the value
+UNANCHORED_OPERATORS=('*=','~=','$=')
+
+
+def _iterParts(part:str
+    )->typing.Iterator[typing.Tuple[typing.Match[str],typing.Optional[str]]]:
+    """
+    Split a compound selector into its simple selectors
+
+    :return: (match,pseudo-class argument or None) for each
+    """
+    pos=0
+    while pos<len(part):
+        m=CssSelectorRequirement.PART_SPLITTER_RE.match(part,pos)
+        if m is None:
+            return
+        pos=m.end()
+        argument=None
+        if m.group('pseudoArgument') is not None:
+            closeIdx=findClosingParen(part,pos-1)
+            argument=part[pos:closeIdx]
+            pos=closeIdx+1
+        yield m,argument
+
+
+def getSpecificity(selector:typing.Union[str,CssSelector])->Specificity:
+    """
+    Get the specificity of a single selector, eg
+        "ul#nav li.active > a:hover" -> (1,2,3)
+    """
+    ids=classes=tags=0
+    for _,part in splitCombinators(str(selector)):
+        for m,argument in _iterParts(part):
+            if m.group('tag') is not None:
+                if m.group('tag')!='*':
+                    tags+=1
+            elif m.group('id') is not None:
+                ids+=1
+            elif m.group('class') is not None \
+                or m.group('attribute') is not None:
+                classes+=1
+            else:
+                pseudo=m.group('pseudo')
+                name=pseudo.lstrip(':').lower()
+                if pseudo.startswith('::') or name in LEGACY_PSEUDO_ELEMENTS:
+                    tags+=1
+                elif name=='where':
+                    pass
+                elif name in SELECTOR_ARGUMENT_PSEUDOS and argument:
+                    a,b,c=max(getSpecificity(s)
+                        for s in splitSelectorList(argument))
+                    ids+=a
+                    classes+=b
+                    tags+=c
+                else:
+                    classes+=1
+    return (ids,classes,tags)
+
+
+class SelectorCost(typing.NamedTuple):
+    """
+    The estimated cost of one selector
+
+    :param selector: the selector
+    :param ruleIndex: index of the rule it belongs to
+    :param specificity: (ids,classes,tags)
+    :param bucket: the RuleIndex bucket it is filed under,
+        "id", "class", "tag", "universal" or "never" (for selectors,
+        like :hover, that can't match a static document)
+    :param key: the id, class or tag it is filed under
+    :param candidateRate: fraction of elements it gets tested against
+    :param testCost: relative work to test it against one element
+    :param reasons: what makes it expensive
+    """
+    selector:str
+    ruleIndex:int
+    specificity:Specificity
+    bucket:str
+    key:typing.Optional[str]
+    candidateRate:float
+    testCost:float
+    reasons:typing.Tuple[str,...]
+
+    @property
+    def cost(self)->float:
+        """
+        Relative work this selector adds per element styled
+        """
+        return self.candidateRate*self.testCost
+
+    def __str__(self)->str:
+        ret='%8.3f  %-60s (%d,%d,%d)'%(
+            (self.cost,self.selector)+self.specificity)
+        if self.reasons:
+            ret+='\n          '+'; '.join(self.reasons)
+        return ret
+
+
+def _requirementCost(part:str)->typing.Tuple[float,typing.List[str]]:
+    """
+    Relative work to check one compound selector against one element
+    """
+    cost=1.0
+    reasons:typing.List[str]=[]
+    for m,argument in _iterParts(part):
+        if m.group('attribute') is not None:
+            operator=m.group('operator')
+            flag=m.group('flag')
+            caseInsensitive=flag is not None and flag.lower()=='i'
+            if operator in UNANCHORED_OPERATORS or caseInsensitive:
+                cost+=UNANCHORED_ATTRIBUTE_COST
+                reasons.append('unanchored attribute match %s'%m.group(0))
+            else:
+                cost+=ATTRIBUTE_COST
+        elif m.group('pseudo') is not None \
+            and not m.group('pseudo').startswith('::'):
+            name=m.group('pseudo').lstrip(':').lower()
+            if name in SIBLING_COUNTING_PSEUDOS:
+                cost+=SIBLING_COUNTING_COST
+                reasons.append(':%s has to look at following siblings'%name)
+            elif name in SELECTOR_ARGUMENT_PSEUDOS and argument:
+                innerCost=max(_selectorTestCost(s)[0]
+                    for s in splitSelectorList(argument))
+                cost+=innerCost
+                if innerCost>PSEUDO_CLASS_COST:
+                    reasons.append(':%s() with a complex argument'%name)
+            else:
+                cost+=PSEUDO_CLASS_COST
+    return cost,reasons
+
+
+def _selectorTestCost(selector:str)->typing.Tuple[float,typing.List[str]]:
+    """
+    Relative work to test a selector against one candidate element,
+    going right-to-left as CssSelector.matches does
+    """
+    parts=list(reversed(splitCombinators(selector)))
+    cost=0.0
+    # how many elements the next requirement to the left is tried on
+    reach=1.0
+    descendants=0
+    reasons:typing.List[str]=[]
+    for i,(combinator,part) in enumerate(parts):
+        partCost,partReasons=_requirementCost(part)
+        cost+=reach*partCost
+        reasons.extend(partReasons)
+        if i+1<len(parts):
+            if combinator==' ':
+                # the first walks up the ancestors, and each one
+                # after that can backtrack to try the next ancestor
+                if not descendants:
+                    reach*=AVERAGE_DEPTH
+                else:
+                    reach*=DESCENDANT_BACKTRACKING
+                descendants+=1
+            elif combinator=='~':
+                reach*=AVERAGE_SIBLINGS
+                reasons.append('general sibling combinator "~"')
+    if descendants>1:
+        reasons.append('chain of %d descendant combinators'%descendants)
+    return cost,reasons
+
+
+class SelectorAnalysis:
+    """
+    The estimated matching cost of every selector in a stylesheet
+    """
+
+    def __init__(self,
+        selectors:typing.List[SelectorCost],
+        bucketSizes:typing.Dict[str,typing.Dict[str,int]],
+        numElements:typing.Optional[int]=None):
+        """
+        :param selectors: the cost of each selector, in source order
+        :param bucketSizes: {bucket:{key:number of selectors}}
+            (the universal bucket has a single key, "*")
+        :param numElements: how many elements the candidate rates
+            were measured on (None if they are defaults)
+        """
+        self.selectors=selectors
+        self.bucketSizes=bucketSizes
+        self.numElements=numElements
+
+    @property
+    def specificityDistribution(self)->typing.Dict[Specificity,int]:
+        """
+        {specificity:number of selectors}, most specific first
+        """
+        counts=Counter(selector.specificity for selector in self.selectors)
+        return dict(sorted(counts.items(),reverse=True))
+
+    @property
+    def expectedCandidates(self)->float:
+        """
+        How many selectors the matcher tests against an average element
+        """
+        return sum(selector.candidateRate for selector in self.selectors)
+
+    @property
+    def expectedCost(self)->float:
+        """
+        Relative work to style an average element
+        """
+        return sum(selector.cost for selector in self.selectors)
+
+    def worst(self,count:int=20)->typing.List[SelectorCost]:
+        """
+        The most expensive selectors, worst first
+        """
+        ret=sorted(self.selectors,key=lambda selector: -selector.cost)
+        return ret[0:count]
+
+    def __str__(self)->str:
+        if self.numElements is not None:
+            measured='measured on %d elements'%self.numElements
+        else:
+            measured='estimated without a document'
+        ret=['%d selectors, %s'%(len(self.selectors),measured)]
+        ret.append('expected candidates per element: %.1f'%
+            self.expectedCandidates)
+        ret.append('expected cost per element: %.1f'%self.expectedCost)
+        ret.append('')
+        ret.append('bucket sizes (selectors / keys / largest):')
+        for bucket,sizes in self.bucketSizes.items():
+            if not sizes:
+                ret.append('  %-10s %7d %7d'%(bucket,0,0))
+                continue
+            largest=max(sizes.items(),key=lambda item: item[1])
+            ret.append('  %-10s %7d %7d   %s (%d)'%(bucket,
+                sum(sizes.values()),len(sizes),largest[0],largest[1]))
+        ret.append('')
+        ret.append('specificity:')
+        for specificity,count in self.specificityDistribution.items():
+            ret.append('  (%d,%d,%d) %7d'%(specificity+(count,)))
+        ret.append('')
+        ret.append('worst selectors:')
+        for selector in self.worst(10):
+            ret.append(str(selector))
+        return '\n'.join(ret)
+    __repr__=__str__
+
+
+def _bucketOf(selector:CssSelector)->typing.Tuple[str,typing.Optional[str]]:
+    """
+    Which RuleIndex bucket a selector is filed under
+    """
+    if not selector._rightToLeft:
+        return 'never',None
+    requirement=selector._rightToLeft[0][0]
+    if requirement._neverMatches:
+        return 'never',None
+    if requirement._id is not None:
+        return 'id',requirement._id
+    if requirement._classes:
+        return 'class',min(requirement._classes)
+    if requirement._tagName is not None:
+        return 'tag',requirement._tagName
+    return 'universal','*'
+
+
+def analyzeSelectors(rules:typing.Iterable[CssRule],
+    document:typing.Any=None
+    )->SelectorAnalysis:
+    """
+    Estimate the matching cost of every selector
+
+    :param rules: the rules to analyze
+    :param document: if given, how often each selector is a
+        candidate is measured on the elements of this document,
+        otherwise typical rates are assumed
+    """
+    index=RuleIndex(rules)
+    bucketSizes:typing.Dict[str,typing.Dict[str,int]]={
+        'id':{key:len(entries) for key,entries in index._byId.items()},
+        'class':{key:len(entries) for key,entries in index._byClass.items()},
+        'tag':{key:len(entries) for key,entries in index._byTag.items()},
+        'universal':{'*':len(index._universal)} if index._universal else {}}
+    numElements:typing.Optional[int]=None
+    # {bucket:{key:number of elements}}
+    elementCounts:typing.Dict[str,typing.Counter[str]]={
+        'id':Counter(),'class':Counter(),'tag':Counter()}
+    if document is not None:
+        numElements=0
+        for element in MatchContext().walk(document):
+            numElements+=1
+            elementId=getAttribute(element,'id')
+            if elementId is not None:
+                elementCounts['id'][elementId]+=1
+            classes=getAttribute(element,'class')
+            if classes is not None:
+                elementCounts['class'].update(set(classes.split()))
+            elementCounts['tag'][getTagName(element).lower()]+=1
+    # the same selector is often repeated across rules
+    testCosts:typing.Dict[str,
+        typing.Tuple[float,typing.List[str],Specificity]]={}
+    selectors:typing.List[SelectorCost]=[]
+    for ruleIndex,rule in enumerate(index.rules):
+        if rule.isAtRule:
+            continue
+        for selector in rule.selectors:
+            selectorString=str(selector)
+            bucket,key=_bucketOf(selector)
+            if bucket=='never':
+                selectors.append(SelectorCost(selectorString,ruleIndex,
+                    getSpecificity(selectorString),bucket,key,0.0,0.0,()))
+                continue
+            if numElements is None:
+                candidateRate=DEFAULT_CANDIDATE_RATES[bucket]
+            elif bucket=='universal':
+                candidateRate=1.0
+            else:
+                assert key is not None
+                counts=elementCounts[bucket]
+                candidateRate=counts[key]/numElements if numElements else 0.0
+            cached=testCosts.get(selectorString)
+            if cached is None:
+                testCost,reasons=_selectorTestCost(selectorString)
+                cached=(testCost,reasons,getSpecificity(selectorString))
+                testCosts[selectorString]=cached
+            testCost,reasons,specificity=cached
+            if bucket=='universal':
+                reasons=['rightmost part is universal,'
+                    ' so tested against every element']+reasons
+            selectors.append(SelectorCost(selectorString,ruleIndex,specificity,
+                bucket,key,candidateRate,testCost,tuple(reasons)))
+    return SelectorAnalysis(selectors,bucketSizes,numElements)
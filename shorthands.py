@@ -0,0 +1,646 @@
+"""
+Expand css shorthand properties into their longhands, and
+collapse complete sets of longhands back into shorthands.
+
+Everything is driven by the SHORTHANDS table (and the
+LONGHAND_SHORTHANDS reverse lookup built from it) so that both
+directions are a single pass over the declarations.
+"""
+import typing
+from .cssValues import CssValue,CssColor,CssFunction,CssKeyword,\
+    CssLength,CssNumber,CssPercentage,asCssValue
+from .cssParser import findDelimiter
+
+
+Expander=typing.Callable[[typing.List[str],str],
+    typing.Optional[typing.List[str]]]
+Collapser=typing.Callable[[typing.List[str]],typing.Optional[str]]
+Declarations=typing.Dict[str,CssValue]
+
+SIDES=('top','right','bottom','left')
+GLOBAL_KEYWORDS=('inherit','initial','unset','revert','revert-layer')
+
+
+def splitComponents(value:str)->typing.List[str]:
+    """
+    Split a value on top-level whitespace, keeping anything
+    inside of ()'s or quotes together.  A "/" is returned as
+    its own component.
+
+    eg 'url("a b.png") 12px/1.5 x' -> ['url("a b.png")','12px','/','1.5','x']
+    """
+    ret:typing.List[str]=[]
+    pos=0
+    end=len(value)
+    while pos<end:
+        if value[pos].isspace():
+            pos+=1
+            continue
+        if value[pos]=='/':
+            ret.append('/')
+            pos+=1
+            continue
+        componentEnd=pos
+        while componentEnd<end and not value[componentEnd].isspace() \
+            and value[componentEnd]!='/':
+            if value[componentEnd] in '("\'':
+                componentEnd=findDelimiter(value,componentEnd,end,' \t\r\n/')
+                break
+            componentEnd+=1
+        ret.append(value[pos:componentEnd])
+        pos=componentEnd
+    return ret
+
+
+def _kind(component:str)->typing.Any:
+    """
+    The type of the first token of a value component
+    """
+    tokens=CssValue(component).tokens
+    if not tokens:
+        return None
+    return tokens[0]
+
+
+def _isColor(component:str)->bool:
+    token=_kind(component)
+    if isinstance(token,CssFunction):
+        return token.name.lower() in ('color-mix','light-dark')
+    return isinstance(token,CssColor) or component.lower()=='currentcolor'
+
+
+def _isLength(component:str)->bool:
+    token=_kind(component)
+    if isinstance(token,CssFunction):
+        return token.name.lower() in ('calc','min','max','clamp')
+    return isinstance(token,(CssLength,CssPercentage)) \
+        or (isinstance(token,CssNumber) and token.value==0)
+
+
+# ---- box (top right bottom left) shorthands
+
+def _expandBox(components:typing.List[str],
+    value:str
+    )->typing.Optional[typing.List[str]]:
+    """
+    1-4 values for top right bottom left
+    """
+    _=value
+    if not 1<=len(components)<=4 or '/' in components:
+        return None
+    if len(components)==1:
+        return components*4
+    if len(components)==2:
+        return components*2
+    if len(components)==3:
+        return components+[components[1]]
+    return components
+
+
+def _collapseBox(values:typing.List[str])->typing.Optional[str]:
+    """
+    The shortest form of top right bottom left
+    """
+    top,right,bottom,left=values
+    if right==left:
+        if top==bottom:
+            if top==right:
+                return top
+            return '%s %s'%(top,right)
+        return '%s %s %s'%(top,right,bottom)
+    return ' '.join(values)
+
+
+# ---- border
+
+BORDER_STYLES=('none','hidden','dotted','dashed','solid','double',
+    'groove','ridge','inset','outset')
+BORDER_WIDTHS=('thin','medium','thick')
+BORDER_INITIAL=('medium','none','currentcolor')
+
+def _splitBorder(components:typing.List[str]
+    )->typing.Optional[typing.List[str]]:
+    """
+    Split border component values into [width,style,color]
+    """
+    if not 1<=len(components)<=3:
+        return None
+    ret:typing.List[typing.Optional[str]]=[None,None,None]
+    for component in components:
+        lower=component.lower()
+        if lower in BORDER_STYLES:
+            idx=1
+        elif lower in BORDER_WIDTHS or _isLength(component):
+            idx=0
+        elif _isColor(component):
+            idx=2
+        else:
+            return None
+        if ret[idx] is not None:
+            return None
+        ret[idx]=component
+    return [BORDER_INITIAL[i] if v is None else v for i,v in enumerate(ret)]
+
+def _expandBorderSide(components:typing.List[str],
+    value:str
+    )->typing.Optional[typing.List[str]]:
+    """
+    border-top etc -> [width,style,color]
+    """
+    _=value
+    return _splitBorder(components)
+
+def _expandBorder(components:typing.List[str],
+    value:str
+    )->typing.Optional[typing.List[str]]:
+    """
+    border -> all four sides of [width,style,color]
+    """
+    _=value
+    parts=_splitBorder(components)
+    if parts is None:
+        return None
+    return [parts[0]]*4+[parts[1]]*4+[parts[2]]*4
+
+def _collapseBorderSide(values:typing.List[str])->typing.Optional[str]:
+    """
+    [width,style,color] -> border-top etc
+    """
+    parts=[v for i,v in enumerate(values) if v.lower()!=BORDER_INITIAL[i]]
+    return ' '.join(parts) or 'none'
+
+def _collapseBorder(values:typing.List[str])->typing.Optional[str]:
+    """
+    all four sides of [width,style,color] -> border, if the sides are the same
+    """
+    widths,styles,colors=values[0:4],values[4:8],values[8:12]
+    for group in (widths,styles,colors):
+        if len(set(group))!=1:
+            return None
+    return _collapseBorderSide([widths[0],styles[0],colors[0]])
+
+
+# ---- font
+
+FONT_STYLES=('italic','oblique')
+FONT_VARIANTS=('small-caps',)
+FONT_WEIGHTS=('bold','bolder','lighter',
+    '100','200','300','400','500','600','700','800','900')
+FONT_STRETCHES=('ultra-condensed','extra-condensed','condensed',
+    'semi-condensed','semi-expanded','expanded','extra-expanded',
+    'ultra-expanded')
+FONT_SIZES=('xx-small','x-small','small','medium','large','x-large','xx-large',
+    'xxx-large','larger','smaller')
+
+def _expandFont(components:typing.List[str],
+    value:str
+    )->typing.Optional[typing.List[str]]:
+    """
+    font -> [style,variant,weight,stretch,size,line-height,family]
+    """
+    ret=['normal','normal','normal','normal',None,'normal',None]
+    idx=0
+    while idx<len(components):
+        lower=components[idx].lower()
+        if lower=='normal':
+            pass
+        elif lower in FONT_STYLES:
+            ret[0]=components[idx]
+        elif lower in FONT_VARIANTS:
+            ret[1]=components[idx]
+        elif lower in FONT_WEIGHTS:
+            ret[2]=components[idx]
+        elif lower in FONT_STRETCHES:
+            ret[3]=components[idx]
+        else:
+            break
+        idx+=1
+    if idx>=len(components):
+        return None
+    size=components[idx]
+    if size.lower() not in FONT_SIZES and not _isLength(size):
+        return None
+    ret[4]=components[idx]
+    idx+=1
+    if idx+1<len(components) and components[idx]=='/':
+        ret[5]=components[idx+1]
+        idx+=2
+    if idx>=len(components):
+        return None
+    # the family is everything else, verbatim
+    familyStart=0
+    for component in components[:idx]:
+        familyStart=value.index(component,familyStart)+len(component)
+    ret[6]=value[familyStart:].strip()
+    return typing.cast(typing.List[str],ret)
+
+def _collapseFont(values:typing.List[str])->typing.Optional[str]:
+    """
+    [style,variant,weight,stretch,size,line-height,family] -> font
+    """
+    style,variant,weight,stretch,size,lineHeight,family=values
+    ret:typing.List[str]=[]
+    for component,allowed in ((style,FONT_STYLES),(variant,FONT_VARIANTS),
+        (weight,FONT_WEIGHTS),(stretch,FONT_STRETCHES)):
+        if component.lower()=='normal':
+            continue
+        if component.lower() not in allowed:
+            return None
+        ret.append(component)
+    if lineHeight.lower()!='normal':
+        ret.append('%s/%s'%(size,lineHeight))
+    else:
+        ret.append(size)
+    ret.append(family)
+    return ' '.join(ret)
+
+
+# ---- background
+
+BACKGROUND_REPEATS=('repeat','repeat-x','repeat-y','no-repeat','space','round')
+BACKGROUND_ATTACHMENTS=('scroll','fixed','local')
+BACKGROUND_BOXES=('border-box','padding-box','content-box')
+BACKGROUND_POSITIONS=('left','right','top','bottom','center')
+BACKGROUND_SIZES=('auto','cover','contain')
+BACKGROUND_INITIAL=('none','0% 0%','auto','repeat','scroll',
+    'padding-box','border-box','transparent')
+
+def _isBackgroundSize(component:str)->bool:
+    return component.lower() in BACKGROUND_SIZES or _isLength(component)
+
+def _expandBackground(components:typing.List[str],
+    value:str
+    )->typing.Optional[typing.List[str]]:
+    """
+    background -> [image,position,size,repeat,attachment,origin,clip,color]
+
+    (only single-layer backgrounds are expanded)
+    """
+    if findDelimiter(value,0,len(value),',')<len(value):
+        return None
+    image=None
+    color=None
+    attachment=None
+    repeat:typing.List[str]=[]
+    boxes:typing.List[str]=[]
+    position:typing.List[str]=[]
+    size:typing.List[str]=[]
+    afterSlash=False
+    for component in components:
+        lower=component.lower()
+        token=_kind(component)
+        if component=='/':
+            if not position or afterSlash:
+                return None
+            afterSlash=True
+        elif afterSlash and _isBackgroundSize(component):
+            size.append(component)
+        elif lower in BACKGROUND_POSITIONS or _isLength(component):
+            if size:
+                return None
+            position.append(component)
+        elif lower in BACKGROUND_REPEATS:
+            repeat.append(component)
+        elif lower in BACKGROUND_ATTACHMENTS:
+            attachment=component
+        elif lower in BACKGROUND_BOXES:
+            boxes.append(component)
+        elif lower=='none' or _isImage(token):
+            if image is not None:
+                return None
+            image=component
+        elif _isColor(component) or lower=='transparent':
+            if color is not None:
+                return None
+            color=component
+        else:
+            return None
+    if len(boxes)>2 or len(repeat)>2 or len(position)>4 or len(size)>2:
+        return None
+    if len(boxes)==1:
+        boxes.append(boxes[0])
+    parts=[image,' '.join(position) or None,' '.join(size) or None,
+        ' '.join(repeat) or None,attachment,
+        boxes[0] if boxes else None,boxes[1] if boxes else None,color]
+    return [BACKGROUND_INITIAL[i] if v is None else v
+        for i,v in enumerate(parts)]
+
+def _isImage(token:typing.Any)->bool:
+    """
+    Whether a token is an image, ie url() or a gradient
+    """
+    if not isinstance(token,CssFunction):
+        return False
+    name=token.name.lower()
+    return name=='url' or name.endswith('gradient')
+
+def _collapseBackground(values:typing.List[str])->typing.Optional[str]:
+    """
+    [image,position,size,repeat,attachment,origin,clip,color] -> background
+    """
+    image,position,size,repeat,attachment,origin,clip,color=values
+    ret:typing.List[str]=[]
+    if image.lower()!='none':
+        ret.append(image)
+    if size.lower()!='auto':
+        ret.append('%s / %s'%(position,size))
+    elif position!='0% 0%':
+        ret.append(position)
+    for i,component in ((3,repeat),(4,attachment)):
+        if component.lower()!=BACKGROUND_INITIAL[i]:
+            ret.append(component)
+    if origin.lower()!='padding-box' or clip.lower()!='border-box':
+        ret.append(origin)
+        if clip!=origin:
+            ret.append(clip)
+    if color.lower()!='transparent':
+        ret.append(color)
+    return ' '.join(ret) or 'none'
+
+
+# ---- flex
+
+def _expandFlex(components:typing.List[str],
+    value:str
+    )->typing.Optional[typing.List[str]]:
+    """
+    flex -> [grow,shrink,basis]
+    """
+    _=value
+    # (a unitless 0 is a flex factor, not a basis, unless it
+    # comes after both of the factors)
+    if len(components)==1:
+        lower=components[0].lower()
+        if lower=='none':
+            return ['0','0','auto']
+        if lower=='auto':
+            return ['1','1','auto']
+        if isinstance(_kind(components[0]),CssNumber):
+            return [components[0],'1','0%']
+        if _isLength(components[0]) or lower=='content':
+            return ['1','1',components[0]]
+        return None
+    if len(components)==2:
+        if isinstance(_kind(components[1]),CssNumber):
+            return [components[0],components[1],'0%']
+        return [components[0],'1',components[1]]
+    if len(components)==3:
+        return components
+    return None
+
+def _collapseFlex(values:typing.List[str])->typing.Optional[str]:
+    """
+    [grow,shrink,basis] -> flex
+    """
+    return ' '.join(values)
+
+
+# ---- grid-area
+
+def _expandGridArea(components:typing.List[str],
+    value:str
+    )->typing.Optional[typing.List[str]]:
+    """
+    grid-area -> [row-start,column-start,row-end,column-end]
+    """
+    parts:typing.List[str]=[]
+    pos=0
+    while True:
+        slash=findDelimiter(value,pos,len(value),'/')
+        parts.append(value[pos:slash].strip())
+        if slash>=len(value):
+            break
+        pos=slash+1
+    if not 1<=len(parts)<=4 or not all(parts) or not components:
+        return None
+    def isIdent(part:str)->bool:
+        return isinstance(_kind(part),CssKeyword) and ' ' not in part \
+            and part.lower()!='auto'
+    while len(parts)<4:
+        # missing values copy the matching start line if it is a name
+        copyFrom=parts[len(parts)-2] if len(parts)>=2 else parts[0]
+        parts.append(copyFrom if isIdent(copyFrom) else 'auto')
+    return parts
+
+def _collapseGridArea(values:typing.List[str])->typing.Optional[str]:
+    """
+    [row-start,column-start,row-end,column-end] -> grid-area
+    """
+    return ' / '.join(values)
+
+
+class Shorthand(typing.NamedTuple):
+    """
+    How to expand and collapse a single shorthand property
+
+    :param resets: properties that are not set by the shorthand's
+        value, but are still reset to their initial values by it
+        (eg font resets font-kerning)
+    """
+    name:str
+    longhands:typing.Tuple[str,...]
+    expand:Expander
+    collapse:Collapser
+    resets:typing.Tuple[str,...]=()
+
+
+def _boxLonghands(pattern:str)->typing.Tuple[str,...]:
+    return tuple(pattern%side for side in SIDES)
+
+SHORTHANDS_LIST:typing.List[Shorthand]=[
+    # bigger ones first, so that collapsing prefers them
+    Shorthand('border',tuple(longhand for part in ('width','style','color')
+        for longhand in _boxLonghands('border-%s-'+part)),
+        _expandBorder,_collapseBorder,
+        ('border-image','border-image-source','border-image-slice',
+        'border-image-width','border-image-outset','border-image-repeat')),
+    ]+[Shorthand('border-'+part,_boxLonghands('border-%s-'+part),
+        _expandBox,_collapseBox) for part in ('width','style','color')]+[
+    Shorthand('border-'+side,tuple('border-%s-%s'%(side,part)
+        for part in ('width','style','color')),
+        _expandBorderSide,_collapseBorderSide) for side in SIDES]+[
+    Shorthand('margin',_boxLonghands('margin-%s'),_expandBox,_collapseBox),
+    Shorthand('padding',_boxLonghands('padding-%s'),_expandBox,_collapseBox),
+    Shorthand('font',('font-style','font-variant','font-weight',
+        'font-stretch','font-size','line-height','font-family'),
+        _expandFont,_collapseFont,
+        ('font-kerning','font-size-adjust','font-feature-settings',
+        'font-language-override','font-optical-sizing',
+        'font-variation-settings','font-variant-caps',
+        'font-variant-ligatures','font-variant-numeric',
+        'font-variant-east-asian','font-variant-alternates',
+        'font-variant-position')),
+    Shorthand('background',('background-image','background-position',
+        'background-size','background-repeat','background-attachment',
+        'background-origin','background-clip','background-color'),
+        _expandBackground,_collapseBackground),
+    Shorthand('flex',('flex-grow','flex-shrink','flex-basis'),
+        _expandFlex,_collapseFlex),
+    Shorthand('grid-area',('grid-row-start','grid-column-start',
+        'grid-row-end','grid-column-end'),_expandGridArea,_collapseGridArea),
+    ]
+SHORTHANDS:typing.Dict[str,Shorthand]={s.name:s for s in SHORTHANDS_LIST}
+SHORTHAND_PRIORITY:typing.Dict[str,int]={
+    s.name:i for i,s in enumerate(SHORTHANDS_LIST)}
+# {longhand:[shorthands that set it]}
+LONGHAND_SHORTHANDS:typing.Dict[str,typing.List[str]]={}
+for _shorthand in SHORTHANDS_LIST:
+    for _longhand in _shorthand.longhands:
+        LONGHAND_SHORTHANDS.setdefault(_longhand,[]).append(_shorthand.name)
+
+
+def _stripImportant(text:str)->str:
+    """
+    Remove the "!important" from the end of a value
+    """
+    return text[:text.lower().rindex('!important')].strip()
+
+
+def expandShorthand(name:str,value:CssValue
+    )->typing.Optional[typing.List[typing.Tuple[str,CssValue]]]:
+    """
+    Expand a shorthand declaration into its longhands
+
+    :return: [(longhand,value)] or None if this is not a shorthand,
+        or is one that cannot be safely expanded (eg, uses var())
+    """
+    shorthand=SHORTHANDS.get(name)
+    if shorthand is None:
+        return None
+    value=asCssValue(value)
+    important=value.important
+    text=value.strip()
+    if important:
+        text=_stripImportant(text)
+    if 'var(' in text.lower():
+        return None
+    values:typing.Optional[typing.List[str]]
+    if text.lower() in GLOBAL_KEYWORDS:
+        values=[text]*len(shorthand.longhands)
+    else:
+        values=shorthand.expand(splitComponents(text),text)
+    if values is None:
+        return None
+    suffix=' !important' if important else ''
+    return [(longhand,CssValue(v+suffix))
+        for longhand,v in zip(shorthand.longhands,values)]
+
+
+def mergeDeclarations(target:Declarations,
+    source:typing.Iterable[typing.Tuple[str,CssValue]]
+    )->None:
+    """
+    Merge declarations into target, the way the cascade does.
+
+    Shorthands are expanded so that they correctly override (and
+    are overridden by) their longhands, and !important values are
+    not overridden by normal ones.
+    """
+    for name,value in source:
+        value=asCssValue(value)
+        expanded=expandShorthand(name,value)
+        shorthand=SHORTHANDS.get(name)
+        if shorthand is not None:
+            # it replaces what it resets without setting (and, if it
+            # could not be expanded, all of its longhands too)
+            replaced=shorthand.resets
+            if expanded is None:
+                replaced=shorthand.longhands+replaced
+            for longhand in replaced:
+                existing=target.get(longhand)
+                if existing is not None \
+                    and (value.important or not existing.important):
+                    del target[longhand]
+        if expanded is None:
+            expanded=[(name,value)]
+        for longhand,longhandValue in expanded:
+            existing=target.get(longhand)
+            if existing is not None:
+                if existing.important and not longhandValue.important:
+                    continue
+                # re-insert at the end to keep the cascade order
+                del target[longhand]
+            target[longhand]=longhandValue
+
+
+def collapseShorthands(declarations:Declarations
+    )->typing.List[typing.Tuple[str,str]]:
+    """
+    Collapse any complete sets of longhands into shorthands.
+
+    The shorthand takes the place of the first of its longhands,
+    or goes before anything it would reset (eg, font before an
+    earlier font-kerning) as long as that does not move it past
+    anything else that sets its longhands.
+
+    :return: [(name,value)] in order
+    """
+    candidates:typing.Set[str]=set()
+    for name in declarations:
+        candidates.update(LONGHAND_SHORTHANDS.get(name,()))
+    if not candidates:
+        return list(declarations.items())
+    names=list(declarations)
+    positions={name:i for i,name in enumerate(names)}
+    # longhands that have been collapsed into shorthands
+    consumed:typing.Set[str]=set()
+    # {name:[shorthands to put before it]}
+    placed:typing.Dict[str,typing.List[typing.Tuple[str,str]]]={}
+    for shorthandName in sorted(candidates,key=SHORTHAND_PRIORITY.__getitem__):
+        if shorthandName in declarations:
+            continue
+        shorthand=SHORTHANDS[shorthandName]
+        values:typing.List[CssValue]=[]
+        for longhand in shorthand.longhands:
+            value=declarations.get(longhand)
+            if value is None or longhand in consumed:
+                break
+            values.append(asCssValue(value))
+        else:
+            important=values[0].important
+            if any(v.important!=important for v in values):
+                continue
+            texts=[v.strip() for v in values]
+            if important:
+                texts=[_stripImportant(t) for t in texts]
+            lowered=[t.lower() for t in texts]
+            if len(set(lowered))==1 and lowered[0] in GLOBAL_KEYWORDS:
+                collapsed:typing.Optional[str]=texts[0]
+            elif any(t in GLOBAL_KEYWORDS or 'var(' in t for t in lowered):
+                continue
+            else:
+                collapsed=shorthand.collapse(texts)
+            if collapsed is None:
+                continue
+            first=min(positions[longhand] for longhand in shorthand.longhands)
+            resets=[positions[name] for name in shorthand.resets
+                if name in positions]
+            if resets and min(resets)<first:
+                start=min(resets)
+                if any(_setsAnyOf(name,shorthand.longhands)
+                    for name in names[start:first]):
+                    continue
+                first=start
+            if important:
+                collapsed+=' !important'
+            consumed.update(shorthand.longhands)
+            placed.setdefault(names[first],[]).append(
+                (shorthandName,collapsed))
+    ret:typing.List[typing.Tuple[str,str]]=[]
+    for name,value in declarations.items():
+        if name in placed:
+            ret.extend(placed[name])
+        if name not in consumed:
+            ret.append((name,value))
+    return ret
+
+
+def _setsAnyOf(name:str,longhands:typing.Tuple[str,...])->bool:
+    """
+    Whether a property sets any of the given longhands
+    """
+    if name in longhands:
+        return True
+    shorthand=SHORTHANDS.get(name)
+    return shorthand is not None \
+        and not set(shorthand.longhands).isdisjoint(longhands)
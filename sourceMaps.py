@@ -0,0 +1,227 @@
+"""
+Source map (v3) generation
+
+Positions are kept in flat integer arrays (one entry per mapping)
+and only turned into line/column numbers, and then into the
+base64 VLQ "mappings" string, when the map is written out.
+"""
+import typing
+import json
+import bisect
+from array import array
+
+
+BASE64_DIGITS='ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'\
+    '0123456789+/'
+
+
+def encodeVlq(value:int)->str:
+    """
+    Encode an integer as a source map base64 VLQ
+    """
+    value=(-value<<1)|1 if value<0 else value<<1
+    ret:typing.List[str]=[]
+    while True:
+        digit=value&0x1f
+        value>>=5
+        if value:
+            digit|=0x20
+        ret.append(BASE64_DIGITS[digit])
+        if not value:
+            return ''.join(ret)
+
+
+def getLineStarts(text:str)->array:
+    """
+    Get the offset of the start of every line in some text
+    """
+    ret=array('q',[0])
+    pos=text.find('\n')
+    while pos>=0:
+        ret.append(pos+1)
+        pos=text.find('\n',pos+1)
+    return ret
+
+
+class PositionTracker:
+    """
+    Keep track of the line and column at the end of
+    text as it is being generated
+    """
+
+    def __init__(self):
+        self.line=0
+        self.column=0
+
+    def advance(self,text:str)->None:
+        """
+        Move past some generated text
+        """
+        newlines=text.count('\n')
+        if newlines:
+            self.line+=newlines
+            self.column=len(text)-text.rindex('\n')-1
+        else:
+            self.column+=len(text)
+
+
+class SourceMap:
+    """
+    A source map (version 3) from generated css back
+    to the original source files
+    """
+
+    def __init__(self,
+        file:typing.Optional[str]=None,
+        includeSourcesContent:bool=True):
+        """
+        :param file: the name of the generated file
+        :param includeSourcesContent: embed the original sources in
+            the map, so debuggers do not need to fetch them
+        """
+        self.file=file
+        self.includeSourcesContent=includeSourcesContent
+        self.sources:typing.List[str]=[]
+        self._sourceTexts:typing.List[str]=[]
+        self._lineStarts:typing.List[typing.Optional[array]]=[]
+        self._sourceIndexes:typing.Dict[typing.Tuple[str,int],int]={}
+        # one entry per mapping, in the order they were generated
+        self._generatedLines=array('l')
+        self._generatedColumns=array('l')
+        self._mappingSources=array('l')
+        self._mappingOffsets=array('q')
+
+    def addSource(self,name:str,text:str)->int:
+        """
+        Add an original source file (if it has not been already)
+
+        :return: the index of the source
+        """
+        key=(name,id(text))
+        ret=self._sourceIndexes.get(key)
+        if ret is None:
+            ret=len(self.sources)
+            self.sources.append(name)
+            self._sourceTexts.append(text)
+            self._lineStarts.append(None)
+            self._sourceIndexes[key]=ret
+        return ret
+
+    def addMapping(self,
+        generatedLine:int,
+        generatedColumn:int,
+        sourceIndex:int,
+        sourceOffset:int
+        )->None:
+        """
+        Map a position in the generated css to an offset in a source
+
+        Mappings must be added in the order they were generated.
+        """
+        self._generatedLines.append(generatedLine)
+        self._generatedColumns.append(generatedColumn)
+        self._mappingSources.append(sourceIndex)
+        self._mappingOffsets.append(sourceOffset)
+
+    def __len__(self)->int:
+        return len(self._generatedLines)
+
+    def originalPosition(self,
+        sourceIndex:int,
+        offset:int
+        )->typing.Tuple[int,int]:
+        """
+        Convert an offset in a source into a (line,column),
+        both zero-based
+        """
+        lineStarts=self._lineStarts[sourceIndex]
+        if lineStarts is None:
+            lineStarts=getLineStarts(self._sourceTexts[sourceIndex])
+            self._lineStarts[sourceIndex]=lineStarts
+        line=bisect.bisect_right(lineStarts,offset)-1
+        return (line,offset-lineStarts[line])
+
+    def lookup(self,
+        generatedLine:int,
+        generatedColumn:int
+        )->typing.Optional[typing.Tuple[str,int,int]]:
+        """
+        Find where a generated position came from
+
+        :return: (source name,line,column) all zero-based,
+            or None if it is not mapped
+        """
+        ret=None
+        for i in range(len(self._generatedLines)):
+            line=self._generatedLines[i]
+            if line>generatedLine:
+                break
+            if line==generatedLine:
+                if self._generatedColumns[i]>generatedColumn:
+                    break
+                sourceIndex=self._mappingSources[i]
+                ret=(self.sources[sourceIndex],)+self.originalPosition(
+                    sourceIndex,self._mappingOffsets[i])
+        return ret
+
+    @property
+    def mappings(self)->str:
+        """
+        The encoded "mappings" field of the source map
+        """
+        ret:typing.List[str]=[]
+        currentLine=0
+        previousColumn=0
+        previousSource=0
+        previousLine=0
+        previousOriginalColumn=0
+        segments:typing.List[str]=[]
+        for i in range(len(self._generatedLines)):
+            line=self._generatedLines[i]
+            if line!=currentLine:
+                ret.append(','.join(segments))
+                ret.extend(['']*(line-currentLine-1))
+                segments=[]
+                currentLine=line
+                previousColumn=0
+            sourceIndex=self._mappingSources[i]
+            originalLine,originalColumn=self.originalPosition(
+                sourceIndex,self._mappingOffsets[i])
+            column=self._generatedColumns[i]
+            segments.append(''.join((encodeVlq(column-previousColumn),
+                encodeVlq(sourceIndex-previousSource),
+                encodeVlq(originalLine-previousLine),
+                encodeVlq(originalColumn-previousOriginalColumn))))
+            previousColumn=column
+            previousSource=sourceIndex
+            previousLine=originalLine
+            previousOriginalColumn=originalColumn
+        ret.append(','.join(segments))
+        return ';'.join(ret)
+
+    def toDict(self)->typing.Dict[str,typing.Any]:
+        """
+        The source map as a json-compatible dict
+        """
+        ret:typing.Dict[str,typing.Any]={'version':3}
+        if self.file is not None:
+            ret['file']=self.file
+        ret['sources']=list(self.sources)
+        if self.includeSourcesContent:
+            ret['sourcesContent']=list(self._sourceTexts)
+        ret['names']=[]
+        ret['mappings']=self.mappings
+        return ret
+
+    def toJson(self)->str:
+        """
+        The source map as json text
+        """
+        return json.dumps(self.toDict(),separators=(',',':'))
+
+    @staticmethod
+    def getComment(url:str)->str:
+        """
+        Get the comment that points generated css at its source map
+        """
+        return '/*# sourceMappingURL=%s */'%url
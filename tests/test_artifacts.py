@@ -0,0 +1,69 @@
+"""
+Regression tests for writing hashed, precompressed build outputs
+
+Run from the directory above the package, eg
+    python -m pytest cssTools/tests
+"""
+import os
+import json
+import gzip
+import hashlib
+from cssTools.rules import CssRules
+from cssTools.artifacts import ArtifactWriter
+
+
+CSS='a { color : red }\n.b > .c { margin : 0px }\n'
+
+
+def test_hashedOutput(tmp_path):
+    writer=ArtifactWriter(str(tmp_path))
+    artifact=writer.write('css/app.css',CSS)
+    minified=CssRules(CSS).getMinifiedCssString().encode('utf-8')
+    digest=hashlib.sha256(minified).hexdigest()
+    assert artifact.hash==digest
+    assert artifact.filename=='css/app.%s.css'%digest[0:12]
+    assert artifact.gzipFilename==artifact.filename+'.gz'
+    assert artifact.size==len(minified)
+    assert artifact.written
+    assert (tmp_path/artifact.filename).read_bytes()==minified
+    compressed=(tmp_path/artifact.gzipFilename).read_bytes()
+    assert artifact.gzipSize==len(compressed)
+    assert gzip.decompress(compressed)==minified
+    # no temporary files are left behind
+    assert sorted(os.listdir(tmp_path/'css'))==sorted(
+        os.path.basename(filename)
+        for filename in (artifact.filename,artifact.gzipFilename))
+
+
+def test_unchangedRebuild(tmp_path):
+    with ArtifactWriter(str(tmp_path)) as writer:
+        first=writer.write('app.css',CSS)
+    path=tmp_path/first.filename
+    os.utime(path,(0,0))
+    with ArtifactWriter(str(tmp_path)) as writer:
+        second=writer.write('app.css',CSS)
+        assert not writer.saveManifest()
+    assert second==first._replace(written=False)
+    assert os.stat(path).st_mtime==0
+    # the same css always compresses to the same bytes
+    elsewhere=ArtifactWriter(str(tmp_path/'elsewhere')).write('app.css',CSS)
+    assert (tmp_path/'elsewhere'/elsewhere.gzipFilename).read_bytes()==\
+        (tmp_path/first.gzipFilename).read_bytes()
+
+
+def test_manifest(tmp_path):
+    writer=ArtifactWriter(str(tmp_path),removeStale=True)
+    assert not writer.saveManifest()
+    first=writer.write('app.css',CSS)
+    other=writer.write('other.css','p{top:0}')
+    assert writer.saveManifest()
+    manifest=json.loads((tmp_path/'manifest.json').read_text('utf-8'))
+    assert manifest=={'app.css':first.filename,'other.css':other.filename}
+    writer=ArtifactWriter(str(tmp_path),removeStale=True)
+    changed=writer.write('app.css',CSS+'p{left:0}')
+    assert changed.written and changed.filename!=first.filename
+    assert not (tmp_path/first.filename).exists()
+    assert not (tmp_path/first.gzipFilename).exists()
+    assert writer.saveManifest()
+    manifest=json.loads((tmp_path/'manifest.json').read_text('utf-8'))
+    assert manifest=={'app.css':changed.filename,'other.css':other.filename}
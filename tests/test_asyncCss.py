@@ -0,0 +1,65 @@
+"""
+Regression tests for loading css with asyncio
+
+Run from the directory above the package, eg
+    python -m pytest cssTools/tests
+"""
+import asyncio
+import threading
+import time
+import concurrent.futures
+import pytest
+from cssTools import asyncCss
+from cssTools.asyncCss import aload,agatherParse
+
+
+def test_aloadKeepsFilename(tmp_path):
+    filename=str(tmp_path/'a.css')
+    with open(filename,'w') as f:
+        f.write('a{color:red}')
+    css=asyncio.run(aload(filename))
+    assert css.rules.sourceName==filename
+    assert css.rules.getRuleOrigin(0)[0]==filename
+
+
+def test_agatherParse(tmp_path,monkeypatch):
+    readFile=asyncCss._readFile
+    lock=threading.Lock()
+    running=[0]
+    mostRunning=[0]
+    started=[]
+    def slowRead(filename:str)->str:
+        with lock:
+            started.append(filename)
+            running[0]+=1
+            mostRunning[0]=max(mostRunning[0],running[0])
+        try:
+            # the first files take the longest
+            time.sleep(0.05 if filename.endswith('0.css') else 0.01)
+            return readFile(filename)
+        finally:
+            with lock:
+                running[0]-=1
+    monkeypatch.setattr(asyncCss,'_readFile',slowRead)
+    filenames=[]
+    for i in range(6):
+        filename=str(tmp_path/('%d0.css'%i if i<2 else '%d.css'%i))
+        with open(filename,'w') as f:
+            f.write('.x%d{color:red}'%i)
+        filenames.append(filename)
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        sheets=asyncio.run(agatherParse(filenames,2,executor))
+        assert [sheet.rules.sourceName for sheet in sheets]==filenames
+        assert [str(sheet.rules[0].selectors) for sheet in sheets]==\
+            ['.x%d'%i for i in range(6)]
+        assert mostRunning[0]==2
+        # a failure cancels everything still waiting its turn
+        # (the next one may already have been let in)
+        started.clear()
+        missing=str(tmp_path/'missing.css')
+        with pytest.raises(FileNotFoundError):
+            asyncio.run(agatherParse([missing]+filenames,1,executor))
+        assert started[0]==missing
+        assert len(started)<=2
+    with pytest.raises(ValueError):
+        asyncio.run(agatherParse(filenames,0))
@@ -0,0 +1,24 @@
+"""
+Regression tests for bundling @imports
+
+Run from the directory above the package, eg
+    python -m pytest cssTools/tests
+"""
+from cssTools.bundler import CssBundler
+
+
+def test_externalImportsKept(tmp_path):
+    (tmp_path/'main.css').write_text(
+        '@import url(https://example.com/a.css);\n'
+        '@import "local.css" print;\n'
+        '.a{color:red}\n')
+    (tmp_path/'local.css').write_text(
+        '@import url(//example.com/b.css) (min-width:600px);\n'
+        '.b{color:blue}\n')
+    bundler=CssBundler(str(tmp_path/'main.css'))
+    assert bundler.build().getMinifiedCssString()==(
+        '@import url(https://example.com/a.css);'
+        '@import url(//example.com/b.css) print and (min-width:600px);'
+        '@media print{.b{color:blue}}.a{color:red}')
+    assert [cssImport.url for cssImport in bundler.externalImports]==[
+        'https://example.com/a.css','//example.com/b.css']
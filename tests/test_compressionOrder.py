@@ -0,0 +1,28 @@
+"""
+Regression tests for reordering css to compress better
+
+Run from the directory above the package, eg
+    python -m pytest cssTools/tests
+"""
+from cssTools.compressionOrder import propertyFamily,canonicalDeclarationOrder
+from cssTools.rules import CssRules
+
+
+def test_shorthandFamilies():
+    assert propertyFamily('line-height')==propertyFamily('font')
+    assert propertyFamily('font-variant-caps')==propertyFamily('font')
+    assert propertyFamily('border-image')==propertyFamily('border')
+    assert propertyFamily('grid-row')==propertyFamily('grid-row-start')
+
+
+def test_fontKeepsLineHeightOrder():
+    declarations=[('line-height','2'),('font','12px Arial')]
+    assert canonicalDeclarationOrder(declarations)==declarations
+    rules=CssRules('.a{line-height:2;font:12px Arial}')
+    assert rules.getMinifiedCssString(compressionOrder=True)==\
+        '.a{line-height:2;font:12px Arial}'
+
+
+def test_unrelatedSorted():
+    declarations=[('color','red'),('background','none'),('margin','0')]
+    assert canonicalDeclarationOrder(declarations)==sorted(declarations)
@@ -0,0 +1,37 @@
+"""
+Regression tests for diffing stylesheets
+
+Run from the directory above the package, eg
+    python -m pytest cssTools/tests
+"""
+import typing
+from cssTools.rules import CssRules
+from cssTools import cssDiff
+from cssTools.cssDiff import diffRules
+
+
+def test_overlappingReorderIsModified():
+    diff=diffRules(CssRules('.a{margin:0;margin-top:5px}'),
+        CssRules('.a{margin-top:5px;margin:0}'))
+    assert [change.kind for change in diff.changes]==['modified']
+    assert diff.changes[0].reorderedDeclarations==('margin-top','margin')
+
+
+def test_independentReorderIsUnchanged():
+    diff=diffRules(CssRules('.a{color:red;margin:0}'),
+        CssRules('.a{margin:0;color:red}'))
+    assert not diff.changes
+    assert diff.numUnchanged==1
+
+
+def test_selectorsMinifiedOnce(monkeypatch):
+    calls:typing.List[str]=[]
+    original=cssDiff.minifySelector
+    def minifySelector(selector:str)->str:
+        calls.append(selector)
+        return original(selector)
+    monkeypatch.setattr(cssDiff,'minifySelector',minifySelector)
+    cssText=''.join('.a > .b%d{color:red}'%(i%10) for i in range(100))
+    diff=diffRules(CssRules(cssText),CssRules(cssText+'.c{top:0}'))
+    assert [change.kind for change in diff.changes]==['added']
+    assert sorted(calls)==['.a > .b%d'%i for i in range(10)]
@@ -0,0 +1,24 @@
+"""
+Regression tests for merging stylesheets
+
+Run from the directory above the package, eg
+    python -m pytest cssTools/tests
+"""
+from cssTools.rules import CssRules
+from cssTools.cssMerge import mergeStylesheets
+
+
+def test_importantWins():
+    result=mergeStylesheets([CssRules('a{color:red !important}'),
+        CssRules('a{color:blue}')],['vendor','app'])
+    conflict,=result.conflicts
+    assert conflict.winner.sheet=='vendor'
+    assert str(conflict).splitlines()[1:]==[
+        '\t* vendor[0] color: red !important',
+        '\t  app[0] color: blue']
+
+
+def test_lastWins():
+    result=mergeStylesheets([CssRules('a{color:red}'),
+        CssRules('a{color:blue}')],['vendor','app'])
+    assert result.conflicts[0].winner.sheet=='app'
@@ -0,0 +1,56 @@
+"""
+Regression tests for parsing css a chunk at a time
+
+Run from the directory above the package, eg
+    python -m pytest cssTools/tests
+"""
+import pytest
+from cssTools.rules import CssRules
+from cssTools.cssParser import parseRules,parseRulesFromBuffer
+
+
+CSS='''@charset "utf-8";
+/* é { not a rule } */
+.café::before{content:"{中}";color:red}
+@media (max-width:600px){ p{margin:0} @media print{ a{x:"😀"} } }
+@font-face{font-family:"Ünï";src:url(a.woff)}
+@import url("ß.css");
+@supports (display:grid){ .ø{display:grid} }
+} junk ;
+.last{content:'}'}
+.unfinished{color:blue'''
+
+
+@pytest.mark.parametrize('chunkSize',[1,2,3,4,5,6,7,1<<20])
+def test_sameAsParseRules(chunkSize):
+    expected=list(parseRules(CSS))
+    # (the unfinished rule at the end is closed, as in a browser)
+    assert len(expected)==9
+    assert list(parseRulesFromBuffer(CSS.encode('utf-8'),
+        chunkSize=chunkSize))==expected
+    # with a byte order mark, which is not part of the text
+    assert list(parseRulesFromBuffer(b'\xef\xbb\xbf'+CSS.encode('utf-8'),
+        chunkSize=chunkSize))==expected
+    assert list(parseRulesFromBuffer(CSS.encode('utf-16'),'utf-16',
+        chunkSize=chunkSize))==expected
+
+
+def test_empty():
+    for buffer in (b'',b'\xef\xbb\xbf',b' /* */ '):
+        for chunkSize in (1,3):
+            assert not list(parseRulesFromBuffer(buffer,chunkSize=chunkSize))
+
+
+def test_loadMapped(tmp_path):
+    filename=tmp_path/'test.css'
+    filename.write_text(CSS,encoding='utf-8')
+    expected=CssRules(CSS).getCssString()
+    for chunkSize in (1,5,1<<20):
+        rules=CssRules()
+        rules.loadMapped(str(filename),chunkSize=chunkSize)
+        assert rules.getCssString()==expected
+    empty=tmp_path/'empty.css'
+    empty.write_bytes(b'')
+    rules=CssRules('a{color:red}')
+    rules.loadMapped(str(empty))
+    assert rules.getCssString()==CssRules('a{color:red}').getCssString()
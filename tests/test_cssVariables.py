@@ -0,0 +1,42 @@
+"""
+Regression tests for resolving custom properties
+
+Run from the directory above the package, eg
+    python -m pytest cssTools/tests
+"""
+from cssTools.rules import CssRules
+from cssTools.cssVariables import CssVariableResolver
+
+
+def test_cycleInvalidInAnyOrder():
+    declared={'--a':'var(--b) var(--c)','--b':'var(--a)',
+        '--c':'var(--b, fb)','--d':'var(--c, ok)'}
+    for order in (['--a','--b','--c','--d'],['--c','--a','--b','--d']):
+        environment=CssVariableResolver().resolveEnvironment(
+            {name:declared[name] for name in order})
+        assert environment.get('--a') is None
+        assert environment.get('--b') is None
+        assert environment.get('--c') is None
+        assert environment.get('--d')=='ok'
+
+
+def test_longChain():
+    declared={'--v%d'%i:'var(--v%d)'%(i+1) for i in range(5000)}
+    declared['--v5000']='end'
+    environment=CssVariableResolver().resolveEnvironment(declared)
+    assert environment.get('--v0')=='end'
+
+
+def test_flattenKeepsOpaqueReferences():
+    rules=CssRules(':root{--c:red}'
+        ' @supports (display:grid){.a{color:var(--c)}} .b{color:var(--c)}')
+    rules.flattenVariables()
+    assert rules.getMinifiedCssString()==(
+        ':root{--c:red}@supports (display:grid){.a{color:var(--c)}}'
+        '.b{color:red}')
+
+
+def test_flattenDropsEmptiedRules():
+    rules=CssRules(':root{--c:red} .b{color:var(--c)}')
+    rules.flattenVariables()
+    assert rules.getMinifiedCssString()=='.b{color:red}'
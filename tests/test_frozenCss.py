@@ -0,0 +1,63 @@
+"""
+Regression tests for frozen stylesheets
+
+Run from the directory above the package, eg
+    python -m pytest cssTools/tests
+"""
+import concurrent.futures
+from xml.dom import minidom
+import pytest
+from cssTools.rules import CssRules
+from cssTools.frozenCss import FrozenCss
+from cssTools.matchContext import MatchContext
+from cssTools.mediaQueries import MediaContext
+
+
+CSS='''
+a{color:red} .x{margin:0 1px} #y .x{color:blue !important}
+div > p:first-child{top:0}
+@media (max-width:600px){ .x{color:green} }
+@font-face{font-family:foo}
+.x{color:red}
+'''
+DOCUMENT='<html><body><div id="y"><p class="x">a</p>' \
+    '<a class="x">b</a></div></body></html>'
+
+
+def test_sameAsLive():
+    rules=CssRules(CSS)
+    frozen=FrozenCss(rules)
+    document=minidom.parseString(DOCUMENT)
+    for media in (None,MediaContext(width=500),MediaContext()):
+        live=rules.getStylesForDocument(document,media)
+        snapshot=frozen.getStylesForDocument(document,media)
+        assert list(live)==list(snapshot)
+        assert any(len(styles)>0 for styles in live.values())
+        for element,styles in live.items():
+            assert str(snapshot[element])==str(styles)
+    assert frozen.getMinifiedCssString()==rules.getMinifiedCssString()
+    assert frozen.thaw().getMinifiedCssString()==\
+        rules.getMinifiedCssString()
+
+
+def test_snapshot():
+    rules=CssRules(CSS)
+    frozen=FrozenCss(rules)
+    minified=frozen.getMinifiedCssString()
+    rules.clear()
+    assert frozen.getMinifiedCssString()==minified
+    with pytest.raises(AttributeError):
+        frozen.x=1 # type: ignore
+
+
+def test_threads():
+    frozen=FrozenCss(CSS)
+    document=minidom.parseString(DOCUMENT)
+    elements=list(MatchContext().walk(document))
+    media=MediaContext(width=500)
+    def styles(_:int)->list:
+        return [str(frozen.getStyles(element,media=media))
+            for element in elements]
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        results=list(executor.map(styles,range(50)))
+    assert all(result==results[0] for result in results)
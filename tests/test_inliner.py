@@ -0,0 +1,83 @@
+"""
+Regression tests for inlining css into style="" attributes
+
+Run from the directory above the package, eg
+    python -m pytest cssTools/tests
+"""
+import typing
+from xml.dom import minidom
+from cssTools.inliner import CssInliner
+from cssTools.cssStyles import CssStyles
+from cssTools.mediaQueries import MediaContext
+
+
+CSS='''
+#a{color:red} .x{color:blue;margin:0} p{color:green;padding:1px}
+p.x{font-size:2px} .y{color:black !important} .z{top:1px}
+a:hover{color:pink} p,a:hover{left:0} @font-face{font-family:f}
+@media (max-width:600px){p{color:orange}}
+'''
+DOCUMENT='<html><body>' \
+    '<p id="a" class="x">1</p>' \
+    '<p class="x y" style="color:white;top:2px">2</p>' \
+    '<p class="z" style="top:2px">3</p>' \
+    '<div>4</div>' \
+    '</body></html>'
+
+
+def inlinedStyles(inliner:CssInliner
+    )->typing.List[typing.Optional[typing.Dict[str,str]]]:
+    """
+    Inline DOCUMENT, and get the resulting styles of each element
+    in the body (or None if it has no style attribute)
+    """
+    document=minidom.parseString(DOCUMENT)
+    inliner.inlineDocument(document)
+    ret:typing.List[typing.Optional[typing.Dict[str,str]]]=[]
+    for element in document.getElementsByTagName('body')[0].childNodes:
+        if element.hasAttribute('style'):
+            ret.append({name:str(value).strip() for name,value
+                in CssStyles(element.getAttribute('style')).items()})
+        else:
+            ret.append(None)
+    return ret
+
+
+def test_specificityOrder():
+    styles=inlinedStyles(CssInliner(CSS))
+    # #a beats p.x beats .x beats p, whatever the source order
+    assert styles[0]=={'color':'red','margin':'0','padding':'1px',
+        'font-size':'2px','left':'0'}
+    assert styles[3] is None
+
+
+def test_inlineStyle():
+    styles=inlinedStyles(CssInliner(CSS))
+    # style="" beats any selector...
+    assert styles[2] is not None
+    assert styles[2]['top']=='2px'
+    assert styles[2]['color']=='green'
+    # ...except for !important ones
+    assert styles[1] is not None
+    assert styles[1]['color']=='black !important'
+    assert styles[1]['top']=='2px'
+
+
+def test_leftoverCss():
+    inliner=CssInliner(CSS)
+    assert inliner.leftoverCss=='a:hover{color:pink}a:hover{left:0}' \
+        '@font-face{font-family:f}@media (max-width:600px){p{color:orange}}'
+    styles=inlinedStyles(inliner)
+    assert all(style is None or style.get('color')!='orange'
+        for style in styles)
+
+
+def test_media():
+    inliner=CssInliner(CSS,MediaContext(width=500))
+    assert '@media' not in inliner.leftoverCss
+    styles=inlinedStyles(inliner)
+    assert styles[2] is not None
+    assert styles[2]['color']=='orange'
+    inliner=CssInliner(CSS,MediaContext(width=800))
+    assert '@media' in inliner.leftoverCss
+    assert inlinedStyles(inliner)[2]['color']=='green' # type: ignore
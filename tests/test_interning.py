@@ -0,0 +1,30 @@
+"""
+Regression tests for sharing strings and declaration blocks
+
+Run from the directory above the package, eg
+    python -m pytest cssTools/tests
+"""
+import sys
+from cssTools.interning import CssInterner,_deepSize
+
+
+def test_deepSizeCountsStrings():
+    text=''.join(['never-interned-',str(id(test_deepSizeCountsStrings))])
+    assert _deepSize(text)==sys.getsizeof(text)
+    assert _deepSize([text,text])==sys.getsizeof([text,text])+\
+        sys.getsizeof(text)
+    # measuring did not intern it
+    assert sys.intern(''.join(['never-interned-',
+        str(id(test_deepSizeCountsStrings))])) is not text
+
+
+def test_savedBytes():
+    interner=CssInterner()
+    selector='.some-long-selector-name > .another-one'
+    first=interner.selectors(selector)
+    second=interner.selectors(selector)
+    assert first[0] is second[0]
+    stats={stats.category:stats for stats in interner.getMemoryReport()}
+    saved=stats['selectors'].savedBytes
+    assert saved==_deepSize(first[0])
+    assert saved>sys.getsizeof(selector)
@@ -0,0 +1,35 @@
+"""
+Regression tests for the command line
+
+Run from the directory above the package, eg
+    python -m pytest cssTools/tests
+"""
+import os
+import sys
+import json
+import subprocess
+import cssTools
+from cssTools.__main__ import main
+
+
+def test_statsForSeveralFiles(tmp_path,capsys):
+    (tmp_path/'a.css').write_text('a{color:red}')
+    (tmp_path/'b.css').write_text('b{x:y}c{p:q}')
+    assert main(['stats','-j','1',str(tmp_path/'*.css')])==0
+    stats=json.loads(capsys.readouterr().out)
+    assert list(stats)==[str(tmp_path/'a.css'),str(tmp_path/'b.css')]
+    assert stats[str(tmp_path/'b.css')]['rules']==2
+    assert main(['stats',str(tmp_path/'a.css')])==0
+    assert json.loads(capsys.readouterr().out)['rules']==1
+
+
+def test_lazyImports():
+    packageParent=os.path.dirname(os.path.dirname(cssTools.__file__))
+    script='import sys,cssTools\n' \
+        'print(sorted(name for name in sys.modules\n' \
+        '    if name.startswith("cssTools.")))\n' \
+        'cssTools.CssRules\n' \
+        'print("cssTools.rules" in sys.modules)\n'
+    output=subprocess.run([sys.executable,'-c',script],cwd=packageParent,
+        check=True,stdout=subprocess.PIPE,universal_newlines=True).stdout
+    assert output.split('\n')[:2]==['[]','True']
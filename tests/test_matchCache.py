@@ -0,0 +1,37 @@
+"""
+Regression tests for caching the rules matched by elements
+
+Run from the directory above the package, eg
+    python -m pytest cssTools/tests
+"""
+from xml.dom import minidom
+import pytest
+from cssTools.rules import CssRules
+from cssTools.matchContext import MatchContext
+
+
+LANG_CSS='p:lang(en){color:red} p:lang(fr){color:blue}'
+CSS=LANG_CSS+'''
+[data-x="1"]{top:0} li:nth-child(2){left:0} li+li{right:0}
+div:empty{width:0} :not(p)>span{height:0}
+'''
+DOCUMENT='<html><body>' \
+    '<p lang="en">a</p><p lang="fr">b</p>' \
+    '<div lang="fr"><p>c</p><p lang="en">d</p></div><div/>' \
+    '<ul><li>e</li><li data-x="1">f</li><li data-x="2">g</li></ul>' \
+    '<p><span>h</span></p><div><span>i</span></div>' \
+    '</body></html>'
+
+
+@pytest.mark.parametrize('css',[LANG_CSS,CSS])
+def test_sameAsUncached(css):
+    uncached=CssRules(css)
+    cached=CssRules(css)
+    cached.enableMatchCache()
+    document=minidom.parseString(DOCUMENT)
+    for _ in range(2):
+        context=MatchContext()
+        for element in context.walk(document):
+            assert str(cached.getStyles(element,context))==\
+                str(uncached.getStyles(element,context))
+    assert cached.matchCacheStats.hits>0
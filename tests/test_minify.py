@@ -0,0 +1,84 @@
+"""
+Regression tests for the minifier
+
+Run from the directory above the package, eg
+    python -m pytest cssTools/tests
+"""
+import random
+from cssTools.rules import CssRules
+from cssTools.cssValues import CssKeyword,parseValue
+from cssTools.cssSelectors import splitCombinators
+from cssTools.minify import minifySelector
+
+
+def minified(css:str)->str:
+    """
+    Minify css text with the default passes
+    """
+    rules=CssRules(css)
+    rules.minify()
+    return rules.getMinifiedCssString()
+
+
+def test_colors():
+    assert minified('a{color:#FF0000}')=='a{color:red}'
+    assert minified('a{border:1px solid rgb(255,255,255)}') \
+        =='a{border:1px solid #fff}'
+
+
+def test_fontFamilyColorNames():
+    css='a{font-family:Black Ops One}'
+    assert minified(css)==css
+    assert minified('a{font:12px Black Ops One}')=='a{font:12px Black Ops One}'
+
+
+def test_animationNames():
+    assert minified('a{animation:white 1s}')=='a{animation:white 1s}'
+    assert minified('a{animation-name:red}')=='a{animation-name:red}'
+    assert minified('a{animation:spin 0.50s}')=='a{animation:spin .5s}'
+
+
+def test_unicodeRange():
+    tokens,_=parseValue('U+0025-00FF, u+4??')
+    assert tokens[0]==CssKeyword('U+0025-00FF')
+    assert tokens[2]==CssKeyword('u+4??')
+    css='@font-face{font-family:x;unicode-range:U+0025-00FF}'
+    assert minified(css)==css
+
+
+def test_customProperties():
+    assert minified('a{--gap:0px}')=='a{--gap:0px}'
+    assert minified('a{--fg:#FFFFFF;--n:0.50}')=='a{--fg:#FFFFFF;--n:0.50}'
+
+
+def test_zeroUnits():
+    assert minified('a{margin:0px 0.50em}')=='a{margin:0 .5em}'
+    assert minified('a{flex-basis:0px}')=='a{flex-basis:0px}'
+
+
+def test_atRulesNotMerged():
+    css='@font-face{font-family:A;src:url(a.woff)}' \
+        '@font-face{font-family:B;src:url(b.woff)}'
+    assert minified(css)==css
+    assert minified('@page{margin:0}@page{margin:1px}') \
+        =='@page{margin:0}@page{margin:1px}'
+
+
+def test_translucentColors():
+    assert minified('a{color:transparent}')=='a{color:transparent}'
+    assert minified('a{color:rgba(0,0,0,0)}')=='a{color:transparent}'
+    assert minified('a{color:rgba(255,0,0,0.50)}') \
+        =='a{color:rgba(255,0,0,.5)}'
+
+
+def test_minifySelector():
+    pieces=['a','.b','#c',' ','  ','\t','\n','>','+','~','*',':x',
+        '[y="1 > 2"]','(',')','\\ ']
+    generator=random.Random(0)
+    for _ in range(20000):
+        selector=''.join(generator.choice(pieces)
+            for _ in range(generator.randint(0,8)))
+        expected=''.join(combinator+part
+            for combinator,part in splitCombinators(selector))
+        assert minifySelector(selector)==expected
+    assert minifySelector('ul  >  li +a ~\tb')=='ul>li+a~b'
@@ -0,0 +1,81 @@
+"""
+Regression tests for incremental reparsing
+
+Run from the directory above the package, eg
+    python -m pytest cssTools/tests
+"""
+import random
+from cssTools.rules import CssRules
+
+
+def edited(css:str,start:int,end:int,newText:str)->CssRules:
+    """
+    Apply an edit, checking that it gives the same
+    rules as parsing the edited text from scratch
+    """
+    rules=CssRules(css)
+    rules.applyEdit(start,end,newText)
+    fresh=CssRules(css[:start]+newText+css[end:])
+    assert [str(rule) for rule in rules]==[str(rule) for rule in fresh]
+    return rules
+
+
+def test_editInsideRule():
+    rules=edited('a{x:y} @media print{b{p:q}} c{r:s}',22,23,'z')
+    assert rules.source=='a{x:y} @media print{b{z:q}} c{r:s}'
+
+
+def test_unbalancedOutsideEdit():
+    # a block, string or comment left open outside of the edit
+    edited('"";/*{*/@{',2,6,'a{b:c}')
+    edited("a{x:y} b{p:'q} c{r:s}",2,3,'z')
+    edited('@media print{a{x:y} b{p:q}} /* c{r:s}',15,16,'z')
+
+
+def test_leftoverJoinsNextRule():
+    # breaking up a comment leaves a "*/" for the next selector
+    edited('f{g:h} /* c{} */ q{r:s}',8,8,'h1{color:blue}')
+    # text typed ahead of a comment also becomes part of it
+    edited('f{g:h} /* c{} */ g{i:j}',7,7,'x')
+
+
+def test_editOpensComment():
+    # the comment swallows the rest of the rule, and what is left
+    # runs on into the next one
+    rules=edited('a{x:1}b{y:2}/*c*/d{z:3}',1,1,'/*')
+    assert len(rules)==1
+    assert rules.getSourceSpan(0)==(0,25)
+
+
+def test_strayBracket():
+    # a ")" does not close a "{", and a "[" hides the braces after it
+    edited('a{color:red} b{@media print{n:0}\n@me}a (max-width:600px)'
+        '{ c{x:y} d{p:q} }\n e{z:1} f{g:h}',35,40,'x')
+    edited('a{x:y} @media (max-width:600px){ c{x:y} d{p:q} } e{z:1}',
+        41,41,'[')
+
+
+def test_fuzzAgainstFullReparse():
+    base='a{color:red} b{margin:0}\n' \
+        '@media (max-width:600px){ c{x:y} d{p:q} }\n' \
+        ' e{z:1} f{g:h} /* c{} */ g{i:j}'
+    insertions=['','x','a{b:c}',';','/*','*/','"',"'",'{','}','(',')',
+        '[',']',' ','h1{color:blue}','@media print{']
+    for seed in range(20):
+        random.seed(seed)
+        rules=CssRules(base)
+        text=base
+        for _ in range(100):
+            start=random.randint(0,len(text))
+            end=min(len(text),start+random.choice([0,0,1,5]))
+            newText=random.choice(insertions)
+            try:
+                fresh=CssRules(text[:start]+newText+text[end:])
+            except ValueError:
+                continue
+            rules.applyEdit(start,end,newText)
+            text=rules.source
+            assert [str(rule) for rule in rules]==\
+                [str(rule) for rule in fresh],(seed,text)
+            assert [rules.getSourceSpan(i) for i in range(len(rules))]==\
+                [fresh.getSourceSpan(i) for i in range(len(fresh))]
@@ -0,0 +1,56 @@
+"""
+Regression tests for source maps
+
+Run from the directory above the package, eg
+    python -m pytest cssTools/tests
+"""
+import json
+import pytest
+from cssTools.rules import CssRules
+from cssTools.sourceMaps import SourceMap,encodeVlq
+
+
+SOURCE='a{color:red}\n.b{margin:0px}\n\n  .c{color:red}\n' \
+    '@media print{\n .d{x:y}\n}\n#e{color:#FF0000}\n'
+# (line,column) of each rule's selector in SOURCE
+POSITIONS={'a':(0,0),'b':(1,0),'c':(3,2),'d':(5,1),'e':(7,0)}
+
+
+def test_encodeVlq():
+    assert [encodeVlq(value) for value in (0,1,-1,15,16,-16)]==\
+        ['A','C','D','e','gB','hB']
+
+
+@pytest.mark.parametrize('operation,expected',[
+    ('minify','abcde'),
+    ('condense','abde'),
+    ('obfuscate','abcde')])
+def test_rulesMapBack(operation,expected):
+    rules=CssRules(SOURCE)
+    rules.sourceName='in.css'
+    getattr(rules,operation)()
+    sourceMap=SourceMap('out.css')
+    generated=rules.getMinifiedCssString(sourceMap=sourceMap)
+    assert '\n' not in generated
+    reparsed=CssRules(generated)
+    assert len(reparsed)==len(expected)
+    for i,name in enumerate(expected):
+        column=reparsed.getSourceSpan(i)[0]
+        assert sourceMap.lookup(0,column)==('in.css',)+POSITIONS[name]
+        # anywhere inside of the rule maps to its start
+        assert sourceMap.lookup(0,column+1)==('in.css',)+POSITIONS[name]
+    written=json.loads(sourceMap.toJson())
+    assert written['sources']==['in.css']
+    assert written['sourcesContent']==[SOURCE]
+    assert written['file']=='out.css'
+
+
+def test_multilineOutput():
+    rules=CssRules(SOURCE)
+    rules.sourceName='in.css'
+    sourceMap=SourceMap()
+    lines=rules.getCssString(sourceMap=sourceMap).split('\n')
+    for selector,name in (('a','a'),('.b','b'),('.c','c'),('.d','d'),
+        ('#e','e')):
+        line=lines.index(selector+' {')
+        assert sourceMap.lookup(line,0)==('in.css',)+POSITIONS[name]